@@ -17,12 +17,36 @@ import sys
 #print(tools_plugin_folder)
 #sys.path.append(tools_plugin_folder)
 
-from . import mapParser, objectsFabric, gui, rjoints, collisions, overrites, common_systems, utils
+from . import mapParser, objectsFabric, gui, rjoints, collisions, overrites, common_systems, log_setup, utils, mesh_buffers, export_manifest, compile_jobs, dependency_graph, node_inputs, action_sampling, action_reachability, track_sampling, action_compression, json_stream, quantization, profiler, \
+    cluster_layout, bounding_volumes, spatial_order, scene_model, mesh_optimizer, mesh_lods, collision_optimizer, cluster_parser, blender_scene, export_workers
 
 print("reloaded")
 
 _modules = (
+    cluster_layout,
+    log_setup,
     utils,
+    mesh_buffers,
+    export_manifest,
+    compile_jobs,
+    dependency_graph,
+    node_inputs,
+    action_sampling,
+    action_reachability,
+    track_sampling,
+    action_compression,
+    json_stream,
+    quantization,
+    profiler,
+    bounding_volumes,
+    spatial_order,
+    scene_model,
+    mesh_optimizer,
+    mesh_lods,
+    collision_optimizer,
+    cluster_parser,
+    export_workers,
+    blender_scene,
     common_systems,
     mapParser,
     objectsFabric,
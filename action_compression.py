@@ -0,0 +1,129 @@
+import json
+
+import numpy as np
+
+# Error bounded key reduction for sampled action channels. A channel keeps
+# only the samples needed to rebuild every original sample within the
+# error bound, with either linear or cubic Hermite interpolation between the
+# kept keys. Identical channels are stored once and shared between actions.
+
+INTERPOLATION_LINEAR = "linear"
+INTERPOLATION_HERMITE = "hermite"
+
+def hermite(y0, y1, m0, m1, length, t):
+    t2 = t * t
+    t3 = t2 * t
+    return (2 * t3 - 3 * t2 + 1) * y0 + (t3 - 2 * t2 + t) * length * m0 + \
+        (-2 * t3 + 3 * t2) * y1 + (t3 - t2) * length * m1
+
+def interpolate_segment(keys_values, keys_tangents, start, end, interpolation):
+    samples = np.arange(start, end + 1)
+    t = (samples - start) / float(end - start)
+    y0, y1 = keys_values
+    if interpolation == INTERPOLATION_HERMITE:
+        m0, m1 = keys_tangents
+        return hermite(y0, y1, m0, m1, end - start, t)
+    return y0 + (y1 - y0) * t
+
+def reduce_keys(values, error_bound, interpolation=INTERPOLATION_LINEAR):
+    # Douglas-Peucker style: split every segment at its worst sample until
+    # the reconstruction of the segment stays within the bound.
+    values = np.asarray(values, dtype=np.float64)
+    num_of_samples = len(values)
+    tangents = np.gradient(values) if num_of_samples > 1 else np.zeros(num_of_samples)
+    if num_of_samples <= 2:
+        return list(range(num_of_samples)), tangents
+
+    keys = {0, num_of_samples - 1}
+    segments = [(0, num_of_samples - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+        reconstructed = interpolate_segment(
+            (values[start], values[end]), (tangents[start], tangents[end]), start, end, interpolation)
+        errors = np.abs(values[start:end + 1] - reconstructed)
+        worst = int(np.argmax(errors))
+        if errors[worst] <= error_bound:
+            continue
+        split = start + worst
+        keys.add(split)
+        segments.append((start, split))
+        segments.append((split, end))
+
+    return sorted(keys), tangents
+
+def encode_channel(values, error_bound, interpolation=INTERPOLATION_LINEAR):
+    values = np.asarray(values, dtype=np.float64)
+    keys, tangents = reduce_keys(values, error_bound, interpolation)
+    channel = {
+        "interpolation": interpolation,
+        "numOfSamples": len(values),
+        "keys": keys,
+        "values": values[keys].tolist(),
+    }
+    if interpolation == INTERPOLATION_HERMITE:
+        channel["tangents"] = tangents[keys].tolist()
+    return channel
+
+def decode_channel(channel):
+    # reference decoder, mirrors what the engine evaluates per channel
+    num_of_samples = channel["numOfSamples"]
+    keys = np.asarray(channel["keys"], dtype=np.int64)
+    values = np.asarray(channel["values"], dtype=np.float64)
+    samples = np.arange(num_of_samples)
+    if len(keys) < 2 or channel["interpolation"] != INTERPOLATION_HERMITE:
+        return np.interp(samples, keys, values)
+
+    tangents = np.asarray(channel["tangents"], dtype=np.float64)
+    segment = np.clip(np.searchsorted(keys, samples, side='right') - 1, 0, len(keys) - 2)
+    start = keys[segment]
+    length = keys[segment + 1] - start
+    t = (samples - start) / length
+    return hermite(values[segment], values[segment + 1], tangents[segment], tangents[segment + 1], length, t)
+
+def compress_actions(json_actions_data, error_bound, interpolation=INTERPOLATION_LINEAR):
+    channels = []
+    channel_ids = dict()
+    json_actions = []
+    num_of_samples = 0
+    num_of_keys = 0
+
+    for action in json_actions_data:
+        action_channels = []
+        for values in action["data"]:
+            channel = encode_channel(values, error_bound, interpolation)
+            channel_key = json.dumps(channel, sort_keys=True)
+            channel_id = channel_ids.get(channel_key)
+            if channel_id is None:
+                channel_id = len(channels)
+                channel_ids[channel_key] = channel_id
+                channels.append(channel)
+                num_of_keys += len(channel["keys"])
+            num_of_samples += len(values)
+            action_channels.append(channel_id)
+
+        json_actions.append({
+            "name": action["name"],
+            "timeStride": action["timeStride"],
+            "types": action["types"],
+            "channels": action_channels,
+        })
+
+    return {
+        "errorBound": error_bound,
+        "channels": channels,
+        "actions": json_actions,
+    }, num_of_samples, num_of_keys
+
+def decompress_actions(json_compressed):
+    json_actions_data = []
+    decoded = [decode_channel(channel).tolist() for channel in json_compressed["channels"]]
+    for action in json_compressed["actions"]:
+        json_actions_data.append({
+            "name": action["name"],
+            "timeStride": action["timeStride"],
+            "types": action["types"],
+            "data": [decoded[channel_id] for channel_id in action["channels"]],
+        })
+    return json_actions_data
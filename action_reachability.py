@@ -0,0 +1,33 @@
+# Actions an export needs. An action is reachable when it animates an object
+# of the exported cluster tree or of one of its dependencies, or the data of
+# such an object (tracks are curves, meshes carry shape keys). Everything
+# else in the file stays out of the intermediate.
+
+def get_animation_data_actions(animation_data):
+    # the active action and the actions of every NLA strip
+    if animation_data is None:
+        return []
+    actions = []
+    if animation_data.action is not None:
+        actions.append(animation_data.action)
+    for track in animation_data.nla_tracks:
+        for strip in track.strips:
+            if strip.action is not None:
+                actions.append(strip.action)
+    return actions
+
+def collect_reachable_actions(graph):
+    # names of the actions used by the nodes of a dependency plan
+    action_names = set()
+    for key in graph.nodes:
+        for object in graph.get(key).root.all_objects:
+            for id_data in (object, object.data):
+                for action in getattr(id_data, "animation_actions", ()):
+                    action_names.add(action.name_full)
+    return action_names
+
+def select_actions(actions, action_names):
+    # None keeps every action of the file
+    if action_names is None:
+        return list(actions)
+    return [action for action in actions if action.name_full in action_names]
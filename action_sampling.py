@@ -0,0 +1,106 @@
+import numpy as np
+
+# Batched F-curve evaluation. Keyframes come in as arrays (read with
+# foreach_get on the Blender side) and every frame of a curve is evaluated
+# at once, following Blender's own keyframe evaluation: handles are clamped
+# like BKE_fcurve_correct_bezpart, then the bezier x(t) = frame is solved
+# per segment and y(t) returned.
+
+IPO_CONSTANT = 0
+IPO_LINEAR = 1
+IPO_BEZIER = 2
+
+CONSTANT_THRESHOLD = 0.001
+
+# largest difference against FCurve.evaluate the batched sampler is allowed
+SAMPLE_TOLERANCE = 1e-4
+
+BISECTION_STEPS = 40
+
+def is_supported(interpolation):
+    # easing interpolations (SINE, BOUNCE, ...) still go through FCurve.evaluate
+    return bool(np.all(np.asarray(interpolation) <= IPO_BEZIER))
+
+def is_constant(co, handle_left, handle_right, threshold=CONSTANT_THRESHOLD):
+    co = np.asarray(co).reshape(-1, 2)
+    handle_left = np.asarray(handle_left).reshape(-1, 2)
+    handle_right = np.asarray(handle_right).reshape(-1, 2)
+    k_value = handle_left[0, 1]
+    values = np.concatenate((handle_left[:, 1], co[:, 1], handle_right[:, 1]))
+    return bool(np.all(np.abs(values - k_value) <= threshold))
+
+def get_frames(start, end, stride):
+    num_of_frames = int(np.floor((end - start) / stride)) + 1
+    return start + stride * np.arange(max(num_of_frames, 0), dtype=np.float64)
+
+def correct_bezier_segments(p0, p1, p2, p3):
+    # keeps both handles inside the segment so x(t) is monotonic
+    h1 = p0 - p1
+    h2 = p3 - p2
+    length = p3[:, 0] - p0[:, 0]
+    len1 = np.abs(h1[:, 0])
+    len2 = np.abs(h2[:, 0])
+    total = len1 + len2
+    mask = (total > 0) & (total > length)
+    fac = np.ones_like(length)
+    fac[mask] = length[mask] / total[mask]
+    p1 = np.where(mask[:, None], p0 - fac[:, None] * h1, p1)
+    p2 = np.where(mask[:, None], p3 - fac[:, None] * h2, p2)
+    return p1, p2
+
+def bezier(c0, c1, c2, c3, t):
+    mt = 1.0 - t
+    return mt * mt * mt * c0 + 3.0 * mt * mt * t * c1 + 3.0 * mt * t * t * c2 + t * t * t * c3
+
+def sample_keyframes(co, handle_left, handle_right, interpolation, frames):
+    co = np.asarray(co, dtype=np.float64).reshape(-1, 2)
+    handle_left = np.asarray(handle_left, dtype=np.float64).reshape(-1, 2)
+    handle_right = np.asarray(handle_right, dtype=np.float64).reshape(-1, 2)
+    interpolation = np.asarray(interpolation).ravel()
+    frames = np.asarray(frames, dtype=np.float64)
+
+    values = np.empty(len(frames), dtype=np.float64)
+    if len(co) == 1:
+        values.fill(co[0, 1])
+        return values
+
+    keys_x = co[:, 0]
+    segment = np.clip(np.searchsorted(keys_x, frames, side='right') - 1, 0, len(co) - 2)
+
+    p0 = co[segment]
+    p3 = co[segment + 1]
+    ipo = interpolation[segment]
+
+    before = frames <= keys_x[0]
+    after = frames >= keys_x[-1]
+
+    values[:] = p0[:, 1]
+
+    linear = ipo == IPO_LINEAR
+    if np.any(linear):
+        dx = p3[linear, 0] - p0[linear, 0]
+        fac = np.divide(frames[linear] - p0[linear, 0], dx, out=np.zeros_like(dx), where=dx != 0)
+        values[linear] = p0[linear, 1] + fac * (p3[linear, 1] - p0[linear, 1])
+
+    bez = ipo == IPO_BEZIER
+    if np.any(bez):
+        b0 = p0[bez]
+        b3 = p3[bez]
+        b1, b2 = correct_bezier_segments(b0, handle_right[segment[bez]], handle_left[segment[bez] + 1], b3)
+        x = frames[bez]
+
+        # x(t) is monotonic after the correction, so bisection always converges
+        low = np.zeros(len(x))
+        high = np.ones(len(x))
+        for _ in range(BISECTION_STEPS):
+            mid = 0.5 * (low + high)
+            below = bezier(b0[:, 0], b1[:, 0], b2[:, 0], b3[:, 0], mid) < x
+            low = np.where(below, mid, low)
+            high = np.where(below, high, mid)
+        t = 0.5 * (low + high)
+        values[bez] = bezier(b0[:, 1], b1[:, 1], b2[:, 1], b3[:, 1], t)
+
+    # constant extrapolation outside the keyed range, exact values on the ends
+    values[before] = co[0, 1]
+    values[after] = co[-1, 1]
+    return values
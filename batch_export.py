@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# Headless batch export of many .blend files, e.g. to rebuild every map on a
+# build machine:
+#
+#   blender --background --python batch_export.py -- [options] <files or globs>...
+#   python3 batch_export.py --blender /opt/blender/blender [options] <files or globs>...
+#
+# The driver fans the files out over --jobs Blender processes. Each worker
+# opens one file, registers the addon from this folder when it is not
+# installed, exports the --cluster collections (every local cluster when none
+# are given) through scene.export_scene and writes a json summary the driver
+# collects. The run ends with timings, intermediate sizes and failures, and
+# exits with 1 when anything failed.
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ADDON_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+def get_script_args(argv):
+    # Blender keeps its own arguments in sys.argv, ours follow "--"
+    if "--" in argv:
+        return argv[argv.index("--") + 1:]
+    return argv[1:]
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog="batch_export.py", description="Export clusters of many .blend files")
+    parser.add_argument("files", nargs="*", help=".blend files or glob patterns, ** is recursive")
+    parser.add_argument("--cluster", dest="clusters", action="append", default=[],
+                        help="cluster collection to export, repeatable; every local cluster when omitted")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Blender processes running at once")
+    parser.add_argument("--blender", default=None, help="Blender executable, the running one by default")
+    parser.add_argument("--engine-path", default=None, help="overrides the engine path stored in the files")
+    parser.add_argument("--output-path", default=None, help="overrides the output folder stored in the files")
+    parser.add_argument("--compiler-jobs", type=int, default=None,
+                        help="MapCompiler processes per worker, cores divided by --jobs by default")
+    parser.add_argument("--parse-jobs", type=int, default=None,
+                        help="cluster parsing processes per worker, cores divided by --jobs by default")
+    parser.add_argument("--log-level", default=None, choices=("ERROR", "WARNING", "INFO", "DEBUG"))
+    parser.add_argument("--timeout", type=float, default=None, help="seconds a single file may take")
+    parser.add_argument("--summary", default=None, help="also write the run summary to this json file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+def expand_files(patterns):
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path.endswith(".blend") and path not in files:
+                files.append(path)
+    return files
+
+def get_blender_path(args):
+    if args.blender:
+        return args.blender
+    try:
+        import bpy
+        return bpy.app.binary_path
+    except ImportError:
+        return "blender"
+
+def format_size(size):
+    return "{:.2f} MiB".format(size / (1024 * 1024))
+
+# worker, runs inside Blender with the file already open
+
+def get_addon():
+    import bpy
+    package_name = os.path.basename(ADDON_FOLDER)
+    addon = sys.modules.get(package_name)
+    if addon is None:
+        sys.path.insert(0, os.path.dirname(ADDON_FOLDER))
+        addon = importlib.import_module(package_name)
+    if getattr(bpy.types, "SCENE_OT_export_scene", None) is None:
+        addon.register()
+    return addon
+
+def find_local_clusters(scene, utils):
+    clusters = []
+    for collection in scene.collection.children_recursive:
+        if collection.library is not None or len(collection.children) == 0:
+            continue
+        if utils.get_cluster_collection(collection) is not None:
+            clusters.append(collection.name)
+    return clusters
+
+def run_worker(args):
+    import bpy
+    addon = get_addon()
+    scene = bpy.context.scene
+    if args.engine_path is not None:
+        scene.re.engine_path = args.engine_path
+    if args.output_path is not None:
+        scene.re.output_path = args.output_path
+    if args.compiler_jobs is not None:
+        scene.re.compiler_jobs = args.compiler_jobs
+    if args.parse_jobs is not None:
+        scene.re.parse_jobs = args.parse_jobs
+    if args.log_level is not None:
+        scene.re.log_level = args.log_level
+    scene.frame_set(scene.frame_start)
+
+    cluster_names = args.clusters or find_local_clusters(scene, addon.utils)
+    file_summary = {"file": bpy.data.filepath, "clusters": [], "errors": []}
+    for cluster_name in cluster_names:
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as folder:
+            summary_path = os.path.join(folder, "summary.json")
+            error = "export cancelled"
+            try:
+                if 'FINISHED' in bpy.ops.scene.export_scene(cluster_name=cluster_name, summary_path=summary_path):
+                    error = "no summary written"
+            except RuntimeError as e:
+                # reports of type ERROR surface as exceptions in background mode
+                error = str(e).strip()
+
+            cluster_summary = {"cluster": cluster_name}
+            if os.path.exists(summary_path):
+                with open(summary_path, 'r', encoding='utf-8') as f:
+                    cluster_summary = json.load(f)
+            else:
+                file_summary["errors"].append("{}: {}".format(cluster_name, error))
+        cluster_summary["seconds"] = time.perf_counter() - start
+        file_summary["clusters"].append(cluster_summary)
+
+    if len(cluster_names) == 0:
+        file_summary["errors"].append("no clusters found")
+    with open(args.summary, 'w', encoding='utf-8') as f:
+        json.dump(file_summary, f, indent=4)
+    return 0
+
+# driver
+
+def get_worker_command(blender_path, path, args, summary_path):
+    command = [blender_path, "--background", "--factory-startup", path,
+               "--python-exit-code", "1", "--python", os.path.abspath(__file__), "--",
+               "--worker", "--summary", summary_path]
+    for cluster_name in args.clusters:
+        command.extend(["--cluster", cluster_name])
+    for option, value in (("--engine-path", args.engine_path), ("--output-path", args.output_path),
+                          ("--compiler-jobs", args.compiler_jobs), ("--parse-jobs", args.parse_jobs),
+                          ("--log-level", args.log_level)):
+        if value is not None:
+            command.extend([option, str(value)])
+    return command
+
+def run_file(blender_path, path, args):
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as folder:
+        summary_path = os.path.join(folder, "summary.json")
+        command = get_worker_command(blender_path, path, args, summary_path)
+        try:
+            completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       universal_newlines=True, errors='replace', timeout=args.timeout)
+            returncode, output = completed.returncode, completed.stdout
+        except subprocess.TimeoutExpired as e:
+            returncode, output = None, "timed out after {}s".format(e.timeout)
+        except OSError as e:
+            returncode, output = None, str(e)
+
+        file_summary = {"file": path, "clusters": [], "errors": []}
+        if os.path.exists(summary_path):
+            with open(summary_path, 'r', encoding='utf-8') as f:
+                file_summary = json.load(f)
+    file_summary["returncode"] = returncode
+    file_summary["seconds"] = time.perf_counter() - start
+    if returncode is None:
+        file_summary["errors"].append("Blender did not finish: " + output)
+    elif returncode != 0:
+        file_summary["errors"].append("Blender exited with {}".format(returncode))
+        file_summary["output"] = output[-4000:]
+    return file_summary
+
+def is_file_failed(file_summary):
+    if len(file_summary["errors"]) > 0:
+        return True
+    return any(len(cluster.get("failed", [])) > 0 for cluster in file_summary["clusters"])
+
+def format_summary(file_summaries, seconds, num_of_jobs):
+    num_of_clusters = 0
+    num_of_intermediates = 0
+    total_size = 0
+    lines = []
+    for file_summary in file_summaries:
+        size = 0
+        failed = list(file_summary["errors"])
+        for cluster in file_summary["clusters"]:
+            intermediates = cluster.get("intermediates", dict())
+            num_of_intermediates += len(intermediates)
+            size += sum(intermediates.values())
+            failed.extend("{} did not compile".format(name) for name in cluster.get("failed", []))
+        num_of_clusters += len(file_summary["clusters"])
+        total_size += size
+        lines.append("  {} {:.1f}s, {} clusters, {}{}".format(
+            os.path.basename(file_summary["file"]), file_summary["seconds"], len(file_summary["clusters"]),
+            format_size(size), "" if len(failed) == 0 else ", FAILED: " + "; ".join(failed)))
+
+    num_of_failed = len([file_summary for file_summary in file_summaries if is_file_failed(file_summary)])
+    lines.insert(0, "Exported {} files in {:.1f}s with {} workers: {} clusters, {} intermediates ({}), {} files failed".format(
+        len(file_summaries), seconds, num_of_jobs, num_of_clusters, num_of_intermediates, format_size(total_size), num_of_failed))
+    return lines
+
+def run_driver(args):
+    files = expand_files(args.files)
+    if len(files) == 0:
+        print("No .blend files to export", file=sys.stderr)
+        return 1
+
+    num_of_jobs = max(1, min(args.jobs, len(files)))
+    # the workers share the cores with each other's compilers and parsers
+    if args.compiler_jobs is None:
+        args.compiler_jobs = max(1, (os.cpu_count() or 1) // num_of_jobs)
+    if args.parse_jobs is None:
+        args.parse_jobs = max(1, (os.cpu_count() or 1) // num_of_jobs)
+    blender_path = get_blender_path(args)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(num_of_jobs) as executor:
+        file_summaries = list(executor.map(lambda path: run_file(blender_path, path, args), files))
+    seconds = time.perf_counter() - start
+
+    for file_summary in file_summaries:
+        if "output" in file_summary:
+            print("----", file_summary["file"])
+            print(file_summary["output"])
+    for line in format_summary(file_summaries, seconds, num_of_jobs):
+        print(line)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump({"seconds": seconds, "jobs": num_of_jobs, "files": file_summaries}, f, indent=4)
+    return 1 if any(is_file_failed(file_summary) for file_summary in file_summaries) else 0
+
+def main(argv):
+    args = parse_args(get_script_args(argv))
+    if args.worker:
+        return run_worker(args)
+    return run_driver(args)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
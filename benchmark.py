@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# Export benchmark on procedurally generated scenes:
+#
+#   blender --background --factory-startup --python benchmark.py -- [sizes] [--baseline path] [--update-baseline]
+#
+# Builds N clusters with M instancer refs to linked dependency clusters,
+# K collision circles and polygons, J joints, meshes of V vertices and
+# actions of F frames, then runs scene.export_scene with the profiler on and
+# MapCompiler replaced by fake_map_compiler.py. The fastest of --repeat runs
+# is kept per stage. Stages slower than the baseline by more than
+# --threshold fail the run, --update-baseline stores the new timings.
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+ADDON_FOLDER = os.path.dirname(os.path.abspath(__file__))
+if ADDON_FOLDER not in sys.path:
+    sys.path.insert(0, ADDON_FOLDER)
+
+import numpy as np
+
+import batch_export
+import node_inputs
+
+# stages shorter than this in the baseline are too noisy to compare
+MIN_STAGE_SECONDS = 0.01
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="Benchmark scene export on a generated scene")
+    parser.add_argument("--clusters", type=int, default=2, help="exported clusters (N)")
+    parser.add_argument("--refs", type=int, default=16, help="instancer refs per cluster (M)")
+    parser.add_argument("--dependencies", type=int, default=4, help="linked dependency clusters the refs point to")
+    parser.add_argument("--shapes", type=int, default=200, help="collision circles and polygons per cluster (K)")
+    parser.add_argument("--joints", type=int, default=30, help="joints per cluster (J)")
+    parser.add_argument("--meshes", type=int, default=4, help="meshes per cluster")
+    parser.add_argument("--vertices", type=int, default=10000, help="vertices per mesh (V)")
+    parser.add_argument("--frames", type=int, default=240, help="frames per action (F)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="export runs, the fastest is kept per stage")
+    parser.add_argument("--baseline", default=os.path.join(ADDON_FOLDER, "benchmark_baseline.json"))
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against the baseline, 0.2 is 20%%")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--keep", default=None, help="folder to keep the generated scene and intermediates in")
+    return parser.parse_args(args)
+
+def get_config(args):
+    return {key: getattr(args, key) for key in
+            ("clusters", "refs", "dependencies", "shapes", "joints", "meshes", "vertices", "frames", "seed")}
+
+# results
+
+def merge_fastest(runs):
+    # runs: list of {stage: seconds}, the fastest run of every stage
+    stages = dict()
+    for run in runs:
+        for name, seconds in run.items():
+            stages[name] = min(seconds, stages.get(name, seconds))
+    return stages
+
+def compare_results(baseline_stages, stages, threshold, min_seconds=MIN_STAGE_SECONDS):
+    # (stage, baseline seconds, seconds) of every stage that got slower than allowed
+    regressions = []
+    for name, baseline_seconds in sorted(baseline_stages.items()):
+        seconds = stages.get(name)
+        if seconds is None or baseline_seconds < min_seconds:
+            continue
+        if seconds > baseline_seconds * (1.0 + threshold):
+            regressions.append((name, baseline_seconds, seconds))
+    return regressions
+
+def format_results(stages, baseline_stages):
+    lines = []
+    for name, seconds in sorted(stages.items(), key=lambda item: -item[1]):
+        baseline_seconds = baseline_stages.get(name)
+        if baseline_seconds:
+            lines.append("  {:<20} {:8.3f}s  baseline {:8.3f}s  {:+.0%}".format(name, seconds, baseline_seconds, seconds / baseline_seconds - 1.0))
+        else:
+            lines.append("  {:<20} {:8.3f}s".format(name, seconds))
+    return lines
+
+# scene generation, runs inside Blender
+
+def get_socket_type(default):
+    if default is None:
+        return 'NodeSocketObject'
+    if isinstance(default, bool):
+        return 'NodeSocketBool'
+    if isinstance(default, int):
+        return 'NodeSocketInt'
+    if isinstance(default, tuple):
+        return 'NodeSocketColor'
+    return 'NodeSocketFloat'
+
+def new_group_socket(node_group, socket_type, name, in_out):
+    if hasattr(node_group, "interface"):
+        return node_group.interface.new_socket(name, in_out=in_out, socket_type=socket_type)
+    sockets = node_group.inputs if in_out == 'INPUT' else node_group.outputs
+    return sockets.new(socket_type, name)
+
+def make_node_groups(bpy):
+    # stand-ins for the utils.blend node groups, the exporter finds their
+    # inputs by socket name
+    for name, schema in node_inputs.SCHEMAS.items():
+        if name in bpy.data.node_groups:
+            continue
+        node_group = bpy.data.node_groups.new(name, 'GeometryNodeTree')
+        new_group_socket(node_group, 'NodeSocketGeometry', "Geometry", 'INPUT')
+        for _, socket_name, _, default in schema:
+            if socket_name is not None:
+                new_group_socket(node_group, get_socket_type(default), socket_name, 'INPUT')
+        new_group_socket(node_group, 'NodeSocketGeometry', "Geometry", 'OUTPUT')
+        group_input = node_group.nodes.new('NodeGroupInput')
+        group_output = node_group.nodes.new('NodeGroupOutput')
+        node_group.links.new(group_input.outputs[0], group_output.inputs[0])
+
+def add_node_modifier(bpy, object, group_name, values):
+    modifier = object.modifiers.new(group_name, 'NODES')
+    modifier.node_group = bpy.data.node_groups[group_name]
+    for input in node_inputs.get_group_inputs(modifier.node_group):
+        if input.name in values:
+            modifier[input.identifier] = values[input.name]
+    return modifier
+
+def make_quad_mesh(bpy, name, size):
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata([(-size, 0, -size), (-size, 0, size), (size, 0, size), (size, 0, -size)], [], [(0, 1, 2, 3)])
+    return mesh
+
+def make_circle_mesh(bpy, name, radius, segments=16):
+    angles = np.linspace(0, 2 * math.pi, segments, endpoint=False)
+    co = np.stack((np.cos(angles) * radius, np.zeros(segments), np.sin(angles) * radius), axis=1)
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(co.tolist(), [(id, (id + 1) % segments) for id in range(segments)], [])
+    return mesh
+
+def make_grid_mesh(bpy, name, num_of_vertices, rng):
+    side = max(2, int(math.ceil(math.sqrt(num_of_vertices))))
+    x, z = np.meshgrid(np.arange(side, dtype=np.float64), np.arange(side, dtype=np.float64))
+    co = np.stack((x.ravel(), rng.random(side * side) * 0.1, z.ravel()), axis=1) * 0.1
+    id = np.arange(side * side).reshape(side, side)
+    faces = np.stack((id[:-1, :-1].ravel(), id[:-1, 1:].ravel(), id[1:, 1:].ravel(), id[1:, :-1].ravel()), axis=1)
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(co.tolist(), [], faces.tolist())
+    return mesh
+
+def add_location_action(bpy, id_data, data_path, num_of_frames, rng, num_of_channels=3):
+    for frame in range(1, num_of_frames + 1, max(1, num_of_frames // 12)):
+        value = getattr(id_data, data_path)
+        if num_of_channels == 1:
+            setattr(id_data, data_path, float(rng.random() * 10))
+        else:
+            for index in range(num_of_channels):
+                value[index] = float(rng.random() * 10)
+        id_data.keyframe_insert(data_path=data_path, frame=frame)
+
+def new_object(bpy, collection, name, data, location):
+    object = bpy.data.objects.new(name, data)
+    object.location = location
+    collection.objects.link(object)
+    return object
+
+def new_child_collection(bpy, parent, name):
+    collection = bpy.data.collections.new(name)
+    parent.children.link(collection)
+    return collection
+
+def random_location(rng, spread):
+    return (float(rng.uniform(-spread, spread)), 0.0, float(rng.uniform(-spread, spread)))
+
+def make_collision_values(rng):
+    return {"Density": float(rng.random()), "Restitution": float(rng.random()), "Friction": float(rng.random())}
+
+def generate_cluster(bpy, parent, name, sizes, rng, dependencies=()):
+    root = new_child_collection(bpy, parent, name)
+    cluster = new_child_collection(bpy, root, "Static")
+    spread = math.sqrt(max(1, sizes["shapes"])) * 2.0
+
+    objects = new_child_collection(bpy, cluster, "Objects")
+    for id in range(sizes["refs"] if len(dependencies) > 0 else 0):
+        ref = new_object(bpy, objects, "{}Ref{}".format(name, id), None, random_location(rng, spread))
+        ref.instance_type = 'COLLECTION'
+        ref.instance_collection = dependencies[id % len(dependencies)]
+
+    collision = new_child_collection(bpy, cluster, "Collision")
+    circle_mesh = make_circle_mesh(bpy, name + "Circle", 0.5)
+    quad_mesh = make_quad_mesh(bpy, name + "Quad", 1.0)
+    shapes = []
+    for id in range(sizes["shapes"]):
+        b_circle = id % 2 == 0
+        shape = new_object(bpy, collision, "{}Shape{}".format(name, id), circle_mesh if b_circle else quad_mesh, random_location(rng, spread))
+        add_node_modifier(bpy, shape, "CollisionCircle" if b_circle else "CollisionPolygon", make_collision_values(rng))
+        shapes.append(shape)
+
+    beams = new_child_collection(bpy, cluster, "Beams")
+    for id in range(sizes["shapes"] // 10):
+        beam = new_object(bpy, beams, "{}Beam{}".format(name, id), quad_mesh, random_location(rng, spread))
+        add_node_modifier(bpy, beam, "Beam", {"Max length": 2.0, "Width": 0.2, "Enabled": id % 3 != 0})
+
+    links = new_child_collection(bpy, cluster, "Links")
+    joint_types = ("JointWeld", "JointDistance", "JointWheel")
+    for id in range(sizes["joints"] if len(shapes) > 1 else 0):
+        joint = new_object(bpy, links, "{}Joint{}".format(name, id), quad_mesh, random_location(rng, spread))
+        target1 = shapes[int(rng.integers(len(shapes)))]
+        target2 = shapes[int(rng.integers(len(shapes)))]
+        joint_type = joint_types[id % len(joint_types)]
+        add_node_modifier(bpy, joint, joint_type, {
+            "Target 1": target1, "Target 2": target2, "Frequency HZ": 4.0, "Damping ratio": 0.7,
+            "Target 1 offset X": 0.5, "Target 2 offset Y": -0.5, "Local axis Y": 1.0, "Motor speed": 2.0})
+        if joint_type == "JointWeld":
+            constraint = joint.constraints.new('CHILD_OF')
+            constraint.target = target1
+
+    meshes = new_child_collection(bpy, cluster, "Mesh")
+    for id in range(sizes["meshes"]):
+        mesh_object = new_object(bpy, meshes, "{}Mesh{}".format(name, id), make_grid_mesh(bpy, "{}Grid{}".format(name, id), sizes["vertices"], rng), random_location(rng, spread))
+        add_location_action(bpy, mesh_object, "location", sizes["frames"], rng)
+
+    polygons = new_child_collection(bpy, cluster, "Polygons")
+    for id in range(sizes["shapes"] // 4):
+        polygon = new_object(bpy, polygons, "{}Polygon{}".format(name, id), quad_mesh, random_location(rng, spread))
+        add_node_modifier(bpy, polygon, "Color", {"Color": (float(rng.random()), float(rng.random()), float(rng.random()), 1.0)})
+
+    tracks = new_child_collection(bpy, cluster, "Tracks")
+    curve = bpy.data.curves.new(name + "Track", 'CURVE')
+    spline = curve.splines.new('BEZIER')
+    spline.bezier_points.add(7)
+    for id, point in enumerate(spline.bezier_points):
+        point.co = (id * 2.0, 0.0, float(rng.uniform(-1, 1)))
+        point.handle_left_type = point.handle_right_type = 'AUTO'
+    new_object(bpy, tracks, name + "Track", curve, (0.0, 0.0, 0.0))
+    add_location_action(bpy, curve, "eval_time", sizes["frames"], rng, num_of_channels=1)
+    return root
+
+def generate_scene(bpy, config, folder):
+    # dependencies go to a library file and are linked back, the exporter
+    # only follows instancers of linked collections
+    rng = np.random.default_rng(config["seed"])
+    scene = bpy.context.scene
+    make_node_groups(bpy)
+
+    dependency_sizes = dict(config, refs=0, shapes=max(2, config["shapes"] // 10), joints=max(1, config["joints"] // 10),
+                            meshes=1, vertices=max(4, config["vertices"] // 10))
+    dependency_roots = [generate_cluster(bpy, scene.collection, "Dependency{}".format(id), dependency_sizes, rng)
+                        for id in range(config["dependencies"])]
+    library_path = os.path.join(folder, "benchmark_library.blend")
+    bpy.data.libraries.write(library_path, set(dependency_roots), fake_user=True)
+    for root in dependency_roots:
+        ids = set(root.all_objects) | set(root.children_recursive) | {root}
+        bpy.data.batch_remove(ids)
+
+    with bpy.data.libraries.load(library_path, link=True) as (data_from, data_to):
+        data_to.collections = [name for name in data_from.collections if name.startswith("Dependency")]
+    dependencies = data_to.collections
+
+    cluster_names = []
+    for id in range(config["clusters"]):
+        cluster_names.append(generate_cluster(bpy, scene.collection, "Cluster{}".format(id), config, rng, dependencies).name)
+
+    bpy.ops.wm.save_as_mainfile(filepath=os.path.join(folder, "benchmark.blend"))
+    return cluster_names
+
+def make_compiler_wrapper(folder):
+    # MapCompiler is one executable path, wrap the python stand-in in a script
+    compiler_path = os.path.join(ADDON_FOLDER, "fake_map_compiler.py")
+    python_path = sys.executable
+    if os.name == 'nt':
+        wrapper_path = os.path.join(folder, "fake_map_compiler.cmd")
+        with open(wrapper_path, 'w') as f:
+            f.write('@"{}" "{}" %*\n'.format(python_path, compiler_path))
+    else:
+        wrapper_path = os.path.join(folder, "fake_map_compiler.sh")
+        with open(wrapper_path, 'w') as f:
+            f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(python_path, compiler_path))
+        os.chmod(wrapper_path, 0o755)
+    return wrapper_path
+
+def run_exports(bpy, addon, cluster_names, folder, repeat):
+    scene = bpy.context.scene
+    scene.re.engine_path = folder + os.sep
+    scene.re.output_path = ""
+    scene.re.incremental_export = False
+    scene.re.profile_export = True
+    scene.re.log_level = 'WARNING'
+    for parts in (("Sources", "Intermediate"), ("Sources", "Data", "Intermediate"), ("Clusters",)):
+        os.makedirs(addon.utils.get_resources_path(folder, *parts), exist_ok=True)
+    os.environ[addon.utils.COMPILER_PATH_VARIABLE] = make_compiler_wrapper(folder)
+
+    runs = []
+    for run_id in range(repeat):
+        stages = {"total": 0.0}
+        for cluster_name in cluster_names:
+            summary_path = os.path.join(folder, "summary.json")
+            start = time.perf_counter()
+            bpy.ops.scene.export_scene(cluster_name=cluster_name, summary_path=summary_path)
+            stages["total"] += time.perf_counter() - start
+            with open(summary_path, 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+            if len(summary["failed"]) > 0:
+                raise RuntimeError("compilation failed for " + ", ".join(summary["failed"]))
+            for name, seconds in summary.get("stages", dict()).items():
+                stages[name] = stages.get(name, 0.0) + seconds
+        runs.append(stages)
+        print("Run {} took {:.3f}s".format(run_id + 1, stages["total"]))
+    return merge_fastest(runs)
+
+def run(args, folder):
+    import bpy
+    addon = batch_export.get_addon()
+    config = get_config(args)
+
+    start = time.perf_counter()
+    cluster_names = generate_scene(bpy, config, folder)
+    print("Generated {} clusters in {:.1f}s".format(len(cluster_names), time.perf_counter() - start))
+
+    stages = run_exports(bpy, addon, cluster_names, folder, args.repeat)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    baseline_stages = baseline["stages"] if baseline is not None and baseline.get("config") == config else dict()
+    if baseline is not None and len(baseline_stages) == 0:
+        print("Baseline was recorded with a different scene, not comparing")
+
+    for line in format_results(stages, baseline_stages):
+        print(line)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"config": config, "blender": bpy.app.version_string, "stages": stages}, f, indent=4)
+        print("Baseline written to", args.baseline)
+        return 0
+
+    regressions = compare_results(baseline_stages, stages, args.threshold)
+    for name, baseline_seconds, seconds in regressions:
+        print("REGRESSION {} {:.3f}s -> {:.3f}s".format(name, baseline_seconds, seconds))
+    return 1 if len(regressions) > 0 else 0
+
+def main(argv):
+    args = parse_args(batch_export.get_script_args(argv))
+    if args.keep is not None:
+        os.makedirs(args.keep, exist_ok=True)
+        return run(args, os.path.abspath(args.keep))
+    with tempfile.TemporaryDirectory() as folder:
+        return run(args, folder)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,405 @@
+import bpy
+import mathutils
+import numpy as np
+
+from . import cluster_layout, cluster_parser, node_inputs, action_sampling, action_reachability, bounding_volumes
+
+# Blender side of the scene_model protocol. The wrappers read bpy data on
+# access, bulk arrays through foreach_get, so cluster_parser sees the same
+# attributes it gets from the in-memory scene_model classes.
+
+def get_animation_actions(id_data):
+    animation_data = getattr(id_data, "animation_data", None)
+    return [BlenderAction(action) for action in action_reachability.get_animation_data_actions(animation_data)]
+
+def get_rotation_quaternion(object):
+    mode = object.rotation_mode
+    if mode == 'QUATERNION':
+        return object.rotation_quaternion.normalized()
+    if mode == 'AXIS_ANGLE':
+        angle, x, y, z = object.rotation_axis_angle
+        if x == 0 and y == 0 and z == 0:
+            return mathutils.Quaternion()
+        return mathutils.Quaternion((x, y, z), angle)
+    # rotation_euler carries the order of the rotation mode
+    return object.rotation_euler.to_quaternion()
+
+def get_array(collection, attribute, size, dtype=np.float32):
+    values = np.empty(len(collection) * size, dtype=dtype)
+    collection.foreach_get(attribute, values)
+    return values
+
+def wrap_data(data):
+    if isinstance(data, bpy.types.Mesh):
+        return BlenderMesh(data)
+    if isinstance(data, bpy.types.Curve):
+        return BlenderCurve(data)
+    return None
+
+class BlenderScene:
+
+    def __init__(self, context):
+        self.context = context
+        self.depsgraph = None
+
+    def get_depsgraph(self):
+        if self.depsgraph is None:
+            self.depsgraph = self.context.evaluated_depsgraph_get()
+        return self.depsgraph
+
+    def wrap_collection(self, collection):
+        return BlenderCollection(self, collection)
+
+    @property
+    def collections(self):
+        return [self.wrap_collection(collection) for collection in bpy.data.collections]
+
+    @property
+    def actions(self):
+        return [BlenderAction(action) for action in bpy.data.actions]
+
+class BlenderCollection:
+
+    def __init__(self, scene, collection):
+        self.scene = scene
+        self.id_data = collection
+
+    @property
+    def name(self):
+        return self.id_data.name
+
+    @property
+    def name_full(self):
+        return self.id_data.name_full
+
+    @property
+    def library(self):
+        return self.id_data.library
+
+    @property
+    def children(self):
+        return [BlenderCollection(self.scene, child) for child in self.id_data.children]
+
+    @property
+    def objects(self):
+        return [BlenderObject(self.scene, object) for object in self.id_data.objects]
+
+    @property
+    def all_objects(self):
+        return [BlenderObject(self.scene, object) for object in self.id_data.all_objects]
+
+    @property
+    def bounds(self):
+        return bounding_volumes.get_collection_bounds(self)
+
+class BlenderObject:
+
+    def __init__(self, scene, object):
+        self.scene = scene
+        self.id_data = object
+
+    @property
+    def name(self):
+        return self.id_data.name
+
+    @property
+    def name_full(self):
+        return self.id_data.name_full
+
+    @property
+    def type(self):
+        return self.id_data.type
+
+    @property
+    def location(self):
+        return np.array(self.id_data.location)
+
+    @property
+    def rotation_euler(self):
+        # converted without touching rotation_mode, exporting leaves the
+        # scene as it was
+        object = self.id_data
+        if object.rotation_mode == 'XYZ':
+            return np.array(object.rotation_euler)
+        return np.array(get_rotation_quaternion(object).to_euler('XYZ'))
+
+    @property
+    def rotation_axis_angle(self):
+        # the axis angle Blender converts to when the mode is switched
+        object = self.id_data
+        if object.rotation_mode == 'AXIS_ANGLE':
+            return np.array(object.rotation_axis_angle)
+        axis, angle = get_rotation_quaternion(object).to_axis_angle()
+        if abs(angle) < 1e-6:
+            # Blender's own conversion picks the y axis when there is none
+            axis = (0.0, 1.0, 0.0)
+        return np.array((angle, *axis))
+
+    @property
+    def scale(self):
+        return np.array(self.id_data.scale)
+
+    @property
+    def dimensions(self):
+        return np.array(self.id_data.dimensions)
+
+    @property
+    def matrix_world(self):
+        return np.array(self.id_data.matrix_world, dtype=np.float32)
+
+    @property
+    def modifiers(self):
+        # node inputs are read straight from the bpy modifiers
+        return self.id_data.modifiers
+
+    @property
+    def constraints(self):
+        return [BlenderConstraint(self.scene, constraint) for constraint in self.id_data.constraints]
+
+    @property
+    def children(self):
+        return [BlenderObject(self.scene, child) for child in self.id_data.children]
+
+    @property
+    def is_instancer(self):
+        return self.id_data.is_instancer
+
+    @property
+    def instance_collection(self):
+        collection = self.id_data.instance_collection
+        return BlenderCollection(self.scene, collection) if collection is not None else None
+
+    @property
+    def data(self):
+        return wrap_data(self.id_data.data)
+
+    @property
+    def animation_actions(self):
+        return get_animation_actions(self.id_data)
+
+    def get_evaluated(self):
+        return BlenderObject(self.scene, self.id_data.evaluated_get(self.scene.get_depsgraph()))
+
+class BlenderConstraint:
+
+    def __init__(self, scene, constraint):
+        self.type = constraint.type
+        target = getattr(constraint, "target", None)
+        self.target = BlenderObject(scene, target) if target is not None else None
+
+class BlenderMesh:
+
+    def __init__(self, mesh):
+        self.id_data = mesh
+        self.arrays = dict()
+
+    def get_cached(self, key, read):
+        values = self.arrays.get(key)
+        if values is None:
+            values = read()
+            self.arrays[key] = values
+        return values
+
+    @property
+    def co(self):
+        return self.get_cached("co", lambda: get_array(self.id_data.vertices, "co", 3).reshape(-1, 3))
+
+    @property
+    def loop_vertex_index(self):
+        return self.get_cached("loop_vertex_index", lambda: get_array(self.id_data.loops, "vertex_index", 1, np.int32))
+
+    @property
+    def triangles(self):
+        def read():
+            self.id_data.calc_loop_triangles()
+            return get_array(self.id_data.loop_triangles, "vertices", 3, np.int32)
+        return self.get_cached("triangles", read)
+
+    @property
+    def animation_actions(self):
+        return get_animation_actions(self.id_data.shape_keys)
+
+class BlenderSpline:
+
+    def __init__(self, spline):
+        points = spline.bezier_points
+        self.co = get_array(points, "co", 3).reshape(-1, 3)
+        self.handle_left = get_array(points, "handle_left", 3).reshape(-1, 3)
+        self.handle_right = get_array(points, "handle_right", 3).reshape(-1, 3)
+        self.use_cyclic_u = spline.use_cyclic_u
+
+class BlenderCurve:
+
+    def __init__(self, curve):
+        self.id_data = curve
+
+    @property
+    def splines(self):
+        return [BlenderSpline(spline) for spline in self.id_data.splines]
+
+    @property
+    def action(self):
+        animation_data = self.id_data.animation_data
+        if animation_data is None or animation_data.action is None:
+            return None
+        return BlenderAction(animation_data.action)
+
+    @property
+    def animation_actions(self):
+        return get_animation_actions(self.id_data)
+
+class BlenderAction:
+
+    def __init__(self, action):
+        self.id_data = action
+        self.name = action.name
+        self.name_full = action.name_full
+
+    @property
+    def fcurves(self):
+        return [BlenderFCurve(curve) for curve in self.id_data.fcurves]
+
+class BlenderFCurve:
+
+    def __init__(self, curve):
+        self.curve = curve
+        self.data_path = curve.data_path
+        self.array_index = curve.array_index
+
+    @property
+    def num_of_keyframes(self):
+        return len(self.curve.keyframe_points)
+
+    @property
+    def num_of_modifiers(self):
+        return len(self.curve.modifiers)
+
+    def range(self):
+        c_range = self.curve.range()
+        return c_range[0], c_range[1]
+
+    def evaluate(self, frame):
+        return self.curve.evaluate(frame)
+
+    def get_keyframes(self):
+        keyframe_points = self.curve.keyframe_points
+        co = get_array(keyframe_points, "co", 2)
+        handle_left = get_array(keyframe_points, "handle_left", 2)
+        handle_right = get_array(keyframe_points, "handle_right", 2)
+        interpolation = get_array(keyframe_points, "interpolation", 1, np.int32)
+        return co, handle_left, handle_right, interpolation
+
+class SceneSnapshot:
+    # Copies clusters into scene_model objects the export workers can
+    # unpickle. model is the scene_model module the workers import.
+    # Objects outside Mesh collections only need their vertex positions, the
+    # ones inside are copied after modifiers are applied. Polygons keep their
+    # triangles for batching.
+
+    def __init__(self, model):
+        self.model = model
+        self.node_groups = dict()
+        self.collection_bounds = dict()
+
+    def get_library(self, library):
+        return self.model.Library(library.filepath) if library is not None else None
+
+    def get_action_ref(self, action):
+        return self.model.Action(action.name, name_full=action.name_full)
+
+    def get_value(self, value):
+        if isinstance(value, bpy.types.Object):
+            return self.model.Object(value.name)
+        if isinstance(value, bpy.types.ID):
+            return value.name_full
+        if hasattr(value, "to_list"):
+            return tuple(value.to_list())
+        return value
+
+    def collection(self, view):
+        name = cluster_layout.gather_name(view.name)
+        b_evaluated = name == "Mesh"
+        b_full_mesh = name in ("Mesh", "Polygons")
+        return self.model.Collection(
+            view.name,
+            [self.collection(child) for child in view.children],
+            [self.object(object.get_evaluated() if b_evaluated else object, b_full_mesh) for object in view.objects],
+            self.get_library(view.library),
+            view.name_full)
+
+    def instance_collection(self, view):
+        # refs only need the name, library and bounds of what they instance,
+        # the dependency itself is a cluster of its own
+        if view is None:
+            return None
+        if view.name_full not in self.collection_bounds:
+            self.collection_bounds[view.name_full] = view.bounds
+        return self.model.Collection(view.name, library=self.get_library(view.library), name_full=view.name_full,
+            bounds=self.collection_bounds[view.name_full])
+
+    def object(self, view, b_full_mesh=False):
+        data = view.data
+        if isinstance(data, BlenderMesh):
+            data = self.mesh(data, b_full_mesh)
+        elif isinstance(data, BlenderCurve):
+            data = self.curve(data)
+        return self.model.Object(
+            view.name,
+            data,
+            tuple(view.location.tolist()),
+            tuple(view.rotation_euler.tolist()),
+            tuple(view.scale.tolist()),
+            tuple(view.rotation_axis_angle.tolist()),
+            view.dimensions,
+            view.matrix_world,
+            [self.modifier(modifier) for modifier in view.modifiers],
+            [self.model.Constraint(constraint.type, self.target(constraint.target)) for constraint in view.constraints],
+            [self.object(child) for child in view.children],
+            self.instance_collection(view.instance_collection),
+            [self.get_action_ref(action) for action in view.animation_actions],
+            view.type)
+
+    def target(self, view):
+        if view is None:
+            return None
+        return self.model.Object(view.name, rotation_euler=tuple(view.rotation_euler.tolist()))
+
+    def node_group(self, node_group):
+        snapshot = self.node_groups.get(node_group.name_full)
+        if snapshot is None:
+            inputs = [self.model.NodeSocket(input.name, input.identifier, 'GEOMETRY' if node_inputs.is_geometry_input(input) else 'VALUE')
+                      for input in node_inputs.get_group_inputs(node_group)]
+            snapshot = self.model.NodeGroup(node_group.name, inputs, node_group.name_full)
+            self.node_groups[node_group.name_full] = snapshot
+        return snapshot
+
+    def modifier(self, modifier):
+        if modifier.type != 'NODES' or modifier.node_group is None:
+            return self.model.Modifier(modifier.name, type=modifier.type)
+        values = {key: self.get_value(modifier[key]) for key in modifier.keys()}
+        return self.model.Modifier(modifier.name, self.node_group(modifier.node_group), values)
+
+    def mesh(self, view, b_full):
+        if not b_full:
+            return self.model.Mesh(view.co)
+        return self.model.Mesh(view.co, view.loop_vertex_index, view.triangles,
+            [self.get_action_ref(action) for action in view.animation_actions])
+
+    def curve(self, view):
+        splines = [self.model.Spline(spline.co, spline.handle_left, spline.handle_right, spline.use_cyclic_u) for spline in view.splines]
+        action = view.action
+        return self.model.Curve(splines, self.get_action_ref(action) if action is not None else None)
+
+    def action(self, view):
+        fcurves = view.fcurves
+        stride = cluster_parser.get_action_stride(fcurves) if len(fcurves) > 0 else 1
+        snapshots = []
+        for curve in fcurves:
+            co, handle_left, handle_right, interpolation = curve.get_keyframes()
+            baked = None
+            if curve.num_of_keyframes > 0 and (curve.num_of_modifiers > 0 or not action_sampling.is_supported(interpolation)):
+                c_range = curve.range()
+                baked = {float(frame): curve.evaluate(frame) for frame in action_sampling.get_frames(c_range[0], c_range[1], stride)}
+            snapshots.append(self.model.FCurve(curve.data_path, curve.array_index, co, handle_left, handle_right,
+                interpolation, curve.num_of_modifiers, baked))
+        return self.model.Action(view.name, snapshots, view.name_full)
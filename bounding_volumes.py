@@ -0,0 +1,142 @@
+import numpy as np
+
+try:
+    from . import mesh_buffers
+except ImportError:
+    # loaded as a top level module by tests.py and the export workers
+    import mesh_buffers
+
+# World space boxes of the drawable parts of a cluster and the bounding volume
+# hierarchy over them. Boxes are (min, max) pairs in engine axes, the xzy
+# swizzle of Blender's. The hierarchy is written as flat arrays, nodes in
+# depth first order: an inner node is followed by its left child and points
+# at its right one, a leaf points at its first item.
+
+BVH_MESH = 0
+BVH_POLYGON = 1
+BVH_REF = 2
+
+# items a leaf holds at most
+BVH_LEAF_SIZE = 4
+
+def get_points_bounds(points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if len(points) == 0:
+        return None
+    return points.min(axis=0), points.max(axis=0)
+
+def get_collection_bounds(collection):
+    # Blender space box of every mesh in a cluster, the extent of its refs
+    mins = []
+    maxs = []
+    for object in collection.all_objects:
+        co = getattr(object.data, "co", None)
+        if co is None or len(co) == 0:
+            continue
+        points = mesh_buffers.transform_points(co, object.matrix_world)
+        mins.append(points.min(axis=0))
+        maxs.append(points.max(axis=0))
+    if len(mins) == 0:
+        return None
+    return np.min(mins, axis=0).astype(np.float64), np.max(maxs, axis=0).astype(np.float64)
+
+def get_axis_angle_matrix(rotation_axis_angle):
+    angle, x, y, z = (float(value) for value in rotation_axis_angle)
+    axis = np.array([x, y, z])
+    length = np.linalg.norm(axis)
+    if length == 0:
+        return np.identity(3)
+    x, y, z = axis / length
+    k = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]])
+    return np.identity(3) + np.sin(angle) * k + (1 - np.cos(angle)) * k @ k
+
+def transform_bounds(bounds, location, rotation_axis_angle, scale):
+    # box of a dependency placed by a ref, in engine axes
+    b_min, b_max = bounds
+    corners = np.array([[(b_min, b_max)[(corner >> axis) & 1][axis] for axis in range(3)] for corner in range(8)])
+    corners = corners * np.asarray(scale, dtype=np.float64)
+    corners = corners @ get_axis_angle_matrix(rotation_axis_angle).T + np.asarray(location, dtype=np.float64)
+    return get_points_bounds(mesh_buffers.swizzle_xzy(corners))
+
+class BoundsList:
+    # boxes of the items the hierarchy is built over, tagged with their kind
+    # and their index in the section they are written to
+
+    def __init__(self):
+        self.kinds = []
+        self.indices = []
+        self.mins = []
+        self.maxs = []
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, index, bounds):
+        if bounds is None:
+            return
+        self.kinds.append(kind)
+        self.indices.append(index)
+        self.mins.append(bounds[0])
+        self.maxs.append(bounds[1])
+
+    def reorder(self, kind, order):
+        # follows a section that was sorted, order[new index] = old index
+        new_indices = np.empty(len(order), dtype=np.int64)
+        new_indices[order] = np.arange(len(order))
+        self.indices = [int(new_indices[index]) if item_kind == kind else index
+                        for item_kind, index in zip(self.kinds, self.indices)]
+
+def build_bvh(mins, maxs, leaf_size=BVH_LEAF_SIZE):
+    # Median split of the item centers along the longest axis. Returns node
+    # boxes, offsets, item counts (0 for inner nodes) and the item order.
+    mins = np.asarray(mins, dtype=np.float64).reshape(-1, 3)
+    maxs = np.asarray(maxs, dtype=np.float64).reshape(-1, 3)
+    num_of_items = len(mins)
+    order = np.arange(num_of_items)
+    node_mins = []
+    node_maxs = []
+    offsets = []
+    counts = []
+    if num_of_items == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3)), offsets, counts, order
+
+    centers = (mins + maxs) / 2
+    pending = [(0, num_of_items, -1)]
+    while pending:
+        start, end, parent = pending.pop()
+        node = len(offsets)
+        if parent >= 0:
+            offsets[parent] = node
+        items = order[start:end]
+        node_mins.append(mins[items].min(axis=0))
+        node_maxs.append(maxs[items].max(axis=0))
+        if end - start <= leaf_size:
+            offsets.append(start)
+            counts.append(end - start)
+            continue
+
+        item_centers = centers[items]
+        axis = int(np.argmax(item_centers.max(axis=0) - item_centers.min(axis=0)))
+        middle = (start + end) // 2
+        order[start:end] = items[np.argpartition(item_centers[:, axis], middle - start)]
+        offsets.append(-1)
+        counts.append(0)
+        # the left child is built first so it directly follows its parent
+        pending.append((middle, end, node))
+        pending.append((start, middle, -1))
+
+    return np.array(node_mins), np.array(node_maxs), offsets, counts, order
+
+def make_bvh_section(bounds_list, quantizer=None):
+    node_mins, node_maxs, offsets, counts, order = build_bvh(bounds_list.mins, bounds_list.maxs)
+    if quantizer is not None:
+        node_mins, node_maxs = quantizer.quantize_bounds(node_mins, node_maxs)
+    kinds = np.asarray(bounds_list.kinds, dtype=np.int64)
+    indices = np.asarray(bounds_list.indices, dtype=np.int64)
+    return {
+        "bounds": np.concatenate([node_mins, node_maxs], axis=1).ravel().tolist(),
+        "offsets": offsets,
+        "counts": counts,
+        "itemTypes": kinds[order].tolist(),
+        "itemIndices": indices[order].tolist()
+    }
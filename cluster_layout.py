@@ -0,0 +1,47 @@
+# Naming rules of the cluster collection layout. They only read .name and
+# .children, so they work on bpy data and on the scene_model snapshots alike.
+
+def gather_name(str):
+    parts = str.split('.')
+    if len(parts) <= 0:
+        return str
+    return parts[0]
+
+def find_collection(root, search_name):
+    for collection in root.children:
+        name = collection.name
+        if gather_name(name) == search_name:
+            return collection
+    
+    return None
+
+def find_object(root, search_name):
+    for object in root.children:
+        name = object.name
+        if gather_name(name) == search_name:
+            return object
+    
+    return None
+
+def get_is_cluster_collection(raw_name):
+    name = gather_name(raw_name)
+    return name == "Dynamic" or name == "Static" or name == "Kinematic"
+
+def get_cluster_collection(root):
+    collection = root.children[0]
+    if get_is_cluster_collection(collection.name):
+        return collection
+    return None
+
+def get_cluster_collection_rec(root):
+    for collection in root.children:
+        if get_is_cluster_collection(collection.name):
+            return collection
+        return get_cluster_collection_rec(collection)
+    return None
+
+def trim_name(name):
+    return name.split('.')[0] + ']'
+
+def trim_name_full(name):
+    return name.split('.')[0]
@@ -0,0 +1,912 @@
+import hashlib
+import json
+import logging
+import math
+
+import numpy as np
+
+try:
+    from . import cluster_layout, mesh_buffers, dependency_graph, node_inputs, action_sampling, quantization, profiler, bounding_volumes, spatial_order, \
+        track_sampling, action_reachability
+except ImportError:
+    # loaded as a top level module by tests.py and the export workers
+    import cluster_layout, mesh_buffers, dependency_graph, node_inputs, action_sampling, quantization, profiler, bounding_volumes, spatial_order, \
+        track_sampling, action_reachability
+
+# Turns clusters into intermediate json sections. The parsers only read the
+# attributes listed in scene_model.py, so the same code runs on Blender data
+# through blender_scene.py and on in-memory scenes without Blender.
+
+logger = logging.getLogger(__name__)
+
+class DependencyOverride:
+    def __init__(self, name, src_dependency):
+        self.name = name
+        self.src_dependency = src_dependency
+        self.collision_overrites_names = []
+        self.collision_overrites = []
+        self.beams_overrites_names = []
+        self.beams_overrites = []
+
+    def get_key(self):
+        # Digest over a canonical serialization of everything the override
+        # changes. The instance name is left out, so identical overrides on
+        # different instances share one exported variant, and the key is the
+        # same in every session.
+        def canonical(names, overrites):
+            return sorted([name, [float(value) for value in data]] for name, data in zip(names, overrites))
+
+        data = json.dumps({
+            "dependency": self.src_dependency,
+            "collisions": canonical(self.collision_overrites_names, self.collision_overrites),
+            "beams": canonical(self.beams_overrites_names, self.beams_overrites),
+        }, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+    def __hash__(self):
+        return hash(self.get_key())
+
+    def __eq__(self, other):
+        return isinstance(other, DependencyOverride) and self.get_key() == other.get_key()
+
+    def add_collision_overrite(self, object_name, data):
+        self.collision_overrites_names.append(object_name)
+        self.collision_overrites.append(data)
+
+    def add_beams_overrite(self, object_name, data):
+        self.beams_overrites_names.append(object_name)
+        self.beams_overrites.append(data)
+
+    def get_name(self):
+        return self.name
+
+    def get_src_dependency(self):
+        return self.src_dependency
+
+class DependencyNode:
+    def __init__(self, name, root, override, location, rotation, scale):
+        self.name = name
+        self.root = root
+        self.override = override
+        self.location = location
+        self.rotation = rotation
+        self.scale = scale
+
+    def get_placement(self):
+        # the parent transform is baked into the intermediate, so it belongs
+        # to the fingerprint of the dependency
+        return [np.asarray(value, dtype=np.float64) for value in (self.location, self.rotation, self.scale)]
+
+ROOT_LOCATION = (0.0, 0.0, 0.0)
+ROOT_ROTATION = (0.0, 1.0, 0.0, 0.0)
+ROOT_SCALE = (1.0, 1.0, 1.0)
+
+def get_action_stride(fcurves):
+    # long actions are sampled on every other frame
+    c_range = fcurves[0].range()
+    return 2 if c_range[1] - c_range[0] + 1 > 64 else 1
+
+def get_xz(points):
+    # world positions to the engine's 2d plane
+    return np.asarray(points)[..., [0, 2]]
+
+class ClusterParser:
+
+    def __init__(self, node_input_registry=None, quantization_report=None, export_profiler=None, mesh_format='V1', mesh_optimizer=None,
+                 lod_builder=None, build_bvh=False, order=spatial_order.ORDER_NONE, collision_optimizer=None,
+                 polygon_batches=False, track_resolution=0):
+        self.node_inputs = node_input_registry or node_inputs.NodeInputRegistry()
+        self.quantization = quantization_report or quantization.QuantizationReport(quantization.MODE_NONE, 0, 0, 0, 0)
+        self.profiler = export_profiler or profiler.ExportProfiler(False)
+        self.mesh_format = mesh_format
+        # mesh_optimizer.MeshOptimizer or None to write meshes as they are
+        self.mesh_optimizer = mesh_optimizer
+        # mesh_lods.LodBuilder or None to export full detail meshes only
+        self.lod_builder = lod_builder
+        # writes a bvh section over the meshes, polygons and refs
+        self.build_bvh = build_bvh
+        self.dependency_bounds = dict()
+        # space filling curve shapes and refs are sorted along
+        self.order = order
+        # collision_optimizer.CollisionOptimizer or None to keep every shape
+        self.collision_optimizer = collision_optimizer
+        # polygons are written as one triangle batch per color instead of quads
+        self.polygon_batches = polygon_batches
+        # entries of the track arc length tables, 0 writes the control points only
+        self.track_resolution = track_resolution
+
+    def get_quantize(self, quantizer):
+        return quantizer.quantize if quantizer.enabled else None
+
+    def get_mesh_bounds(self, mesh, world):
+        # engine space box of the vertices the mesh export writes
+        used = np.unique(np.asarray(mesh.loop_vertex_index, dtype=np.int64))
+        return bounding_volumes.get_points_bounds(mesh_buffers.swizzle_xzy(mesh_buffers.transform_points(mesh.co, world)[used]))
+
+    def add_name(self, record, object):
+        # sorted sections are looked up by name instead of position
+        if self.order != spatial_order.ORDER_NONE:
+            record["name"] = object.name
+        return record
+
+    def sort_records(self, records, get_point, bounds=None, kind=None):
+        if self.order == spatial_order.ORDER_NONE or len(records) <= 1:
+            return records
+        order = spatial_order.get_order([get_point(record) for record in records], self.order)
+        if bounds is not None:
+            bounds.reorder(kind, order)
+        return [records[index] for index in order]
+
+    def get_dependency_bounds(self, collection):
+        key = collection.name_full
+        if key not in self.dependency_bounds:
+            self.dependency_bounds[key] = collection.bounds
+        return self.dependency_bounds[key]
+
+    def parse_polygons(self, root, bounds=None):
+
+        collection = cluster_layout.find_collection(root, "Polygons")
+        if collection is None:
+            return []
+
+        json_polygons = []
+
+        for object in collection.objects:
+            # corners in the order the engine expects: 0, 1, 3, 2
+            world_points = mesh_buffers.transform_points(object.data.co[[0, 1, 3, 2]], object.matrix_world)
+            points = get_xz(world_points).tolist()
+            if bounds is not None:
+                bounds.add(bounding_volumes.BVH_POLYGON, len(json_polygons),
+                    bounding_volumes.get_points_bounds(mesh_buffers.swizzle_xzy(world_points)))
+
+            json_polygons.append(self.add_name({
+                "v0": points[0],
+                "v1": points[1],
+                "v2": points[2],
+                "v3": points[3],
+                "color": self.get_polygon_color(object)
+            }, object))
+
+        self.quantization.positions.quantize_records(json_polygons, ("v0", "v1", "v2", "v3"))
+        return json_polygons
+
+    def get_polygon_color(self, object):
+        color_data = [0.55, 0.55, 0.6]
+        for modifier in object.modifiers:
+            if modifier.type != "NODES":
+                continue
+            if modifier.node_group.name != "Color":
+                continue
+            color_data = self.node_inputs.extract(modifier).color
+        return color_data
+
+    def parse_polygon_batches(self, root, bounds=None):
+        # Every polygon of a color goes into one indexed triangle list. Faces
+        # come from the mesh triangulation, so any n-gon works, and triangles
+        # are counter clockwise on the engine's 2d plane.
+        collection = cluster_layout.find_collection(root, "Polygons")
+        if collection is None:
+            return []
+
+        polygons = []
+        for object in collection.objects:
+            mesh = object.data
+            triangles = getattr(mesh, "triangles", None)
+            if triangles is None or len(triangles) == 0:
+                logger.warning("Polygon %s has no faces, skipped", object.name)
+                continue
+            triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+            used = np.unique(triangles)
+            world_points = mesh_buffers.transform_points(mesh.co[used], object.matrix_world)
+            polygons.append((tuple(self.get_polygon_color(object)), world_points, np.searchsorted(used, triangles)))
+
+        if self.order != spatial_order.ORDER_NONE:
+            # neighbours on the map end up next to each other in the batch
+            order = spatial_order.get_order([get_xz(world_points).mean(axis=0) for _, world_points, _ in polygons], self.order)
+            polygons = [polygons[index] for index in order]
+
+        batches = dict()
+        for color, world_points, triangles in polygons:
+            batches.setdefault(color, []).append((world_points, triangles))
+
+        json_batches = []
+        for color, batch in batches.items():
+            world_points = np.concatenate([points for points, _ in batch])
+            offsets = np.cumsum([0] + [len(points) for points, _ in batch[:-1]])
+            triangles = np.concatenate([triangles + offset for (_, triangles), offset in zip(batch, offsets)])
+            points = get_xz(world_points)
+            edges = points[triangles[:, 1:]] - points[triangles[:, :1]]
+            b_clockwise = edges[:, 0, 0] * edges[:, 1, 1] - edges[:, 0, 1] * edges[:, 1, 0] < 0
+            triangles[b_clockwise] = triangles[b_clockwise][:, ::-1]
+
+            if bounds is not None:
+                bounds.add(bounding_volumes.BVH_POLYGON, len(json_batches),
+                    bounding_volumes.get_points_bounds(mesh_buffers.swizzle_xzy(world_points)))
+            json_batches.append({
+                "color": list(color),
+                "positions": points.ravel().tolist(),
+                "indices": triangles.ravel().tolist()
+            })
+
+        self.quantization.positions.quantize_records(json_batches, ("positions",))
+        return json_batches
+
+    def parse_object_refs(self, root, parent_location, parent_scale, bounds=None):
+        collection = cluster_layout.find_collection(root, "Objects")
+        if collection is None:
+            return [], dict(), dict(), dict(), dict(), dict()
+
+        parent_location = np.asarray(parent_location, dtype=np.float64)
+        parent_scale = np.asarray(parent_scale, dtype=np.float64)
+
+        dependencies = dict()
+        dependencies_locations = dict()
+        dependencies_rotations = dict()
+        dependencies_scales = dict()
+
+        overrides = dict()
+
+        json_object_refs = []
+
+        for object in collection.objects:
+            if not object.is_instancer:
+                continue
+            linked_collection = object.instance_collection
+            library = linked_collection.library
+            if library is None:
+                continue
+
+            dependency_key = cluster_layout.trim_name(linked_collection.name_full)
+            dependency_key_with_override = dependency_key
+
+            overrides_object = cluster_layout.find_object(object, "overrides")
+            if overrides_object is not None:
+                dep_override = DependencyOverride(object.name, dependency_key)
+                for modifier in overrides_object.modifiers:
+                    if modifier.type != "NODES":
+                        continue
+
+                    record = self.node_inputs.extract(modifier)
+                    if isinstance(record, node_inputs.CollisionRecord):
+                        override_data = (
+                            record.density,
+                            record.restitution,
+                            record.friction,
+                            record.is_sensor,
+                            )
+                        dep_override.add_collision_overrite(modifier.name, override_data)
+                    elif isinstance(record, node_inputs.BeamRecord):
+                        override_data = (
+                            record.max_length,
+                            record.width,
+                            record.enabled,
+                        )
+                        dep_override.add_beams_overrite(modifier.name, override_data)
+
+                dependency_key_with_override = dependency_key + dep_override.get_key()
+                overrides[dependency_key_with_override] = dep_override
+
+            dependencies[dependency_key] = library.filepath
+
+            location = np.asarray(object.location, dtype=np.float64) * parent_scale + parent_location
+            rotation = np.asarray(object.rotation_axis_angle, dtype=np.float64)
+            scale = np.asarray(object.scale, dtype=np.float64) * parent_scale
+
+            dependencies_locations[dependency_key] = location
+            dependencies_rotations[dependency_key] = rotation
+            dependencies_scales[dependency_key] = scale
+
+            if bounds is not None:
+                dependency_bounds = self.get_dependency_bounds(linked_collection)
+                if dependency_bounds is not None:
+                    bounds.add(bounding_volumes.BVH_REF, len(json_object_refs),
+                        bounding_volumes.transform_bounds(dependency_bounds, location, rotation, scale))
+
+            json_object_refs.append({
+                "name": object.name,
+                "dependency" : dependency_key_with_override,
+                "location": location.tolist(),
+                # axis first, angle last
+                "rotation": rotation[[1, 2, 3, 0]].tolist(),
+                "scale": scale.tolist()
+            })
+
+        self.quantization.positions.quantize_records(json_object_refs, ("location", "scale"))
+        self.quantization.rotations.quantize_records(json_object_refs, ("rotation",))
+        return json_object_refs, dependencies, overrides, dependencies_locations, dependencies_rotations, dependencies_scales
+
+    def parse_joint_weld(self, json_joints_welds, object, record):
+        target1 = record.target1
+        target2 = record.target2
+        logger.debug("Joint targets %s %s", target1, target2)
+        if (target1 is None) or (target2 is None):
+            return
+
+        targetOffset = [0, 0]
+        for constraint in object.constraints:
+            if constraint.type != "CHILD_OF":
+                continue
+            target = constraint.target
+            curr_location = object.location
+            rotation = target.rotation_euler[1]
+            rx = curr_location[0] * math.cos(rotation) + curr_location[2] * math.sin(rotation)
+            ry = curr_location[0] * -math.sin(rotation) + curr_location[2] * math.cos(rotation)
+            targetOffset[0] = float(rx)
+            targetOffset[1] = float(ry)
+
+        json_joints_welds.append({
+            "target1": target1.name,
+            "target2": target2.name,
+            "targetOffset": targetOffset,
+            "collideConnected": record.collide_connected,
+            "dampingRatio": record.damping_ratio,
+            "friquencyHZ": record.friquency_hz
+        })
+
+    def parse_joint_distance(self, json_joints_distance, record):
+        target1 = record.target1
+        target2 = record.target2
+        logger.debug("Joint targets %s %s", target1, target2)
+        if (target1 is None) or (target2 is None):
+            return
+
+        json_joints_distance.append({
+            "target1": target1.name,
+            "target2": target2.name,
+            "target1Offset": [
+                record.target1_offset_x,
+                record.target1_offset_y
+                ],
+            "target2Offset": [
+                record.target2_offset_x,
+                record.target2_offset_y
+                ],
+            "collideConnected": record.collide_connected,
+            "dampingRatio": record.damping_ratio,
+            "friquencyHZ": record.friquency_hz
+        })
+
+    def parse_joint_wheel(self, json_joints_wheel, record):
+        target1 = record.target1
+        target2 = record.target2
+        logger.debug("Joint targets %s %s", target1, target2)
+        if (target1 is None) or (target2 is None):
+            return
+
+        json_joints_wheel.append({
+            "target1": target1.name,
+            "target2": target2.name,
+            "target1Offset": [
+                record.target1_offset_x,
+                record.target1_offset_y
+                ],
+            "target2Offset": [
+                record.target2_offset_x,
+                record.target2_offset_y
+                ],
+            "localAxis": [
+                record.local_axis_x,
+                record.local_axis_y
+                ],
+            "collideConnected": record.collide_connected,
+            "maxMotorTorque": record.max_motor_torque,
+            "motorSpeed": record.motor_speed,
+            "dampingRatio": record.damping_ratio,
+            "friquencyHZ": record.friquency_hz
+        })
+
+    def parse_joints(self, root):
+        logger.debug("Links root %s", root.name)
+        collection = cluster_layout.find_collection(root, "Links")
+        if collection is None:
+            return []
+
+        logger.debug("Parsing joints in %s", collection.name)
+
+        json_joints_welds = []
+        json_joints_distance = []
+        json_joints_wheel = []
+
+        for object in collection.objects:
+            logger.debug("%s modifiers %s", object.name, object.modifiers)
+            for modifier in object.modifiers:
+                logger.debug("modifier type %s", modifier.type)
+                if modifier.type != 'NODES':
+                    continue
+                nodes = modifier.node_group
+                logger.debug("node group %s", nodes.name)
+                if nodes.name == 'JointWeld':
+                    self.parse_joint_weld(json_joints_welds, object, self.node_inputs.extract(modifier))
+                elif nodes.name == 'JointDistance':
+                    self.parse_joint_distance(json_joints_distance, self.node_inputs.extract(modifier))
+                elif nodes.name == 'JointWheel':
+                    self.parse_joint_wheel(json_joints_wheel, self.node_inputs.extract(modifier))
+
+        for json_joint_objects in (json_joints_welds, json_joints_distance, json_joints_wheel):
+            self.quantization.positions.quantize_records(json_joint_objects, ("targetOffset", "target1Offset", "target2Offset"))
+            self.quantization.rotations.quantize_records(json_joint_objects, ("localAxis",))
+            self.quantization.physics.quantize_records(json_joint_objects, ("dampingRatio", "friquencyHZ", "maxMotorTorque", "motorSpeed"))
+
+        return [
+            {"type": "Joints-weld", "objects": json_joints_welds},
+            {"type": "Joints-distance", "objects": json_joints_distance},
+            {"type": "Joints-wheel", "objects": json_joints_wheel},
+        ]
+
+    def parse_object_bounding_box(self, object, box, json_bounding_box_data):
+        # tight world space box of the written vertices, a mesh without any
+        # keeps an empty box at its origin
+        if box is None:
+            center = np.asarray(object.location, dtype=np.float64)[[0, 2, 1]]
+            hDims = np.zeros(3)
+        else:
+            center = (box[0] + box[1]) / 2
+            hDims = (box[1] - box[0]) / 2
+
+        json_bounding_box_data.append({
+            "center": center.tolist(),
+            "hdims": hDims.tolist()
+        })
+
+    def prepare_mesh_data(self, mesh, world):
+        out_buffer = mesh_buffers.build_mesh_v1(mesh.co, np.array(world, dtype=np.float32), mesh.loop_vertex_index, mesh.triangles,
+            self.get_quantize(self.quantization.positions))
+
+        logger.debug("num of vertices %s", out_buffer[0])
+        logger.debug("num of indices %s", out_buffer[out_buffer[0] * 3 + 1])
+
+        return out_buffer
+
+    def parse_lods(self, json_mesh_data, mesh_id, positions, indices):
+        json_levels = []
+        quantize = self.get_quantize(self.quantization.positions)
+        for screen_size, lod_positions, lod_indices in self.lod_builder.build(positions, indices):
+            if quantize is not None:
+                lod_positions = quantize(lod_positions)
+            if isinstance(json_mesh_data, mesh_buffers.MeshBufferSidecar):
+                json_lod_mesh = json_mesh_data.pack(lod_positions, lod_indices)
+            else:
+                json_lod_mesh = mesh_buffers.pack_mesh_v1(lod_positions, lod_indices)
+            json_levels.append({
+                "screenSize": screen_size,
+                "mesh": json_lod_mesh
+            })
+        return {
+            "mesh": mesh_id,
+            "lods": json_levels
+        }
+
+    def parse_mesh(self, root, bounds=None):
+        collection = cluster_layout.find_collection(root, "Mesh")
+        if collection is None:
+            return [], [], []
+
+        b_sidecar = self.mesh_format == 'V2'
+        b_arrays = self.mesh_optimizer is not None or self.lod_builder is not None
+        json_mesh_data = mesh_buffers.MeshBufferSidecar() if b_sidecar else []
+        json_bounding_box_data = []
+        json_lods_data = []
+        for object_raw in collection.objects:
+            object = object_raw.get_evaluated()
+            mesh = object.data
+            if mesh is None or object.type != 'MESH':
+                continue
+            if b_arrays:
+                positions, indices = mesh_buffers.build_mesh_arrays(mesh.co, np.array(object.matrix_world, dtype=np.float32),
+                    mesh.loop_vertex_index, mesh.triangles, self.get_quantize(self.quantization.positions), np.float64)
+                if self.mesh_optimizer is not None:
+                    positions, indices = self.mesh_optimizer.optimize(positions, indices)
+                if b_sidecar:
+                    mesh_id = len(json_mesh_data.meshes)
+                    json_mesh_data.add(positions, indices)
+                else:
+                    mesh_id = len(json_mesh_data)
+                    json_mesh_data.append(mesh_buffers.pack_mesh_v1(positions, indices))
+                if self.lod_builder is not None:
+                    json_lods_data.append(self.parse_lods(json_mesh_data, mesh_id, positions, indices))
+                box = bounding_volumes.get_points_bounds(positions)
+            elif b_sidecar:
+                positions, indices = mesh_buffers.build_mesh_arrays(mesh.co, np.array(object.matrix_world, dtype=np.float32),
+                    mesh.loop_vertex_index, mesh.triangles, self.get_quantize(self.quantization.positions))
+                json_mesh_data.add(positions, indices)
+                box = bounding_volumes.get_points_bounds(positions)
+            else:
+                json_mesh_data.append(self.prepare_mesh_data(mesh, object.matrix_world))
+                box = self.get_mesh_bounds(mesh, object.matrix_world)
+
+            if bounds is not None:
+                bounds.add(bounding_volumes.BVH_MESH, len(json_bounding_box_data), box)
+            self.parse_object_bounding_box(object, box, json_bounding_box_data)
+
+        self.quantization.positions.quantize_records(json_bounding_box_data, ("center", "hdims"))
+        return json_mesh_data, json_bounding_box_data, json_lods_data
+
+    def get_override_data(self, names, overrites, object_name):
+        if object_name in names:
+            return overrites[names.index(object_name)]
+        return None
+
+    def parse_collisions(self, root, override):
+
+        collection = cluster_layout.find_collection(root, "Collision")
+        if collection is None:
+            return [], []
+
+        json_collision_circles_data = []
+        json_collision_polygon_data = []
+
+        for c_object in collection.objects:
+            logger.debug("%s modifiers %s", c_object.name, c_object.modifiers)
+            for modifier in c_object.modifiers:
+                logger.debug("modifier type %s", modifier.type)
+                if modifier.type != 'NODES':
+                    continue
+
+                override_data = None
+                if override is not None:
+                    override_data = self.get_override_data(override.collision_overrites_names, override.collision_overrites, c_object.name)
+
+                nodes = modifier.node_group
+                logger.debug("node group %s", nodes.name)
+                if nodes.name not in node_inputs.COLLISION_NODE_GROUPS:
+                    continue
+
+                record = self.node_inputs.extract(modifier)
+                density = record.density
+                restitution = record.restitution
+                friction = record.friction
+                if override_data is not None:
+                    density = override_data[0]
+                    restitution = override_data[1]
+                    friction = override_data[2]
+
+                if nodes.name == 'CollisionCircle':
+                    location = c_object.location
+                    json_collision_circles_data.append(self.add_name({
+                        "radius": float(c_object.dimensions[0]) / 2,
+                        "density": density,
+                        "restitution": restitution,
+                        "friction": friction,
+                        "filterData": record.filter_data,
+                        "location": [
+                            float(location[0]),
+                            float(location[2])
+                        ]
+                    }, c_object))
+                else:
+                    co = c_object.data.co
+                    if len(co) != 4:
+                        logger.warning("Collision polygon %s has %s vertices instead of 4, skipped", c_object.name, len(co))
+                        continue
+
+                    points = get_xz(mesh_buffers.transform_points(co[[0, 1, 3, 2]], c_object.matrix_world))
+                    json_collision_polygon_data.append(self.add_name({
+                        "density": density,
+                        "restitution": restitution,
+                        "friction": friction,
+                        "filterData": record.filter_data,
+                        "points": points.ravel().tolist()
+                    }, c_object))
+
+        for json_shapes in (json_collision_circles_data, json_collision_polygon_data):
+            self.quantization.positions.quantize_records(json_shapes, ("radius", "location", "points"))
+            self.quantization.physics.quantize_records(json_shapes, ("density", "restitution", "friction"))
+        return json_collision_circles_data, json_collision_polygon_data
+
+    def parse_beams(self, root, override, parent_location, parent_rotation, parent_scale):
+        # beams are written in cluster space, the parent transform is applied
+        # by the engine through the object ref
+        collection = cluster_layout.find_collection(root, "Beams")
+        if collection is None:
+            return [], []
+
+        json_beams_enabled_data = []
+        json_beams_disabled_data = []
+
+        for object in collection.objects:
+            logger.debug("%s modifiers %s", object.name, object.modifiers)
+
+            override_data = None
+            if override is not None:
+                override_data = self.get_override_data(override.beams_overrites_names, override.beams_overrites, object.name)
+
+            for modifier in object.modifiers:
+                logger.debug("modifier type %s", modifier.type)
+                if modifier.type != 'NODES':
+                    continue
+
+                nodes = modifier.node_group
+                logger.debug("node group %s", nodes.name)
+                if nodes.name != 'Beam':
+                    continue
+
+                record = self.node_inputs.extract(modifier)
+                max_length = record.max_length
+                width = record.width
+                enabled = record.enabled
+                if override_data is not None:
+                    max_length = override_data[0]
+                    width = override_data[1]
+                    enabled = override_data[2]
+
+                location = object.location
+                beam_data = self.add_name({
+                    "rotation": float(object.rotation_euler[1]),
+                    "maxLength": max_length,
+                    "width": width,
+                    "location": [
+                        float(location[0]),
+                        float(location[2])
+                    ]
+                }, object)
+                if enabled:
+                    json_beams_enabled_data.append(beam_data)
+                else:
+                    json_beams_disabled_data.append(beam_data)
+
+        for json_beams in (json_beams_enabled_data, json_beams_disabled_data):
+            self.quantization.positions.quantize_records(json_beams, ("location", "maxLength", "width"))
+            self.quantization.rotations.quantize_records(json_beams, ("rotation",))
+        return json_beams_enabled_data, json_beams_disabled_data
+
+    def collect_reachable_actions(self, graph):
+        return action_reachability.collect_reachable_actions(graph)
+
+    def parse_actions(self, actions, action_names=None):
+        json_actions_data = []
+
+        for action in action_reachability.select_actions(actions, action_names):
+
+            fcurves = action.fcurves
+            if len(fcurves) == 0:
+                continue
+
+            stride = get_action_stride(fcurves)
+
+            values_total = []
+            types_total = []
+
+            for curve in fcurves:
+                if curve.num_of_keyframes == 0:
+                    continue
+
+                co, handle_left, handle_right, interpolation = curve.get_keyframes()
+                if action_sampling.is_constant(co, handle_left, handle_right):
+                    continue
+
+                c_range = curve.range()
+                frames = action_sampling.get_frames(c_range[0], c_range[1], stride)
+
+                if curve.num_of_modifiers == 0 and action_sampling.is_supported(interpolation):
+                    values = action_sampling.sample_keyframes(co, handle_left, handle_right, interpolation, frames)
+                else:
+                    values = np.array([curve.evaluate(frame) for frame in frames])
+
+                type = curve.data_path + str(curve.array_index)
+                bNegate = type == "rotation_axis_angle0" or type == "rotation_euler1"
+                if bNegate:
+                    values = -values
+                values = self.quantization.actions.quantize(values)
+
+                types_total.append(type)
+                values_total.append(values.tolist())
+
+            if len(values_total) == 0:
+                continue
+
+            frame_delta_time = 1/60
+            json_actions_data.append({
+                "name": action.name,
+                "timeStride": frame_delta_time * stride,
+                "types": types_total,
+                "data": values_total
+            })
+
+        return json_actions_data
+
+    def parse_tracks(self, root):
+        logger.debug("Parsing tracks in %s", root.name)
+        collection = cluster_layout.find_collection(root, "Tracks")
+        if collection is None:
+            logger.debug("No tracks registered")
+            return []
+
+        json_tracks_data = []
+
+        # the first spline stays on the track record, further ones are listed
+        # in its splines
+        json_splines_data = []
+        for object in collection.objects:
+            track_data = object.data
+            if track_data is None:
+                continue
+
+            json_splines = []
+            for spline in track_data.splines:
+                if len(spline.co) == 0:
+                    continue
+
+                # left handle, point, right handle of every bezier point
+                points = np.stack((spline.handle_left, spline.co, spline.handle_right), axis=1).reshape(-1, 3)
+                points = mesh_buffers.transform_points(points, object.matrix_world)
+                control_points_x = points[:, 0].tolist()
+                control_points_y = points[:, 2].tolist()
+
+                if not spline.use_cyclic_u:
+                    control_points_x = control_points_x[1:-1]
+                    control_points_y = control_points_y[1:-1]
+                else:
+                    control_points_x = control_points_x[1:] + control_points_x[:2]
+                    control_points_y = control_points_y[1:] + control_points_y[:2]
+
+                json_splines.append({
+                    "pointsX": control_points_x,
+                    "pointsY": control_points_y,
+                    "cyclic": bool(spline.use_cyclic_u)
+                })
+            if len(json_splines) == 0:
+                continue
+
+            action = track_data.action
+            if action is None:
+                continue
+
+            json_track = {
+                "name": object.name,
+                "actionName": action.name
+            }
+            json_track.update(json_splines[0])
+            json_track["splines"] = json_splines[1:]
+            json_tracks_data.append(json_track)
+            json_splines_data.append(json_track)
+            json_splines_data.extend(json_splines[1:])
+
+        self.quantization.positions.quantize_records(json_splines_data, ("pointsX", "pointsY"))
+        if self.track_resolution > 0:
+            # tables follow the points as written
+            for json_spline in json_splines_data:
+                length, table = track_sampling.get_arc_length_table(
+                    np.stack((json_spline["pointsX"], json_spline["pointsY"]), axis=1), self.track_resolution)
+                json_spline["length"] = length
+                json_spline["arcLengthTable"] = table.tolist()
+            self.quantization.positions.quantize_records(json_splines_data, ("length",))
+        logger.debug("json_tracks_data %s", json_tracks_data)
+        return json_tracks_data
+
+    def find_dependency_collections(self, collections):
+        dependency_collections = dict()
+        for dep in collections:
+            dependency_collections.setdefault(cluster_layout.trim_name(dep.name_full), dep)
+        return dependency_collections
+
+    def plan_dependencies(self, cluster, collections):
+        # Walks the Objects collections of the whole cluster tree before
+        # anything is exported, so a (dependency, override) variant shared by
+        # several parents becomes a single node of the graph.
+        dependency_collections = self.find_dependency_collections(collections)
+
+        graph = dependency_graph.DependencyGraph()
+        graph.add_node(cluster.name, DependencyNode(cluster.name, cluster, None, np.array(ROOT_LOCATION), np.array(ROOT_ROTATION), np.array(ROOT_SCALE)))
+
+        pending = [cluster.name]
+        while pending:
+            parent_key = pending.pop()
+            parent = graph.get(parent_key)
+
+            cluster_collection = cluster_layout.get_cluster_collection(parent.root)
+            if cluster_collection is None:
+                continue
+            with self.profiler.stage("parse_object_refs", parent_key):
+                _, dependecies, overrides, dependencies_locations, dependencies_rotations, dependencies_scales = \
+                    self.parse_object_refs(cluster_collection, parent.location, parent.scale)
+
+            for name in dependecies:
+                root_src = dependency_collections.get(name)
+                if root_src is None:
+                    logger.warning("Cannot find dependency %s", name)
+                    continue
+
+                overrides_list = [None]
+                for override in overrides.values():
+                    if override.get_src_dependency() == name:
+                        overrides_list.append(override)
+
+                for override in overrides_list:
+                    out_name = name
+                    if override is not None:
+                        out_name = name + override.get_key()
+
+                    node = DependencyNode(out_name, root_src, override, dependencies_locations[name], dependencies_rotations[name], dependencies_scales[name])
+                    if graph.add_node(out_name, node):
+                        pending.append(out_name)
+                    graph.add_edge(parent_key, out_name)
+
+        return graph
+
+    def parse_cluster(self, root, parent_location, parent_rotation, parent_scale, override):
+        # Yields the cluster sections in file order, dump writes each one as
+        # soon as it is parsed.
+        cluster_name = root.name
+        if override is not None:
+            cluster_name = cluster_name + override.get_key()
+
+        logger.info("Trying to parse cluster %s", cluster_name)
+
+        cluster_collection = cluster_layout.get_cluster_collection(root)
+        if cluster_collection is None:
+            return
+
+        cluster_type = cluster_layout.gather_name(cluster_collection.name)
+        logger.debug("Cluster type %s", cluster_type)
+
+        yield "name", cluster_name
+        yield "type", cluster_type
+
+        stage = self.profiler.stage
+        bounds = bounding_volumes.BoundsList() if self.build_bvh else None
+
+        #parse objects, dependencies are exported separately in plan order
+        with stage("parse_object_refs", cluster_name):
+            json_object_refs = self.parse_object_refs(cluster_collection, parent_location, parent_scale, bounds)[0]
+            json_object_refs = self.sort_records(json_object_refs, lambda ref: ref["location"][::2], bounds, bounding_volumes.BVH_REF)
+        yield "objectRefs", json_object_refs
+
+        #parse collisions
+        with stage("parse_collisions", cluster_name):
+            json_collision_circles, json_collision_polygons = self.parse_collisions(cluster_collection, override)
+            if self.collision_optimizer is not None:
+                json_collision_circles, json_collision_polygons = self.collision_optimizer.optimize(json_collision_circles, json_collision_polygons)
+            json_collision_circles = self.sort_records(json_collision_circles, lambda circle: circle["location"])
+            json_collision_polygons = self.sort_records(json_collision_polygons, lambda polygon: np.reshape(polygon["points"], (-1, 2)).mean(axis=0))
+        yield "collision-circles", json_collision_circles
+        yield "collision-polygons", json_collision_polygons
+
+        with stage("parse_beams", cluster_name):
+            json_beams_enabled, json_beams_disabled = self.parse_beams(cluster_collection, override, parent_location, parent_rotation, parent_scale)
+            json_beams_enabled = self.sort_records(json_beams_enabled, lambda beam: beam["location"])
+            json_beams_disabled = self.sort_records(json_beams_disabled, lambda beam: beam["location"])
+        yield "beams-enabled", json_beams_enabled
+        yield "beams-disabled", json_beams_disabled
+
+        #parse joints
+        with stage("parse_joints", cluster_name):
+            json_joints = self.parse_joints(cluster_collection)
+        yield "joints", json_joints
+
+        #parse meshes
+        with stage("parse_mesh", cluster_name):
+            json_meshes, json_boundings, json_lods = self.parse_mesh(cluster_collection, bounds)
+        if isinstance(json_meshes, mesh_buffers.MeshBufferSidecar):
+            yield "meshes-v1", []
+            yield "meshes-v2", json_meshes
+        else:
+            yield "meshes-v1", json_meshes
+        if self.lod_builder is not None:
+            yield "meshes-lods", json_lods
+        yield "boundings", json_boundings
+
+        if self.polygon_batches:
+            # bvh polygon items are batches here
+            with stage("parse_polygons", cluster_name):
+                json_batches = self.parse_polygon_batches(cluster_collection, bounds)
+            yield "polygons", []
+            yield "polygon-batches", json_batches
+        else:
+            with stage("parse_polygons", cluster_name):
+                json_polygons = self.parse_polygons(cluster_collection, bounds)
+                json_polygons = self.sort_records(json_polygons, lambda polygon: np.mean([polygon[key] for key in ("v0", "v1", "v2", "v3")], axis=0),
+                    bounds, bounding_volumes.BVH_POLYGON)
+            logger.debug("Polygons %s", json_polygons)
+            yield "polygons", json_polygons
+
+        if bounds is not None:
+            with stage("build_bvh", cluster_name):
+                json_bvh = bounding_volumes.make_bvh_section(bounds, self.quantization.positions)
+            yield "bvh", json_bvh
+
+        with stage("parse_tracks", cluster_name):
+            json_tracks = self.parse_tracks(cluster_collection)
+        logger.debug("Tracks %s", json_tracks)
+        yield "tracks", json_tracks
+
+        yield "actions", {}
@@ -0,0 +1,238 @@
+from collections import deque
+
+import numpy as np
+
+# Optional clean up of the collision shapes of a cluster. Shapes are only
+# combined with shapes of the same density, restitution, friction and filter
+# data. Two convex polygons become their convex hull when the hull covers
+# exactly their union and stays within the engine's vertex limit, so the
+# solid area never grows. Shapes lying inside another shape are dropped.
+
+# b2_maxPolygonVertices
+MAX_POLYGON_VERTICES = 8
+
+# area tolerance relative to the merged hull
+AREA_TOLERANCE = 1e-6
+
+def get_signed_area(points):
+    x, y = np.asarray(points, dtype=np.float64).T
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+def get_convex_hull(points):
+    # Andrew's monotone chain, counter clockwise without collinear points
+    points = sorted(set(map(tuple, np.asarray(points, dtype=np.float64).tolist())))
+    if len(points) <= 2:
+        return np.array(points)
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return np.array(lower[:-1] + upper[:-1])
+
+def is_convex(points):
+    points = np.asarray(points, dtype=np.float64)
+    edges = np.roll(points, -1, axis=0) - points
+    turns = edges[:, 0] * np.roll(edges[:, 1], -1) - edges[:, 1] * np.roll(edges[:, 0], -1)
+    return bool(np.all(turns >= 0) or np.all(turns <= 0))
+
+def get_edge_distances(polygon, points):
+    # signed distances of points to the edges of a counter clockwise polygon,
+    # positive inside, one row per point
+    polygon = np.asarray(polygon, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    edges = np.roll(polygon, -1, axis=0) - polygon
+    lengths = np.maximum(np.linalg.norm(edges, axis=1), 1e-12)
+    offsets = points[:, None, :] - polygon[None, :, :]
+    return (edges[None, :, 0] * offsets[:, :, 1] - edges[None, :, 1] * offsets[:, :, 0]) / lengths
+
+def clip_convex(subject, clip):
+    # Sutherland-Hodgman, both polygons counter clockwise
+    output = [tuple(point) for point in np.asarray(subject, dtype=np.float64).tolist()]
+    clip = np.asarray(clip, dtype=np.float64)
+    for a, b in zip(clip, np.roll(clip, -1, axis=0)):
+        if len(output) == 0:
+            break
+        edge = b - a
+        inputs = output
+        output = []
+        for id, current in enumerate(inputs):
+            previous = inputs[id - 1]
+            current_side = edge[0] * (current[1] - a[1]) - edge[1] * (current[0] - a[0])
+            previous_side = edge[0] * (previous[1] - a[1]) - edge[1] * (previous[0] - a[0])
+            if current_side >= 0:
+                if previous_side < 0:
+                    t = previous_side / (previous_side - current_side)
+                    output.append((previous[0] + t * (current[0] - previous[0]), previous[1] + t * (current[1] - previous[1])))
+                output.append(current)
+            elif previous_side >= 0:
+                t = previous_side / (previous_side - current_side)
+                output.append((previous[0] + t * (current[0] - previous[0]), previous[1] + t * (current[1] - previous[1])))
+    return np.array(output).reshape(-1, 2)
+
+def get_json_key(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(get_json_key(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, get_json_key(item)) for key, item in value.items()))
+    return value
+
+def get_shape_key(record):
+    return (record["density"], record["restitution"], record["friction"], get_json_key(record["filterData"]))
+
+class CollisionOptimizer:
+
+    def __init__(self, max_vertices=MAX_POLYGON_VERTICES):
+        self.max_vertices = max_vertices
+        self.num_of_shapes = 0
+        self.num_of_merged = 0
+        self.num_of_contained = 0
+
+    def try_merge(self, a, b):
+        # hull of two counter clockwise polygons when it adds no area
+        hull = get_convex_hull(np.concatenate([a, b]))
+        if len(hull) < 3 or len(hull) > self.max_vertices:
+            return None
+        hull_area = get_signed_area(hull)
+        overlap = clip_convex(a, b)
+        overlap_area = get_signed_area(overlap) if len(overlap) >= 3 else 0.0
+        union_area = get_signed_area(a) + get_signed_area(b) - overlap_area
+        if hull_area - union_area > AREA_TOLERANCE * hull_area:
+            return None
+        return hull
+
+    def merge_polygons(self, polygons):
+        # polygons: [(record, counter clockwise points)] of one key. A shape
+        # that found no partner only gets a new chance against a hull that
+        # changed, so every merge rescans just the shapes near that hull.
+        polygons = list(polygons)
+        mins = np.array([points.min(axis=0) for _, points in polygons]).reshape(-1, 2)
+        maxs = np.array([points.max(axis=0) for _, points in polygons]).reshape(-1, 2)
+        pending = deque(range(len(polygons)))
+        while pending:
+            i = pending.popleft()
+            if polygons[i] is None:
+                continue
+            # only shapes whose boxes touch can share area or an edge
+            b_near = np.all((mins <= maxs[i] + 1e-9) & (maxs >= mins[i] - 1e-9), axis=1)
+            b_near[i] = False
+            for j in np.flatnonzero(b_near):
+                hull = self.try_merge(polygons[i][1], polygons[j][1])
+                if hull is None:
+                    continue
+                # the hull takes the place and the record of the earlier shape
+                keep, drop = min(i, j), max(i, j)
+                polygons[keep] = (polygons[keep][0], hull)
+                polygons[drop] = None
+                mins[keep] = hull.min(axis=0)
+                maxs[keep] = hull.max(axis=0)
+                mins[drop] = np.inf
+                maxs[drop] = -np.inf
+                self.num_of_merged += 1
+                pending.append(keep)
+                break
+        return [polygon for polygon in polygons if polygon is not None]
+
+    def is_circle_contained(self, circle, circles, polygons):
+        center = np.asarray(circle["location"], dtype=np.float64)
+        radius = circle["radius"]
+        for other in circles:
+            if np.linalg.norm(center - other["location"]) + radius <= other["radius"] + 1e-9:
+                return True
+        for _, points in polygons:
+            if np.all(get_edge_distances(points, center) >= radius - 1e-9):
+                return True
+        return False
+
+    def is_polygon_contained(self, points, circles, polygons):
+        for circle in circles:
+            if np.all(np.linalg.norm(points - circle["location"], axis=1) <= circle["radius"] + 1e-9):
+                return True
+        for _, other in polygons:
+            if np.all(get_edge_distances(other, points) >= -1e-9):
+                return True
+        return False
+
+    def optimize(self, circles, polygons):
+        self.num_of_shapes += len(circles) + len(polygons)
+        groups = dict()
+        out_polygons = []
+        for record in polygons:
+            points = np.asarray(record["points"], dtype=np.float64).reshape(-1, 2)
+            if len(points) < 3 or get_signed_area(points) == 0 or not is_convex(points):
+                out_polygons.append(record)
+                continue
+            # clockwise polygons are optimized reversed and written back as they came
+            b_clockwise = get_signed_area(points) < 0
+            if b_clockwise:
+                points = points[::-1]
+            groups.setdefault(get_shape_key(record), []).append((record, points, b_clockwise))
+        circle_groups = dict()
+        for record in circles:
+            circle_groups.setdefault(get_shape_key(record), []).append(record)
+
+        out_circles = []
+        for key in list(groups.keys()) + [key for key in circle_groups if key not in groups]:
+            group = groups.get(key, [])
+            b_clockwise = {id(record): b for record, _, b in group}
+            merged = self.merge_polygons([(record, points) for record, points, _ in group])
+            group_circles = circle_groups.get(key, [])
+
+            # a shape sitting exactly on top of another is dropped once
+            kept_polygons = []
+            for id_polygon, (record, points) in enumerate(merged):
+                others = kept_polygons + merged[id_polygon + 1:]
+                if self.is_polygon_contained(points, group_circles, others):
+                    self.num_of_contained += 1
+                    continue
+                kept_polygons.append((record, points))
+            kept_circles = []
+            for id_circle, circle in enumerate(group_circles):
+                if self.is_circle_contained(circle, kept_circles + group_circles[id_circle + 1:], kept_polygons):
+                    self.num_of_contained += 1
+                    continue
+                kept_circles.append(circle)
+
+            for record, points in kept_polygons:
+                if b_clockwise[id(record)]:
+                    points = points[::-1]
+                record["points"] = points.ravel().tolist()
+                out_polygons.append(record)
+            out_circles.extend(kept_circles)
+
+        # polygons keep their scene order, merged ones where their first part was
+        order = {id(record): index for index, record in enumerate(polygons)}
+        out_polygons.sort(key=lambda record: order[id(record)])
+        order = {id(record): index for index, record in enumerate(circles)}
+        out_circles.sort(key=lambda record: order[id(record)])
+        return out_circles, out_polygons
+
+    @property
+    def num_of_removed(self):
+        return self.num_of_merged + self.num_of_contained
+
+    def merge(self, other):
+        for name in ("num_of_shapes", "num_of_merged", "num_of_contained"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def get_summary(self):
+        return {
+            "shapes": self.num_of_shapes,
+            "merged": self.num_of_merged,
+            "contained": self.num_of_contained,
+        }
+
+    def format(self):
+        if self.num_of_shapes == 0:
+            return []
+        return ["{} of {} shapes removed, {} merged into neighbours, {} inside other shapes".format(
+            self.num_of_removed, self.num_of_shapes, self.num_of_merged, self.num_of_contained)]
@@ -0,0 +1,143 @@
+import heapq
+import os
+import subprocess
+import threading
+import time
+
+class CompileJob:
+    def __init__(self, name, args, size, order):
+        self.name = name
+        self.args = args
+        self.size = size
+        self.order = order
+
+    def __lt__(self, other):
+        # largest intermediates first, submission order between equal sizes
+        if self.size != other.size:
+            return self.size > other.size
+        return self.order < other.order
+
+class CompileResult:
+    def __init__(self, name, args, returncode, stdout, stderr, duration, start=None, thread_id=None):
+        self.name = name
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+        # perf_counter time the process was started at and the worker running it
+        self.start = start
+        self.thread_id = thread_id
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0
+
+class CompileReport:
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.succeeded]
+
+    def get_returncode(self, name):
+        for result in self.results:
+            if result.name == name:
+                return result.returncode
+        return None
+
+    def format(self):
+        lines = ["Compiled {} clusters, {} failed".format(len(self.results), len(self.failed))]
+        for result in self.results:
+            lines.append("  {} exit code {} in {:.2f}s".format(result.name, result.returncode, result.duration))
+            stderr = (result.stderr or "").strip()
+            if stderr:
+                lines.extend("    " + line for line in stderr.splitlines())
+        return lines
+
+class CompileScheduler:
+    # Runs compiler processes on a bounded pool of worker threads while the
+    # caller keeps parsing. Jobs wait in a heap, so whenever a worker frees up
+    # it takes the largest queued intermediate. A job can name earlier jobs it
+    # has to run after, it is held back until all of them finished.
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.queue = []
+        self.blocked = []
+        self.results = []
+        self.workers = []
+        self.num_of_active_workers = 0
+        self.lock = threading.Lock()
+        self.num_of_submitted = 0
+        self.submitted = set()
+        self.finished = set()
+
+    def submit(self, name, args, size=0, after=()):
+        with self.lock:
+            # only jobs submitted before can hold this one back, so a job
+            # never waits for something that is not going to run
+            after = [other for other in after if other in self.submitted and other not in self.finished]
+            job = CompileJob(name, list(args), size, self.num_of_submitted)
+            self.num_of_submitted += 1
+            self.submitted.add(name)
+            if len(after) > 0:
+                self.blocked.append((job, set(after)))
+                return
+            heapq.heappush(self.queue, job)
+            self.start_worker()
+
+    def start_worker(self):
+        # called with the lock held, counted under it, so a worker that is
+        # about to exit never leaves a freshly queued job behind
+        if self.num_of_active_workers < self.max_workers:
+            self.num_of_active_workers += 1
+            worker = threading.Thread(target=self.run_worker, daemon=True)
+            self.workers.append(worker)
+            worker.start()
+
+    def run_worker(self):
+        while True:
+            with self.lock:
+                if len(self.queue) == 0:
+                    self.num_of_active_workers -= 1
+                    return
+                job = heapq.heappop(self.queue)
+            result = self.run_job(job)
+            with self.lock:
+                self.results.append(result)
+                self.finished.add(job.name)
+                # a failed job releases its dependants too, the compiler
+                # reports what is missing
+                blocked = self.blocked
+                self.blocked = []
+                for waiting, after in blocked:
+                    if after <= self.finished:
+                        heapq.heappush(self.queue, waiting)
+                        self.start_worker()
+                    else:
+                        self.blocked.append((waiting, after))
+
+    def run_job(self, job):
+        start = time.perf_counter()
+        try:
+            completed = subprocess.run(job.args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       universal_newlines=True, errors='replace')
+            returncode, stdout, stderr = completed.returncode, completed.stdout, completed.stderr
+        except OSError as e:
+            returncode, stdout, stderr = None, "", str(e)
+        return CompileResult(job.name, job.args, returncode, stdout, stderr, time.perf_counter() - start,
+                             start, threading.get_ident())
+
+    def wait(self):
+        # Blocks until every submitted job finished. The scheduler can take
+        # new jobs afterwards, the report covers everything run so far.
+        while True:
+            with self.lock:
+                workers = self.workers
+                self.workers = []
+                if len(workers) == 0:
+                    return CompileReport(list(self.results))
+            for worker in workers:
+                worker.join()
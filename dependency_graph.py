@@ -0,0 +1,78 @@
+class DependencyCycleError(Exception):
+    def __init__(self, cycle):
+        super(DependencyCycleError, self).__init__("Dependency cycle: " + " -> ".join(cycle))
+        self.cycle = cycle
+
+class DependencyGraph:
+    # Clusters (and override variants) keyed by their intermediate name.
+    # Edges point from a cluster to the clusters it references, a node is
+    # stored once no matter how many parents reference it.
+
+    def __init__(self):
+        self.nodes = dict()
+        self.edges = dict()
+
+    def add_node(self, key, data=None):
+        if key in self.nodes:
+            return False
+        self.nodes[key] = data
+        self.edges[key] = []
+        return True
+
+    def add_edge(self, parent, child):
+        children = self.edges[parent]
+        if child not in children:
+            children.append(child)
+
+    def get(self, key):
+        return self.nodes[key]
+
+    def find_cycle(self):
+        # iterative DFS, returns the keys along the first cycle found
+        visiting, visited = set(), set()
+        for start in self.nodes:
+            if start in visited:
+                continue
+            path = [start]
+            stack = [iter(self.edges[start])]
+            visiting.add(start)
+            while stack:
+                child = next(stack[-1], None)
+                if child is None:
+                    stack.pop()
+                    node = path.pop()
+                    visiting.discard(node)
+                    visited.add(node)
+                    continue
+                if child in visiting:
+                    return path[path.index(child):] + [child]
+                if child in visited:
+                    continue
+                visiting.add(child)
+                path.append(child)
+                stack.append(iter(self.edges[child]))
+        return None
+
+    def topological_order(self):
+        # dependencies come before the clusters that reference them
+        cycle = self.find_cycle()
+        if cycle is not None:
+            raise DependencyCycleError(cycle)
+
+        order = []
+        visited = set()
+        for start in self.nodes:
+            if start in visited:
+                continue
+            visited.add(start)
+            stack = [(start, iter(self.edges[start]))]
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    order.append(node)
+                elif child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(self.edges[child])))
+        return order
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+MANIFEST_VERSION = 1
+
+# Layout of the intermediates the exporter writes. Bump it whenever the same
+# scene and settings give a different intermediate, cached ones are stale then.
+EXPORTER_VERSION = 3
+
+class Fingerprint:
+    # Order sensitive digest over plain python values and numpy arrays.
+    # Every value is tagged with its type, so [1, 2] and "12" never collide,
+    # and floats go through repr, which is stable across sessions.
+
+    def __init__(self):
+        self.hasher = hashlib.sha1()
+
+    def add(self, value):
+        hasher = self.hasher
+        if value is None:
+            hasher.update(b"N")
+        elif isinstance(value, bool):
+            hasher.update(b"B1" if value else b"B0")
+        elif isinstance(value, (int, np.integer)):
+            hasher.update(b"I" + str(int(value)).encode() + b";")
+        elif isinstance(value, (float, np.floating)):
+            hasher.update(b"F" + repr(float(value)).encode() + b";")
+        elif isinstance(value, str):
+            data = value.encode('utf-8')
+            hasher.update(b"S" + str(len(data)).encode() + b":" + data)
+        elif isinstance(value, bytes):
+            hasher.update(b"Y" + str(len(value)).encode() + b":" + value)
+        elif isinstance(value, np.ndarray):
+            data = np.ascontiguousarray(value)
+            hasher.update(b"A" + data.dtype.str.encode() + str(data.shape).encode() + b":")
+            hasher.update(data.tobytes())
+        elif isinstance(value, dict):
+            hasher.update(b"D" + str(len(value)).encode() + b":")
+            for key in sorted(value):
+                self.add(key)
+                self.add(value[key])
+        elif isinstance(value, (list, tuple)):
+            hasher.update(b"L" + str(len(value)).encode() + b":")
+            for item in value:
+                self.add(item)
+        else:
+            raise TypeError("Cannot fingerprint value of type {}".format(type(value).__name__))
+        return self
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+def make_cluster_fingerprint():
+    # every cluster fingerprint starts with the exporter version
+    return Fingerprint().add(EXPORTER_VERSION)
+
+def fingerprint_file(path, chunk_size=1 << 20):
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            hasher.update(chunk)
+            chunk = f.read(chunk_size)
+    return hasher.hexdigest()
+
+class ExportManifest:
+    # Fingerprints of the clusters whose intermediates were written and
+    # compiled successfully, keyed by the intermediate name.
+
+    def __init__(self, path):
+        self.path = path
+        self.clusters = dict()
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            return
+        self.clusters = data.get("clusters", dict())
+
+    def get_fingerprint(self, name):
+        entry = self.clusters.get(name)
+        if entry is None:
+            return None
+        return entry.get("fingerprint")
+
+    def is_up_to_date(self, name, fingerprint, intermediate_path):
+        if self.get_fingerprint(name) != fingerprint:
+            return False
+        return os.path.exists(intermediate_path)
+
+    def update(self, name, fingerprint):
+        self.clusters[name] = {
+            "fingerprint": fingerprint
+        }
+
+    def remove(self, name):
+        self.clusters.pop(name, None)
+
+    def save(self):
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "clusters": self.clusters
+            }, f, ensure_ascii=False, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
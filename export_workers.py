@@ -0,0 +1,194 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from . import cluster_parser, node_inputs, mesh_buffers, json_stream, quantization, profiler, action_compression, mesh_optimizer, mesh_lods, spatial_order, \
+        collision_optimizer
+except ImportError:
+    # loaded as a top level module by tests.py and the export workers
+    import cluster_parser, node_inputs, mesh_buffers, json_stream, quantization, profiler, action_compression, mesh_optimizer, mesh_lods, spatial_order, \
+        collision_optimizer
+
+# Second phase of the export. Blender copies every cluster into a scene_model
+# snapshot, export_cluster turns a snapshot into its intermediate file. It
+# runs in worker processes, or in Blender itself on the live scene when a
+# pool is not worth starting.
+
+ADDON_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+class ExportSettings:
+    def __init__(self, mesh_format='V1', indent=None, quantization_settings=(quantization.MODE_NONE, 0, 0, 0, 0),
+                 profile=False, action_compression=None, weld_distance=None, lods=None, build_bvh=False,
+                 order=spatial_order.ORDER_NONE, optimize_collisions=False, polygon_batches=False,
+                 track_resolution=0):
+        self.mesh_format = mesh_format
+        self.indent = indent
+        # QuantizationReport arguments
+        self.quantization_settings = quantization_settings
+        self.profile = profile
+        # (error bound, interpolation) or None to write the sampled actions
+        self.action_compression = action_compression
+        # meshes are optimized when a weld distance is given
+        self.weld_distance = weld_distance
+        # (number of LODs, first screen size, cache folder) or None
+        self.lods = lods
+        self.build_bvh = build_bvh
+        # spatial_order curve shapes and refs are sorted along
+        self.order = order
+        self.optimize_collisions = optimize_collisions
+        self.polygon_batches = polygon_batches
+        self.track_resolution = track_resolution
+
+class ExportJob:
+    def __init__(self, name, root, location, rotation, scale, override, path, settings, actions=None, action_names=None):
+        self.name = name
+        self.root = root
+        self.location = location
+        self.rotation = rotation
+        self.scale = scale
+        self.override = override
+        self.path = path
+        self.settings = settings
+        # only the cluster being exported carries the actions of its tree
+        self.actions = actions
+        self.action_names = action_names
+
+class ExportResult:
+    def __init__(self, name, path, size, quantization_report, events, messages, mesh_report=None, lod_report=None, collision_report=None,
+                 log_records=None):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.quantization = quantization_report
+        self.events = events
+        self.messages = messages
+        self.mesh_report = mesh_report
+        self.lod_report = lod_report
+        self.collision_report = collision_report
+        # records logged in a worker process, Blender emits them again
+        self.log_records = log_records or []
+        self.pid = os.getpid()
+
+class LogCollector(logging.Handler):
+    # keeps the records of a worker process until its job returns them
+
+    def __init__(self):
+        super(LogCollector, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        # formatted here, arguments and tracebacks don't always pickle
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+    def take(self):
+        records = self.records
+        self.records = []
+        return records
+
+# set in pool processes only, Blender logs the live export itself
+log_collector = None
+
+def init_worker(log_level):
+    # runs once in every pool process, with the log level of the addon
+    global log_collector
+    log_collector = LogCollector()
+    root_logger = logging.getLogger()
+    root_logger.addHandler(log_collector)
+    root_logger.setLevel(log_level)
+
+def copy_override(override):
+    # overrides are planned in Blender, jobs need them as this module sees them
+    if override is None:
+        return None
+    copy = cluster_parser.DependencyOverride(override.name, override.src_dependency)
+    for name, data in zip(override.collision_overrites_names, override.collision_overrites):
+        copy.add_collision_overrite(name, tuple(data))
+    for name, data in zip(override.beams_overrites_names, override.beams_overrites):
+        copy.add_beams_overrite(name, tuple(data))
+    return copy
+
+def write_buffers(sections, path):
+    for key, value in sections:
+        if isinstance(value, mesh_buffers.MeshBufferSidecar):
+            value = value.write(os.path.splitext(path)[0] + ".meshbuf")
+        yield key, value
+
+def parse_scene_actions(parser, sections, actions, action_names, compression, messages):
+    for key, value in sections:
+        if key != "actions":
+            yield key, value
+            continue
+
+        with parser.profiler.stage("parse_actions"):
+            json_actions = parser.parse_actions(actions, action_names)
+
+        if compression is not None:
+            error_bound, interpolation = compression
+            json_compressed, num_of_samples, num_of_keys = action_compression.compress_actions(json_actions, error_bound, interpolation)
+            messages.append("Actions compressed from {} samples to {} keys".format(num_of_samples, num_of_keys))
+            yield "actions", []
+            yield "actions-compressed", json_compressed
+        else:
+            yield "actions", json_actions
+
+def export_cluster(job):
+    settings = job.settings
+    report = quantization.QuantizationReport(*settings.quantization_settings)
+    export_profiler = profiler.ExportProfiler(settings.profile)
+    export_profiler.start()
+    optimizer = mesh_optimizer.MeshOptimizer(settings.weld_distance) if settings.weld_distance is not None else None
+    lod_builder = mesh_lods.LodBuilder(*settings.lods) if settings.lods is not None else None
+    shape_optimizer = collision_optimizer.CollisionOptimizer() if settings.optimize_collisions else None
+    parser = cluster_parser.ClusterParser(node_inputs.NodeInputRegistry(), report, export_profiler, settings.mesh_format, optimizer, lod_builder,
+        settings.build_bvh, settings.order, shape_optimizer, settings.polygon_batches,
+        settings.track_resolution)
+    messages = []
+    if log_collector is not None:
+        # left over by a job that failed
+        log_collector.take()
+
+    sections = parser.parse_cluster(job.root, job.location, job.rotation, job.scale, job.override)
+    if job.actions is not None:
+        sections = parse_scene_actions(parser, sections, job.actions, job.action_names, settings.action_compression, messages)
+    try:
+        with export_profiler.stage("dump", job.name):
+            with open(job.path, 'w', encoding='utf-8') as f:
+                json_stream.write_sections(f, write_buffers(sections, job.path), settings.indent)
+    finally:
+        export_profiler.stop()
+
+    for event in export_profiler.events:
+        # one trace track per process
+        event.thread_id = os.getpid()
+    log_records = log_collector.take() if log_collector is not None else None
+    return ExportResult(job.name, job.path, os.path.getsize(job.path), report, export_profiler.events, messages, optimizer, lod_builder, shape_optimizer,
+        log_records)
+
+def get_worker_module():
+    # Pool jobs are pickled by module name and the workers import the pure
+    # modules as top level modules, so jobs and snapshots have to be built
+    # from those same modules. Spawned processes inherit sys.path.
+    if ADDON_FOLDER not in sys.path:
+        sys.path.append(ADDON_FOLDER)
+    return importlib.import_module("export_workers")
+
+def get_worker_scene_model():
+    # snapshots are built from the scene_model the workers unpickle them with
+    get_worker_module()
+    return importlib.import_module("scene_model")
+
+def create_executor(num_of_workers, python_path=None, log_level=logging.WARNING):
+    # Blender's own binary can't act as a worker, spawn a Python interpreter
+    context = multiprocessing.get_context("spawn")
+    if python_path:
+        context.set_executable(python_path)
+    return ProcessPoolExecutor(num_of_workers, mp_context=context, initializer=init_worker, initargs=(log_level,))
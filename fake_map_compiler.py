@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# Stand-in for MapCompiler.exe with the same command line, used to exercise
+# the compile scheduler on machines without the engine tools:
+#
+#   fake_map_compiler.py -i <intermediate.json> -of <output folder>
+#
+# It checks that the intermediate is valid json, sleeps for
+# FAKE_MAP_COMPILER_DELAY seconds if set, and writes <name>.cluster with a
+# short summary to the output folder. Errors go to stderr with exit code 1.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", dest="input", required=True)
+    parser.add_argument("-of", dest="output_folder", required=True)
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            cluster = json.load(f)
+    except (OSError, ValueError) as e:
+        print("Failed to read intermediate {}: {}".format(args.input, e), file=sys.stderr)
+        return 1
+
+    delay = float(os.environ.get("FAKE_MAP_COMPILER_DELAY", "0"))
+    if delay > 0:
+        time.sleep(delay)
+
+    name = os.path.splitext(os.path.basename(args.input))[0]
+    os.makedirs(args.output_folder, exist_ok=True)
+    with open(os.path.join(args.output_folder, name + ".cluster"), 'w', encoding='utf-8') as f:
+        json.dump({
+            "name": cluster.get("name", name) if isinstance(cluster, dict) else name,
+            "sections": sorted(cluster) if isinstance(cluster, dict) else [],
+        }, f)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
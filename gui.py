@@ -1,4 +1,5 @@
 import bpy
+import logging
 
 import bmesh
 from bpy.types import Menu
@@ -6,6 +7,8 @@ from bpy.types import Menu
 from . import common_systems
 from . import overrites
 
+logger = logging.getLogger(__name__)
+
 class RISING_MT_overrites_menu(bpy.types.Menu):
     bl_label = "Overrides menu"
     bl_idname = "menu.overrides"
@@ -13,10 +16,10 @@ class RISING_MT_overrites_menu(bpy.types.Menu):
     def draw(self, context):
         layout = self.layout
         
-        print("Modifiers to override")
+        logger.debug("Modifiers to override")
         obj_names, mod_names = overrites.get_possible_overrite_list(context.object)
         for obj_name, mod_name in zip(obj_names, mod_names):
-            print(obj_name, mod_name)
+            logger.debug("%s %s", obj_name, mod_name)
             op = layout.operator("overrites.create_override", text="{} from {}".format(mod_name, obj_name))
             op.target_object_name = context.object.name
             op.source_element_name = obj_name
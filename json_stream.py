@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+
+# Writes a json object one section at a time, so a cluster never has to sit
+# in memory as a whole. In compact mode flat numeric arrays (mesh buffers,
+# action samples, track points) skip the generic encoder and are joined in
+# one go. With an indent the output matches json.dump(..., indent=indent).
+
+def is_number_list(value):
+    for item in value:
+        item_type = type(item)
+        if item_type is not float and item_type is not int:
+            return False
+    return True
+
+def encode_numbers(values):
+    text = ",".join(map(repr, values))
+    if "n" in text:
+        # nan and inf have no json literal of their own, let json spell them
+        return None
+    return "[" + text + "]"
+
+def encode_compact(value):
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, list):
+        if len(value) > 0 and is_number_list(value):
+            text = encode_numbers(value)
+            if text is not None:
+                return text
+        return "[" + ",".join(encode_compact(item) for item in value) + "]"
+    if isinstance(value, dict):
+        return "{" + ",".join(
+            json.dumps(str(key), ensure_ascii=False) + ":" + encode_compact(item) for key, item in value.items()) + "}"
+    if isinstance(value, tuple):
+        return encode_compact(list(value))
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+class JsonStreamWriter:
+
+    def __init__(self, f, indent=None):
+        self.f = f
+        self.indent = indent
+        self.num_of_sections = 0
+
+    def begin(self):
+        self.f.write("{")
+
+    def write_section(self, key, value):
+        f = self.f
+        if self.num_of_sections > 0:
+            f.write(",")
+        self.num_of_sections += 1
+
+        key_text = json.dumps(key, ensure_ascii=False)
+        if self.indent is None:
+            f.write(key_text + ":")
+            f.write(encode_compact(value))
+            return
+
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        padding = " " * self.indent
+        f.write("\n" + padding + key_text + ": ")
+        f.write(json.dumps(value, ensure_ascii=False, indent=self.indent).replace("\n", "\n" + padding))
+
+    def end(self):
+        if self.indent is not None and self.num_of_sections > 0:
+            self.f.write("\n")
+        self.f.write("}")
+
+def write_sections(f, sections, indent=None):
+    writer = JsonStreamWriter(f, indent)
+    writer.begin()
+    for key, value in sections:
+        writer.write_section(key, value)
+    writer.end()
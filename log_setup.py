@@ -0,0 +1,17 @@
+import logging
+
+# Every module of the addon logs under the package logger, so one handler and
+# one level serve them all. Hot loops log at debug level with lazy %s
+# arguments, nothing is formatted unless the level lets the record through.
+
+LOG_FORMAT = "%(name)s %(levelname)s: %(message)s"
+
+def set_log_level(package, level):
+    package_logger = logging.getLogger(package)
+    if not package_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        package_logger.addHandler(handler)
+        package_logger.propagate = False
+    package_logger.setLevel(level)
+    return package_logger
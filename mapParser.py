@@ -1,24 +1,171 @@
 import bpy
 import json
+import logging
 import os
-import subprocess
+import sys
 from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty, CollectionProperty, FloatProperty, PointerProperty
 
 from bpy_extras.object_utils import AddObjectHelper
 from bpy.types import PropertyGroup
 
-from mathutils import Vector
-import math
-from numpy import array
+import numpy as np
 
-from . import utils
+from . import utils, export_manifest, compile_jobs, dependency_graph, node_inputs, action_compression, action_reachability, quantization, \
+    profiler, cluster_parser, blender_scene, export_workers
 
 
+logger = logging.getLogger(__name__)
+
 directory_subtype = 'DIR_PATH' if bpy.app.version != (3,1,0) else 'NONE' # https://developer.blender.org/T96691
 
 class CommonProps(PropertyGroup):
     engine_path : StringProperty(name="engine path",description="root file with tools and hopper folders", subtype=directory_subtype)
     output_path : StringProperty(name="output folder",description="Folder export maps to", subtype=directory_subtype)
+    mesh_format : EnumProperty(
+        name="mesh format",
+        description="How cluster meshes are written to the intermediates",
+        items=[
+            ('V1', "meshes-v1", "Vertices and indices as json numbers"),
+            ('V2', "meshes-v2", "Vertices and indices in a binary sidecar, json holds offsets"),
+        ],
+        default='V1')
+    incremental_export : BoolProperty(
+        name="incremental export",
+        description="Skip dependency clusters whose fingerprint matches the export manifest",
+        default=True)
+    compiler_jobs : IntProperty(
+        name="compiler jobs",
+        description="Number of MapCompiler processes running at once, 0 uses every core",
+        default=0,
+        min=0)
+    parse_jobs : IntProperty(
+        name="parse jobs",
+        description="Worker processes parsing cluster snapshots, 0 uses every core, 1 parses inside Blender",
+        default=0,
+        min=0)
+    action_compression : BoolProperty(
+        name="compress actions",
+        description="Keep only the action samples needed to stay within the error bound",
+        default=False)
+    action_error_bound : FloatProperty(
+        name="action error bound",
+        description="Largest difference between a compressed and a sampled action value",
+        default=0.001,
+        min=0.0,
+        precision=5)
+    action_interpolation : EnumProperty(
+        name="action interpolation",
+        description="How the engine rebuilds the samples between compressed keys",
+        items=[
+            ('LINEAR', "Linear", "Piecewise linear between keys"),
+            ('HERMITE', "Hermite", "Cubic Hermite between keys with stored tangents"),
+        ],
+        default='LINEAR')
+    export_all_actions : BoolProperty(
+        name="export all actions",
+        description="Export every action in the file instead of the ones used by the exported clusters",
+        default=False)
+    optimize_meshes : BoolProperty(
+        name="optimize meshes",
+        description="Weld close vertices, drop unused ones and reorder triangles for the GPU vertex cache",
+        default=False)
+    weld_distance : FloatProperty(
+        name="weld distance",
+        description="Vertices closer than this are merged when meshes are optimized",
+        default=0.0001,
+        min=0.0,
+        precision=5)
+    mesh_lods : IntProperty(
+        name="LOD levels",
+        description="Lower detail versions generated for every mesh, 0 exports full detail meshes only",
+        default=0,
+        min=0,
+        max=4)
+    lod_screen_size : FloatProperty(
+        name="LOD screen size",
+        description="Screen height fraction below which the first LOD is drawn, halved for every next LOD",
+        default=0.25,
+        min=0.0,
+        max=1.0)
+    optimize_collisions : BoolProperty(
+        name="optimize collisions",
+        description="Merge collision polygons that form a convex shape together and drop shapes lying inside others",
+        default=False)
+    batch_polygons : BoolProperty(
+        name="batch polygons",
+        description="Write polygons as one triangle list per color instead of one record per quad, polygons may be any n-gon",
+        default=False)
+    track_resolution : IntProperty(
+        name="track table size",
+        description="Entries of the arc length table written for every track spline, 0 writes the control points only",
+        default=64,
+        min=0,
+        max=4096)
+    export_bvh : BoolProperty(
+        name="export BVH",
+        description="Write a bounding volume hierarchy over the meshes, polygons and object refs of every cluster for culling",
+        default=False)
+    spatial_order : EnumProperty(
+        name="shape order",
+        description="Order of collision shapes, beams, polygons and object refs in the intermediates",
+        items=[
+            ('NONE', "Scene", "Keep the order of the scene"),
+            ('MORTON', "Morton", "Sort along a Z-order curve of the position, sorted records keep their object name"),
+            ('HILBERT', "Hilbert", "Sort along a Hilbert curve of the position, sorted records keep their object name"),
+        ],
+        default='NONE')
+    compact_json : BoolProperty(
+        name="compact intermediates",
+        description="Write intermediates without indentation, numeric arrays on one line",
+        default=False)
+    log_level : EnumProperty(
+        name="log level",
+        description="Verbosity of the export log in the system console",
+        items=[
+            ('ERROR', "Error", "Only failures"),
+            ('WARNING', "Warning", "Failures and skipped data"),
+            ('INFO', "Info", "Export progress"),
+            ('DEBUG', "Debug", "Every parsed object and modifier, slow on large clusters"),
+        ],
+        default='INFO',
+        update=lambda self, context: utils.set_log_level(self.log_level))
+    profile_export : BoolProperty(
+        name="profile export",
+        description="Time every export stage and write a Chrome trace next to the intermediate",
+        default=False)
+    quantization_mode : EnumProperty(
+        name="quantization",
+        description="How exported floats are rounded",
+        items=[
+            ('NONE', "None", "Write floats at full precision"),
+            ('DECIMAL', "Decimal", "Round to a number of decimal digits"),
+            ('FIXED', "Fixed point", "Round to a number of fractional bits"),
+        ],
+        default='NONE')
+    position_precision : IntProperty(
+        name="positions",
+        description="Digits or fractional bits kept for locations, vertices, offsets and sizes",
+        default=4,
+        min=0,
+        max=24)
+    rotation_precision : IntProperty(
+        name="rotations",
+        description="Digits or fractional bits kept for rotations and axes",
+        default=4,
+        min=0,
+        max=24)
+    physics_precision : IntProperty(
+        name="physics",
+        description="Digits or fractional bits kept for density, friction, joint and motor parameters",
+        default=3,
+        min=0,
+        max=24)
+    action_precision : IntProperty(
+        name="actions",
+        description="Digits or fractional bits kept for sampled action values",
+        default=4,
+        min=0,
+        max=24)
 
 class RISING_PT_SceneExportPanel(bpy.types.Panel):
 
@@ -39,42 +186,55 @@ class RISING_PT_SceneExportPanel(bpy.types.Panel):
         row = layout.row()
         row.prop(scene.re, "output_path")
         row = layout.row()
+        row.prop(scene.re, "mesh_format")
+        row.prop(scene.re, "compact_json")
+        row = layout.row()
+        row.prop(scene.re, "optimize_meshes")
+        if scene.re.optimize_meshes:
+            row.prop(scene.re, "weld_distance")
+        row = layout.row()
+        row.prop(scene.re, "mesh_lods")
+        if scene.re.mesh_lods > 0:
+            row.prop(scene.re, "lod_screen_size")
+        row = layout.row()
+        row.prop(scene.re, "optimize_collisions")
+        row.prop(scene.re, "batch_polygons")
+        row = layout.row()
+        row.prop(scene.re, "export_bvh")
+        row.prop(scene.re, "spatial_order")
+        row = layout.row()
+        row.prop(scene.re, "track_resolution")
+        row = layout.row()
+        row.prop(scene.re, "incremental_export")
+        row = layout.row()
+        row.prop(scene.re, "compiler_jobs")
+        row.prop(scene.re, "parse_jobs")
+        row = layout.row()
+        row.prop(scene.re, "profile_export")
+        row = layout.row()
+        row.prop(scene.re, "log_level")
+        row = layout.row()
+        row.prop(scene.re, "export_all_actions")
+        row = layout.row()
+        row.prop(scene.re, "action_compression")
+        if scene.re.action_compression:
+            row = layout.row()
+            row.prop(scene.re, "action_error_bound")
+            row.prop(scene.re, "action_interpolation")
+        row = layout.row()
+        row.prop(scene.re, "quantization_mode")
+        if scene.re.quantization_mode != 'NONE':
+            row = layout.row()
+            row.prop(scene.re, "position_precision")
+            row.prop(scene.re, "rotation_precision")
+            row = layout.row()
+            row.prop(scene.re, "physics_precision")
+            row.prop(scene.re, "action_precision")
+        row = layout.row()
         row.operator("scene.export_scene")
+        op = row.operator("scene.export_scene", text="List clusters to rebuild")
+        op.dry_run = True
 
-class DependencyOverride:
-    def __init__(self, name, src_dependency):
-        self.name = name
-        self.src_dependency = src_dependency
-        self.collision_overrites_names = []
-        self.collision_overrites = []
-        self.beams_overrites_names = []
-        self.beams_overrites = []
-        
-    def __hash__(self):
-        
-        collisions_sum = 0
-        for col_overrite in self.collision_overrites:
-            collisions_sum += col_overrite[0]
-            collisions_sum += col_overrite[1]
-            collisions_sum += col_overrite[2]
-            collisions_sum += col_overrite[3]
-        
-        return int(hash((collisions_sum, )) / 1000000000)
-        
-    def add_collision_overrite(self, object_name, data):
-        self.collision_overrites_names.append(object_name)
-        self.collision_overrites.append(data)
-        
-    def add_beams_overrite(self, object_name, data):
-        self.beams_overrites_names.append(object_name)
-        self.beams_overrites.append(data)
-        
-    def get_name(self):
-        return self.name
-    
-    def get_src_dependency(self):
-        return self.src_dependency
-            
 class ExportScene(bpy.types.Operator, AddObjectHelper):
     bl_label = "Export scene"
     bl_idname = "scene.export_scene"
@@ -84,876 +244,236 @@ class ExportScene(bpy.types.Operator, AddObjectHelper):
 
     
     dependency_objects = dict()
-        
-    def dump(self, json_data, path):
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, ensure_ascii=False, indent=4)      
-        json_data.clear()
     
-    def parse_polygons(self, root):
-        
-        collection = utils.find_collection(root, "Polygons")
-        if collection is None:
-            return []
-        
-        json_polygons = []
-                
-        for object in collection.objects:
-            scale = object.scale[0]
-            #materials = object.material_slots
-            #if len(materials) == 0:
-            #    continue
-            #material_name = materials[0].name + ".jpg"
-                     
-            
-            mesh = object.data
-            vertices = mesh.vertices
-            world_mat = object.matrix_world
-            v0 = world_mat @ vertices[0].co
-            v1 = world_mat @ vertices[1].co
-            v2 = world_mat @ vertices[3].co
-            v3 = world_mat @ vertices[2].co
-            
-            
-            color_data = [0.55, 0.55, 0.6]
-            for modifier in object.modifiers:
-                if modifier.type != "NODES":
-                    continue
-                nodes = modifier.node_group
-                if nodes.name != "Color":
-                    continue
-                for input in nodes.inputs:
-                    if input.name == "Color":
-                        input_id = input.identifier
-                        color_raw = modifier[input_id]
-                        color_data = [color_raw[0], color_raw[1], color_raw[2]]
-            
-            json_polygons.append({
-                "v0": [v0[0], v0[2]],
-                "v1": [v1[0], v1[2]],
-                "v2": [v2[0], v2[2]],
-                "v3": [v3[0], v3[2]],
-                "color": color_data 
-            })
-                    
-        return json_polygons
-        
-    def parse_object_refs(self, root, parent_location, parent_scale):
-        collection = utils.find_collection(root, "Objects")
-        if collection is None:
-            return [], dict(), dict(), dict(), dict(), dict()
-        
-        objects = collection.objects
-        dependencies = dict()
-        dependencies_locations = dict()
-        dependencies_rotations = dict()
-        dependencies_scales = dict()
-        
-        overrides = dict()
-        
-        json_object_refs = []
-        
-        for object in objects:
-            b_instancer = object.is_instancer
-            if not b_instancer:
-                continue
-            linked_collection = object.instance_collection
-            library = linked_collection.library
-            if library is None:
-                continue
-            
-            
-            dependency_key = utils.trim_name(linked_collection.name_full)
-            dependency_key_with_override = dependency_key
-            #self.dependency_objects[dependency_key] = library.filepath
-            
-            overrides_object = utils.find_object(object, "overrides")
-            if overrides_object is not None:
-                dep_override = DependencyOverride(object.name, dependency_key)
-                for modifier in overrides_object.modifiers:
-                    if modifier.type != "NODES":
-                        continue
-                    
-                    if modifier.node_group.name == "CollisionCircle" or modifier.node_group.name == "CollisionPolygon":
-                        override_data = (
-                            modifier["Input_2"],
-                            modifier["Input_3"],
-                            modifier["Input_4"],
-                            modifier["Input_5"],
-                            )
-                        dep_override.add_collision_overrite(modifier.name, override_data)
-                    elif modifier.node_group.name == "Beam":
-                        override_data = (
-                            modifier["Input_2"],
-                            modifier["Input_3"],
-                            modifier["Input_4"],
-                        )
-                        dep_override.add_beams_overrite(modifier.name, override_data)
-                        
-                dependency_key_with_override = dependency_key + str(hash(dep_override))
-                overrides[dependency_key_with_override] = dep_override
-
-            dependencies[dependency_key] = library.filepath
+    dry_run : BoolProperty(name="dry run", description="Only list the clusters that would be rebuilt", default=False)
+    cluster_name : StringProperty(name="cluster", description="Cluster collection to export, the selection decides when empty", default="")
+    summary_path : StringProperty(name="summary path", description="Json file the export summary is written to, used by batch_export.py", default="")
+        
+    def get_id_value(self, value):
+        if isinstance(value, bpy.types.ID):
+            return value.name_full
+        if hasattr(value, "to_dict"):
+            return value.to_dict()
+        if hasattr(value, "to_list"):
+            return value.to_list()
+        return value
+    
+    def get_library_fingerprint(self, library):
+        if library is None:
+            return None
+        path = bpy.path.abspath(library.filepath)
+        fingerprint = self.library_fingerprints.get(path)
+        if fingerprint is None:
+            fingerprint = export_manifest.fingerprint_file(path) if os.path.exists(path) else path
+            self.library_fingerprints[path] = fingerprint
+        return fingerprint
+    
+    def fingerprint_object(self, fingerprint, object, depsgraph):
+        fingerprint.add(object.name_full)
+        fingerprint.add(object.type)
+        fingerprint.add(object.parent.name_full if object.parent is not None else None)
+        fingerprint.add(np.array(object.matrix_world, dtype=np.float32))
+        fingerprint.add([object.location[:], object.rotation_euler[:], object.scale[:], object.dimensions[:]])
+        
+        for modifier in object.modifiers:
+            fingerprint.add(modifier.name)
+            fingerprint.add(modifier.type)
+            if modifier.type == "NODES":
+                fingerprint.add(modifier.node_group.name if modifier.node_group is not None else None)
+            fingerprint.add({key: self.get_id_value(modifier[key]) for key in modifier.keys()})
             
-            location = (object.location * parent_scale + parent_location)
-            object.rotation_mode = 'AXIS_ANGLE'
-            rotation = object.rotation_axis_angle   
-            object.rotation_mode = 'XYZ'
-            scale = object.scale * parent_scale
+        for constraint in object.constraints:
+            fingerprint.add(constraint.type)
+            target = getattr(constraint, "target", None)
+            fingerprint.add(target.name_full if target is not None else None)
             
-            dependencies_locations[dependency_key] = location
-            dependencies_rotations[dependency_key] = rotation
-            dependencies_scales[dependency_key] = scale
-                        
-            json_object_refs.append({
-                "name": object.name,
-                "dependency" : dependency_key_with_override,
-                "location": [
-                    location[0],
-                    location[1],
-                    location[2]
-                    ],
-                "rotation": [
-                    rotation[1],
-                    rotation[2],
-                    rotation[3],
-                    rotation[0]
-                    ],
-                "scale": [
-                    scale[0],
-                    scale[1],
-                    scale[2]
-                    ]
-            })
-                
-        return json_object_refs, dependencies, overrides, dependencies_locations, dependencies_rotations, dependencies_scales
+        for anim_owner in (object, object.data):
+            animation_data = getattr(anim_owner, "animation_data", None)
+            action = animation_data.action if animation_data is not None else None
+            fingerprint.add(action.name_full if action is not None else None)
             
-    def parse_joint_weld(self, json_joints_welds, object, modifier):
-        target1 = modifier["Input_2"]
-        target2 = modifier["Input_3"]
-        print(target1, target2)
-        if (target1 is None) or (target2 is None):
-            return
-        
-        targetOffset = [0, 0]
-        for constraint in object.constraints:
-            if constraint.type != "CHILD_OF":
-                continue
-            #if not constraint.use_offset:
-            #    continue
-            target = constraint.target
-            curr_location = object.location
-            target.rotation_mode = 'XYZ'
-            rotation = target.rotation_euler[1]   
-            rx = curr_location[0] * math.cos(rotation) + curr_location[2] * math.sin(rotation)
-            ry = curr_location[0] * -math.sin(rotation) + curr_location[2] * math.cos(rotation)
-            targetOffset[0] = rx
-            targetOffset[1] = ry
-                        
-        collideConnected = modifier["Input_8"]
-        
-        dampingRatio = modifier["Input_10"]
-        friquencyHZ = modifier["Input_9"]
-        
-        json_joints_welds.append({
-            "target1": target1.name,
-            "target2": target2.name,
-            "targetOffset": [
-                targetOffset[0],
-                targetOffset[1]
-                ],
-            "collideConnected": collideConnected,
-            "dampingRatio": dampingRatio,
-            "friquencyHZ": friquencyHZ
-        })
-                
-    def parse_joint_distance(self, json_joints_distance, modifier):
-        target1 = modifier["Input_2"]
-        target2 = modifier["Input_3"]
-        print(target1, target2)
-        if (target1 is None) or (target2 is None):
-            return
-        
-        target1OffsetX = modifier["Input_4"]
-        target1OffsetY = modifier["Input_6"]
-                                      
-        target2OffsetX = modifier["Input_5"]
-        target2OffsetY = modifier["Input_7"]
-                                
-        collideConnected = modifier["Input_8"]
-        
-        dampingRatio = modifier["Input_10"]
-        friquencyHZ = modifier["Input_9"]
-        
-        json_joints_distance.append({
-            "target1": target1.name,
-            "target2": target2.name,
-            "target1Offset": [
-                target1OffsetX,
-                target1OffsetY
-                ],
-            "target2Offset": [
-                target2OffsetX,
-                target2OffsetY
-                ],
-            "collideConnected": collideConnected,
-            "dampingRatio": dampingRatio,
-            "friquencyHZ": friquencyHZ
-        })
-                
-    def parse_joint_wheel(self, json_joints_wheel, modifier):
-        target1 = modifier["Input_2"]
-        target2 = modifier["Input_3"]
-        print(target1, target2)
-        if (target1 is None) or (target2 is None):
-            return
-        
-        target1OffsetX = modifier["Input_4"]
-        target1OffsetY = modifier["Input_6"]
-                                      
-        target2OffsetX = modifier["Input_5"]
-        target2OffsetY = modifier["Input_7"]
-                                      
-        localAxisX = modifier["Input_12"]
-        localAxisY = modifier["Input_13"]
-                                
-        collideConnected = modifier["Input_8"]
-        
-        max_motor_torque = modifier["Input_14"]
-        motor_speed = modifier["Input_15"]
-        
-        dampingRatio = modifier["Input_10"]
-        friquencyHZ = modifier["Input_9"]
-        
-        json_joints_wheel.append({
-            "target1": target1.name,
-            "target2": target2.name,
-            "target1Offset": [
-                target1OffsetX,
-                target1OffsetY
-                ],
-            "target2Offset": [
-                target2OffsetX,
-                target2OffsetY
-                ],
-            "localAxis": [
-                localAxisX,
-                localAxisY
-                ],
-            "collideConnected": collideConnected,
-            "maxMotorTorque": max_motor_torque,
-            "motorSpeed": motor_speed,
-            "dampingRatio": dampingRatio,
-            "friquencyHZ": friquencyHZ
-        })
-         
-    def parse_joints(self, root):
-        print("Links root", root)
-        collection = utils.find_collection(root, "Links")
-        if collection is None:
-            return []
-               
-        print("Parsing joints in", collection.name)
-        
-        objects = collection.objects
-        
-        json_joints_welds = []
-        json_joints_distance = []
-        json_joints_wheel = []
-        
-        for object in objects:
-            print(object.modifiers)
-            for modifier in object.modifiers:
-                print(modifier.type)
-                if modifier.type != 'NODES':
-                    continue
-                nodes = modifier.node_group
-                print(nodes.name)
-                if nodes.name == 'JointWeld':
-                    self.parse_joint_weld(json_joints_welds, object, modifier)
-                elif nodes.name == 'JointDistance':
-                    self.parse_joint_distance(json_joints_distance, modifier)
-                elif nodes.name == 'JointWheel':
-                    self.parse_joint_wheel(json_joints_wheel, modifier)
-        
-        json_joints = []
-        
-        json_joints.append({
-            "type": "Joints-weld",
-            "objects": json_joints_welds
-        })
-           
-        json_joints.append({
-            "type": "Joints-distance",
-            "objects": json_joints_distance
-        })
-           
-        json_joints.append({
-            "type": "Joints-wheel",
-            "objects": json_joints_wheel
-        })
-        
-        return json_joints
+        if object.is_instancer and object.instance_collection is not None:
+            fingerprint.add(self.fingerprint_collection(object.instance_collection, depsgraph))
+        
+        if object.type == 'MESH':
+            mesh = object.evaluated_get(depsgraph).data
+            co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+            mesh.vertices.foreach_get("co", co)
+            loop_vertex_index = np.empty(len(mesh.loops), dtype=np.int32)
+            mesh.loops.foreach_get("vertex_index", loop_vertex_index)
+            fingerprint.add(co)
+            fingerprint.add(loop_vertex_index)
+        elif object.type == 'CURVE':
+            for spline in object.data.splines:
+                points = spline.bezier_points
+                bezier_data = np.empty(len(points) * 9, dtype=np.float32)
+                for id, attr in enumerate(("co", "handle_left", "handle_right")):
+                    values = np.empty(len(points) * 3, dtype=np.float32)
+                    points.foreach_get(attr, values)
+                    bezier_data[id::3] = values
+                fingerprint.add(spline.use_cyclic_u)
+                fingerprint.add(bezier_data)
     
-    def parse_object_bounding_box(self, object, json_bounding_box_data):
-        center = object.location
-        dimensions = object.dimensions
-        hDims = dimensions / 2
-        
-        json_bounding_box_data.append({
-            "center": [
-                center[0],
-                center[2],
-                center[1]
-            ],
-            "hdims": [
-                hDims[0],
-                hDims[2],
-                hDims[1],
-            ]
-        })        
-     
-    def prepare_mesh_data(self, mesh, world):
-        out_buffer = []
-        processed_vertices_id = set()
-        out_buffer.append(int(0))
-        num_of_vertices = 0
-        mesh.calc_loop_triangles()
-        sorted_loops = mesh.loops.values()
-        sorted_loops.sort(key=lambda loop: (loop.vertex_index))
-        for loop in sorted_loops:
-            loop_id = loop.index
-            vid = loop.vertex_index
-            if vid in processed_vertices_id:
-                continue
-            num_of_vertices += 1
-            processed_vertices_id.add(vid)
-            #print("Vertex id:", vid)
-            vertex = mesh.vertices[vid]
-            v_global = world @ vertex.co
-            #print("Vertex:", vertex.co)
-            out_buffer.append(v_global[0])
-            out_buffer.append(v_global[2])
-            out_buffer.append(v_global[1])
-        out_buffer[0] = num_of_vertices
+    def fingerprint_collection(self, collection, depsgraph):
+        key = collection.name_full
+        if key in self.collection_fingerprints:
+            # None marks a collection that is being fingerprinted right now
+            return self.collection_fingerprints[key] or key
+        self.collection_fingerprints[key] = None
+        
+        fingerprint = export_manifest.Fingerprint()
+        fingerprint.add(key)
+        fingerprint.add(self.get_library_fingerprint(collection.library))
+        for object in sorted(collection.objects, key=lambda object: object.name_full):
+            self.fingerprint_object(fingerprint, object, depsgraph)
+        for child in collection.children:
+            fingerprint.add(self.fingerprint_collection(child, depsgraph))
+        
+        self.collection_fingerprints[key] = fingerprint.hexdigest()
+        return self.collection_fingerprints[key]
+    
+    def fingerprint_cluster(self, root, override, context, placement=None):
+        fingerprint = export_manifest.make_cluster_fingerprint()
+        fingerprint.add(placement)
+        fingerprint.add(self.fingerprint_collection(root, context.evaluated_depsgraph_get()))
+        fingerprint.add(context.scene.re.mesh_format)
+        fingerprint.add(context.scene.re.compact_json)
+        fingerprint.add([context.scene.re.optimize_meshes, context.scene.re.weld_distance])
+        fingerprint.add([context.scene.re.mesh_lods, context.scene.re.lod_screen_size])
+        fingerprint.add([context.scene.re.export_bvh, context.scene.re.spatial_order, context.scene.re.optimize_collisions,
+            context.scene.re.batch_polygons, context.scene.re.track_resolution])
+        fingerprint.add([context.scene.re.quantization_mode, context.scene.re.position_precision, context.scene.re.rotation_precision,
+            context.scene.re.physics_precision])
+        fingerprint.add(override.get_key() if override is not None else None)
+        return fingerprint.hexdigest()
+    
+    def check_dependency(self, node, context):
+        # intermediate path of a dependency that has to be exported, None
+        # when it is up to date or only listed
+        root_folder = bpy.path.abspath(bpy.context.scene.re.engine_path)
+        out_name = node.name
         
-        num_of_indices_id = len(out_buffer)
-        out_buffer.append(int(0))
+        dependency_src_path = utils.get_resources_path(root_folder, "Sources", "Data", "Intermediate", out_name + ".json")
         
-        num_of_indices = 0
-        for polygon in mesh.loop_triangles:
-            for loop_id in reversed(polygon.loops):
-                num_of_indices += 1
-                vid = mesh.loops[loop_id].vertex_index
-                out_buffer.append(vid)
-                #print("Index id: ", vid)
-        out_buffer[num_of_indices_id] = num_of_indices
+        fingerprint = None
+        if self.manifest is not None:
+            fingerprint = self.fingerprint_cluster(node.root.id_data, node.override, context, node.get_placement())
+            if self.manifest.is_up_to_date(out_name, fingerprint, dependency_src_path):
+                logger.info("Cluster is up to date %s", out_name)
+                return None
         
-        print("num of vertices", out_buffer[0])
-        print("num of indices", out_buffer[num_of_indices_id])
-
-        return out_buffer     
+        if self.dry_run:
+            self.rebuild_list.append(out_name)
+            return None
         
-    def parse_mesh(self, root, context):
-        collection = utils.find_collection(root, "Mesh")
-        if collection is None:
-            return [], []
+        self.compiled_fingerprints[out_name] = fingerprint
+        return dependency_src_path
     
-        depsgraph = context.evaluated_depsgraph_get()
-        
-        json_mesh_data = []
-        json_bounding_box_data = []
-        for object_raw in collection.objects:
-            object = object_raw.evaluated_get(depsgraph)
-            mesh = object.data
-            if mesh is None:
-                continue
-            mesh_data = self.prepare_mesh_data(mesh, object.matrix_world)               
-            json_mesh_data.append(mesh_data)
-            
-            self.parse_object_bounding_box(object, json_bounding_box_data)
-            
-        return json_mesh_data, json_bounding_box_data
+    def start_workers(self, num_of_workers):
+        # a single cluster is parsed right here, snapshots and process start
+        # up only pay off when several clusters are parsed at once
+        self.workers = export_workers
+        self.snapshot = None
+        self.executor = None
+        if num_of_workers <= 1:
+            return
+        self.workers = export_workers.get_worker_module()
+        self.snapshot = blender_scene.SceneSnapshot(export_workers.get_worker_scene_model())
+        python_path = getattr(bpy.app, "binary_path_python", None) or sys.executable
+        # the initializer is pickled by name, it has to come from the module
+        # the workers import
+        self.executor = self.workers.create_executor(num_of_workers, python_path, logger.getEffectiveLevel())
     
-    def parse_collisions(self, root, override):
-        
-        collection = utils.find_collection(root, "Collision")
-        if collection is None:
-            return [], []
-        
-        json_collision_circles_data = []
-        json_collision_polygon_data = []
-                
-        for c_object in collection.objects:
-            print(c_object.modifiers)
-            for modifier in c_object.modifiers:
-                print(modifier.type)
-                if modifier.type != 'NODES':
-                    continue
-                
-                override_data = None
-                if override is not None:
-                    if override.collision_overrites_names.count(c_object.name) > 0:
-                        override_id = override.collision_overrites_names.index(c_object.name)
-                        override_data = override.collision_overrites[override_id]
-                
-                nodes = modifier.node_group
-                print(nodes.name)
-                if nodes.name == 'CollisionCircle':
-                    density = modifier["Input_2"]
-                    restitution = modifier["Input_3"]
-                    friction = modifier["Input_4"]
-                    is_sensor = modifier["Input_5"]
-                    filter_data = is_sensor
-                    filter_data |= (modifier["Input_6"]  << 1 )
-                    filter_data |= (modifier["Input_7"]  << 2 )
-                    filter_data |= (modifier["Input_8"]  << 3 )
-                    filter_data |= (modifier["Input_9"]  << 4 )
-                    filter_data |= (modifier["Input_10"] << 5 )
-                    filter_data |= (modifier["Input_11"] << 6 )
-                    filter_data |= (modifier["Input_12"] << 7 )
-                    filter_data |= (modifier["Input_13"] << 8 )
-                    filter_data |= (modifier["Input_14"] << 9 )
-                    filter_data |= (modifier["Input_15"] << 10 )
-                    filter_data |= (modifier["Input_16"] << 11 )
-                    filter_data |= (modifier["Input_17"] << 12 )
-                    filter_data |= (modifier["Input_18"] << 13 )
-                    filter_data |= (modifier["Input_19"] << 14 )
-                    filter_data |= (modifier["Input_20"] << 15 )
-                    filter_data |= (modifier["Input_21"] << 16 )
-                    filter_data |= (modifier["Input_22"] << 17 )
-                    filter_data |= (modifier["Input_23"] << 18 )
-                    filter_data |= (modifier["Input_24"] << 19 )
-                    filter_data |= (modifier["Input_25"] << 20 )
-                    filter_data |= (modifier["Input_26"] << 21 )
-                    filter_data |= (modifier["Input_27"] << 22 )
-                    filter_data |= (modifier["Input_28"] << 23 )
-                    filter_data |= (modifier["Input_29"] << 24 )
-                    filter_data |= (modifier["Input_30"] << 25 )
-                    filter_data |= (modifier["Input_31"] << 26 )
-                    filter_data |= (modifier["Input_32"] << 27 )
-                    filter_data |= (modifier["Input_33"] << 28 )
-                    filter_data |= (modifier["Input_34"] << 29 )
-                    filter_data |= (modifier["Input_35"] << 30 )
-                    
-                    if override_data is not None:
-                        density = override_data[0]
-                        restitution = override_data[1]
-                        friction = override_data[2]
-                
-                    location = c_object.location
-                    
-                    radius = c_object.dimensions[0] / 2
-                    json_collision_circles_data.append({
-                        "radius": radius,
-                        "density": density,
-                        "restitution": restitution,
-                        "friction": friction,
-                        "filterData": filter_data,
-                        "location": [
-                            location[0],
-                            location[2]
-                        ]
-                    })
-                elif nodes.name == 'CollisionPolygon':
-                    density = modifier["Input_2"]
-                    restitution = modifier["Input_3"]
-                    friction = modifier["Input_4"]
-                    is_sensor = modifier["Input_5"]
-                    filter_data = is_sensor
-                    filter_data |= (modifier["Input_6"]  << 1 )
-                    filter_data |= (modifier["Input_7"]  << 2 )
-                    filter_data |= (modifier["Input_8"]  << 3 )
-                    filter_data |= (modifier["Input_9"]  << 4 )
-                    filter_data |= (modifier["Input_10"] << 5 )
-                    filter_data |= (modifier["Input_11"] << 6 )
-                    filter_data |= (modifier["Input_12"] << 7 )
-                    filter_data |= (modifier["Input_13"] << 8 )
-                    filter_data |= (modifier["Input_14"] << 9 )
-                    filter_data |= (modifier["Input_15"] << 10 )
-                    filter_data |= (modifier["Input_16"] << 11 )
-                    filter_data |= (modifier["Input_17"] << 12 )
-                    filter_data |= (modifier["Input_18"] << 13 )
-                    filter_data |= (modifier["Input_19"] << 14 )
-                    filter_data |= (modifier["Input_20"] << 15 )
-                    filter_data |= (modifier["Input_21"] << 16 )
-                    filter_data |= (modifier["Input_22"] << 17 )
-                    filter_data |= (modifier["Input_23"] << 18 )
-                    filter_data |= (modifier["Input_24"] << 19 )
-                    filter_data |= (modifier["Input_25"] << 20 )
-                    filter_data |= (modifier["Input_26"] << 21 )
-                    filter_data |= (modifier["Input_27"] << 22 )
-                    filter_data |= (modifier["Input_28"] << 23 )
-                    filter_data |= (modifier["Input_29"] << 24 )
-                    filter_data |= (modifier["Input_30"] << 25 )
-                    filter_data |= (modifier["Input_31"] << 26 )
-                    filter_data |= (modifier["Input_32"] << 27 )
-                    filter_data |= (modifier["Input_33"] << 28 )
-                    filter_data |= (modifier["Input_34"] << 29 )
-                    filter_data |= (modifier["Input_35"] << 30 )
-                    
-                    if override_data is not None:
-                        density = override_data[0]
-                        restitution = override_data[1]
-                        friction = override_data[2]
-                        
-                    world_mat = c_object.matrix_world
-                    
-                    vertices = c_object.data.vertices
-                    if len(vertices) != 4:
-                        continue
-                    
-                    p0 = world_mat @ vertices[0].co
-                    p1 = world_mat @ vertices[1].co
-                    p2 = world_mat @ vertices[3].co
-                    p3 = world_mat @ vertices[2].co
-                    
-                    json_collision_polygon_data.append({
-                        "density": density,
-                        "restitution": restitution,
-                        "friction": friction,
-                        "filterData": filter_data,
-                        "points": [
-                            p0[0], p0[2],
-                            p1[0], p1[2],
-                            p2[0], p2[2],
-                            p3[0], p3[2]
-                        ]
-                    })                    
-                
-        return json_collision_circles_data, json_collision_polygon_data
+    def get_export_settings(self, context):
+        compression = None
+        if context.scene.re.action_compression:
+            interpolation = action_compression.INTERPOLATION_HERMITE if context.scene.re.action_interpolation == 'HERMITE' else action_compression.INTERPOLATION_LINEAR
+            compression = (context.scene.re.action_error_bound, interpolation)
+        lods = None
+        if context.scene.re.mesh_lods > 0:
+            root_folder = bpy.path.abspath(context.scene.re.engine_path)
+            lods = (context.scene.re.mesh_lods, context.scene.re.lod_screen_size,
+                utils.get_resources_path(root_folder, "Sources", "Data", "LodCache"))
+        quantization_settings = (context.scene.re.quantization_mode, context.scene.re.position_precision, context.scene.re.rotation_precision,
+            context.scene.re.physics_precision, context.scene.re.action_precision)
+        return self.workers.ExportSettings(context.scene.re.mesh_format, None if context.scene.re.compact_json else 4,
+            quantization_settings, context.scene.re.profile_export, compression,
+            context.scene.re.weld_distance if context.scene.re.optimize_meshes else None, lods, context.scene.re.export_bvh,
+            context.scene.re.spatial_order, context.scene.re.optimize_collisions, context.scene.re.batch_polygons,
+            context.scene.re.track_resolution)
     
-    def parse_beams(self, root, override, parent_location, parent_rotation, parent_scale):
-        collection = utils.find_collection(root, "Beams")
-        if collection is None:
-            return [], []
-        
-        json_beams_enabled_data = []
-        json_beams_disabled_data = []
-                
-        for object in collection.objects:
-            print(object.modifiers)
-        
-            override_data = None
-            if override is not None:
-                if override.beams_overrites_names.count(object.name) > 0:
-                    override_id = override.beams_overrites_names.index(object.name)
-                    override_data = override.beams_overrites[override_id]
-            
-            for modifier in object.modifiers:
-                print(modifier.type)
-                if modifier.type != 'NODES':
-                    continue
-                
-                nodes = modifier.node_group
-                print(nodes.name)
-                if nodes.name == 'Beam':
-                    max_length = modifier["Input_2"]
-                    width = modifier["Input_3"]
-                    enabled = modifier["Input_4"]
-                    if override_data is not None:
-                        max_length = override_data[0]
-                        width = override_data[1]
-                        enabled = override_data[2]
-                        
-                    x = object.location[0]
-                    y = object.location[2]
-
-                    rot_parent = parent_rotation[0] * parent_rotation[2]
-
-                    rx = x * math.cos(rot_parent) + y * math.sin(rot_parent)
-                    ry = x * -math.sin(rot_parent) + y * math.cos(rot_parent)
-                    
-                    location = object.location#Vector([rx, 0, ry]) + parent_location
-                    
-                    object.rotation_mode = 'XYZ'
-                    rotation = object.rotation_euler[1] #+ rot_parent
-                    
-                    beam_data = {
-                        "rotation": rotation,
-                        "maxLength": max_length,
-                        "width": width,
-                        "location": [
-                            location[0],
-                            location[2]
-                        ]
-                    }
-                    if enabled:
-                        json_beams_enabled_data.append(beam_data)
-                    else:
-                        json_beams_disabled_data.append(beam_data)
-                    
-        return json_beams_enabled_data, json_beams_disabled_data  
+    def create_job(self, node, path, settings, actions=None, action_names=None):
+        # phase one, the only part that reads Blender data when workers parse
+        root = node.root
+        override = node.override
+        if self.snapshot is not None:
+            with self.profiler.stage("snapshot", node.name):
+                root = self.snapshot.collection(root)
+                override = self.workers.copy_override(override)
+                if actions is not None:
+                    actions = [self.snapshot.action(action) for action in action_reachability.select_actions(actions, action_names)]
+        return self.workers.ExportJob(node.name, root, node.location, node.rotation, node.scale, override, path, settings, actions, action_names)
     
-    def parse_actions(self):
-        json_actions_data = []
-        
-        for action in bpy.data.actions:
-                
-            action_name = action.name
-            
-            values_total = []
-            types_total = []
-            
-            if len(action.fcurves) == 0:
-                continue
-            
-            def get_num_of_frames(fcurves):
-                c_range = fcurves[0].range()
-                return c_range[1] - c_range[0] + 1
-            num_of_frames = get_num_of_frames(action.fcurves)
-            
-            def compute_stride(num_of_frames):
-                if num_of_frames > 64:
-                    return 2
-                return 1
-            stride = compute_stride(num_of_frames)
-            
-            for curve in action.fcurves:                
-                if len(curve.keyframe_points) == 0:
-                    continue
-                
-                is_constant = True
-                k_value = curve.keyframe_points[0].handle_left[1]
-                for keyframe in curve.keyframe_points:
-                    if abs(keyframe.handle_left[1] - k_value) > 0.001 or \
-                        abs(keyframe.co[1] - k_value) > 0.001 or \
-                        abs(keyframe.handle_right[1] - k_value) > 0.001:
-                            is_constant = False
-                if is_constant:
-                    continue
-                
-                c_range = curve.range()
-                num_of_frames = c_range[1] - c_range[0] + 1
-                                
-                values = []
-                
-                def populate( multiplier = 1):
-                    curr_frame_id = c_range[0]
-                    while curr_frame_id <= c_range[1]:
-                        value = curve.evaluate(curr_frame_id)
-                        values.append(value * multiplier)
-                        curr_frame_id += stride
-                    
-                type = curve.data_path + str(curve.array_index)    
-                bNegate = type == "rotation_axis_angle0" or type == "rotation_euler1"
-                if bNegate:
-                    populate(-1)
-                else:
-                    populate()
-                    
-                types_total.append(type)
-                values_total.append(values)
-                
-            frame_delta_time = 1/60
-            time_stride = frame_delta_time * stride
-            
-            if len(values_total) == 0:
-                continue
-
-            json_actions_data.append({
-                "name": action_name,
-                "timeStride": time_stride,
-                "types": types_total,
-                "data": values_total
-            })         
-        
-        return json_actions_data 
-
-    def parse_tracks(self, root):
-        print("---------------Parsing tracks---------------------")
-        collection = utils.find_collection(root, "Tracks")
-        if collection is None:
-            print("No tracks registered")
-            return []
-        
-        json_tracks_data = []
-        
-        for object in collection.objects:
-            if object.data is None:
-                continue
-
-            track_data = object.data
-            splines = track_data.splines
-            if len(splines) == 0:
-                continue
-
-            spline = splines[0]
-
-            control_points_x = []
-            control_points_y = []
-
-            w_mat = object.matrix_world
-
-            for point in spline.bezier_points:
-                def get_x(p):
-                    return p[0]
-                def get_y(p):
-                    return p[2]
-
-                point_left = w_mat @ point.handle_left
-                point_center = w_mat @ point.co
-                point_right = w_mat @ point.handle_right
-
-                control_points_x.append(get_x(point_left))
-                control_points_x.append(get_x(point_center))
-                control_points_x.append(get_x(point_right))
-
-                control_points_y.append(get_y(point_left))
-                control_points_y.append(get_y(point_center))
-                control_points_y.append(get_y(point_right))
-
-            if len(control_points_x) == 0:
-                continue
-
-            is_cyclic = spline.use_cyclic_u
-            if not is_cyclic:
-                control_points_x.pop(0)
-                control_points_x.pop(-1)
-                control_points_y.pop(0)
-                control_points_y.pop(-1)
-            else:
-                control_points_x.append(control_points_x[0])
-                control_points_x.append(control_points_x[1])
-                control_points_x.pop(0)
-                
-                control_points_y.append(control_points_y[0])
-                control_points_y.append(control_points_y[1])
-                control_points_y.pop(0)
-
-            animation_data = track_data.animation_data
-            if animation_data is None:
-                continue
-            action = animation_data.action
-            if action is None:
-                continue
-            action_name = action.name
-
-            #action_data = self.parse_action(action)
-            #if action_data is None:
-            #    continue
-
-            json_tracks_data.append({
-                "name": object.name,
-                "actionName": action_name,
-                "pointsX": control_points_x,
-                "pointsY": control_points_y
-            })
-
-        print("json_tracks_data", json_tracks_data)
-        return json_tracks_data
+    def submit_job(self, job):
+        if self.executor is None:
+            return job
+        return self.executor.submit(self.workers.export_cluster, job)
     
-    def parse_dependencies(self, dependecies, overrides, dependencies_locations, dependencies_rotations, dependencies_scales, context):
-        registered_dependencies_names = []
-        registered_dependencies_ids = []
-        for id, dep in enumerate(bpy.data.collections):
-            #if (dep.library is not None) and (dep.is_library_indirect is False):
-            #if dep.is_instancer
-            registered_dependencies_names.append(utils.trim_name(dep.name_full))
-            registered_dependencies_ids.append(id)
-            
-        for name in dependecies:
-            #if registered_dependencies_names.count(name) == 0:
-            #    print("Cannot find dependency", name)
-            #    print("Searching dependency override...")
-            #    override = overrides.get(name)
-            #    if override is None:
-            #        print("Cannot find dependency override", name)
-            #        continue
-            #    src = override.get_src_dependency()
-            #    if bpy.data.collections.count(src) == 0:
-            #        print("Cannot find source collection", src)
-            #        continue
-            #    src_collection = bpy.data.collections[src]
-            
-            overrides_list = [None]
-            for override in overrides.values():
-                if override.get_src_dependency() == name:
-                    overrides_list.append(override)
-            local_id = registered_dependencies_names.index(name)
-            collection_id = registered_dependencies_ids[local_id]
-            
-            root_src = bpy.data.collections[collection_id]
-            print(overrides_list)            
-
-            for override in overrides_list:
-                json_cluster = self.parse_cluster(root_src, context, dependencies_locations[name], dependencies_rotations[name], dependencies_scales[name], override)
-                
-                root_folder = bpy.path.abspath(bpy.context.scene.re.engine_path)
-                
-                out_name = name
-                if override is not None:
-                    out_name = name + str(hash(override))
-                
-                dependency_src_path = root_folder + "hopper\\Hopper\\Hopper\\Resources\\Sources\\Data\\Intermediate\\" + out_name + ".json"
-                self.dump(json_cluster, dependency_src_path)
-                print("Intermediate generated for ", out_name)
-                
-                compiler_path = root_folder + "tools\\MapCompiler\\x64\\Debug\\MapCompiler.exe"
-                export_folder = root_folder + "hopper\\Hopper\\Hopper\\Resources\\Clusters" 
-                completed = subprocess.run([compiler_path, 
-                    "-i", dependency_src_path, "-of", export_folder])
-                print("Cluster compilation", out_name, completed)
-      
-    def parse_cluster(self, root, context, parent_location, parent_rotation, parent_scale, override):
-        cluster_name = root.name
-        if override is not None:
-            cluster_name = cluster_name + str(hash(override))
-            
-        print("Trying to parse cluster", cluster_name)
-        
-        cluster_collection = utils.get_cluster_collection(root)
-        if cluster_collection is None:
-            return []
-        
-        cluster_type = utils.gather_name(cluster_collection.name)
-        print(cluster_type)
-                
-        #parse objects
-        json_object_refs, dependecies, overrides, dependencies_locations, dependencies_rotations, dependencies_scales = \
-            self.parse_object_refs(cluster_collection, parent_location, parent_scale)
-        
-        #parse collisions
-        json_collision_circles, json_collision_polygons = self.parse_collisions(cluster_collection, override)
-        
-        json_beams_enabled, json_beams_disabled = self.parse_beams(cluster_collection, override, parent_location, parent_rotation, parent_scale)
-        
-        json_tracks = self.parse_tracks(cluster_collection)
-
-        #parse joints
-        json_joints = self.parse_joints(cluster_collection)
-                
-        #parse meshes
-        json_meshes, json_boundings = self.parse_mesh(cluster_collection, context)
-        
-        json_polygons = self.parse_polygons(cluster_collection)
-        print(json_polygons)
-        print(json_tracks)
-        json_cluster = {
-            "name": cluster_name,
-            "type": cluster_type,
-            "objectRefs": json_object_refs,
-            "collision-circles": json_collision_circles,
-            "collision-polygons": json_collision_polygons,
-            "beams-enabled": json_beams_enabled,
-            "beams-disabled": json_beams_disabled,
-            "joints": json_joints,
-            "meshes-v1": json_meshes,
-            "boundings": json_boundings,
-            "polygons": json_polygons,
-            "tracks": json_tracks,
-            "actions": {},
-        }
-        
-        #parse dependences 
-        self.parse_dependencies(dependecies, overrides, dependencies_locations, dependencies_rotations, dependencies_scales, context)
-        
-        return json_cluster
+    def finish_job(self, pending):
+        result = pending.result() if self.executor is not None else self.workers.export_cluster(pending)
+        for record in result.log_records:
+            # workers log under top level module names, the handlers sit on
+            # the addon package
+            record.name = "{}.{}".format(__package__, record.name)
+            logging.getLogger(record.name).handle(record)
+        logger.info("Intermediate generated for %s", result.name)
+        for message in result.messages:
+            logger.info(message)
+        self.intermediate_sizes[result.name] = result.size
+        self.quantization.merge(result.quantization)
+        self.profiler.add_events(result.events, "parse {}".format(result.pid))
+        if result.mesh_report is not None and result.mesh_report.num_of_meshes > 0:
+            for line in result.mesh_report.format():
+                logger.info("Meshes of %s: %s", result.name, line)
+            self.mesh_reports[result.name] = result.mesh_report.get_summary()
+        if result.lod_report is not None and result.lod_report.num_of_meshes > 0:
+            for line in result.lod_report.format():
+                logger.info("LODs of %s: %s", result.name, line)
+            self.lod_reports[result.name] = result.lod_report.get_summary()
+        if result.collision_report is not None and result.collision_report.num_of_shapes > 0:
+            for line in result.collision_report.format():
+                logger.info("Collisions of %s: %s", result.name, line)
+            self.collision_reports[result.name] = result.collision_report.get_summary()
+        return result
     
     @classmethod
     def poll(cls, context):
+        # background runs name the cluster instead of selecting it
+        if bpy.app.background:
+            return True
         selected = context.selected_objects
         return len(selected) > 0
+    
+    def find_cluster(self, context):
+        if self.cluster_name:
+            cluster = bpy.data.collections.get(self.cluster_name)
+            if cluster is None or len(cluster.children) == 0 or utils.get_cluster_collection(cluster) is None:
+                return None
+            return cluster
+        
+        if len(context.selected_objects) == 0:
+            return None
+        selected = context.selected_objects[0]
+        cluster_root = utils.get_cluster_from_collection(selected.users_collection[0])
+        if cluster_root is None:
+            return None
+        return utils.get_parent_collection(cluster_root)
+    
+    def write_summary(self, summary):
+        if not self.summary_path:
+            return
+        with open(self.summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4)
 
     def execute(self, context):
         
@@ -969,38 +489,161 @@ class ExportScene(bpy.types.Operator, AddObjectHelper):
         #print(export_folder)
         #print(export_folder_obj)
         
-        print("Export scene")
+        utils.set_log_level(context.scene.re.log_level)
+        logger.info("Export scene")
 
-        selected = context.selected_objects[0]
-        cluster_root = utils.get_cluster_from_collection(selected.users_collection[0])
-        if cluster_root is None:
+        cluster = self.find_cluster(context)
+        if cluster is None:
+            if self.cluster_name:
+                self.report({"ERROR"}, "Failed to export, {} is not a cluster".format(self.cluster_name))
+                return {'CANCELLED'}
             self.report({"INFO"}, "Failed to export, select an object to deduce a cluster")
             return {'FINISHED'}
-        cluster = utils.get_parent_collection(cluster_root)
-        print("ccc", cluster.name)
+        logger.debug("Exporting cluster %s", cluster.name)
 
         root_folder = bpy.path.abspath(bpy.context.scene.re.engine_path)
-        save_path = root_folder + "hopper\\Hopper\\Hopper\\Resources\\Sources\\Intermediate\\" + cluster.name + " [" + filename + "].json"
+        save_path = utils.get_resources_path(root_folder, "Sources", "Intermediate", cluster.name + " [" + filename + "].json")
+        
+        self.manifest = None
+        if context.scene.re.incremental_export:
+            manifest_path = utils.get_resources_path(root_folder, "Sources", "Data", "Intermediate.manifest.json")
+            self.manifest = export_manifest.ExportManifest(manifest_path)
+        self.collection_fingerprints = dict()
+        self.library_fingerprints = dict()
+        self.rebuild_list = []
+        self.node_inputs = node_inputs.NodeInputRegistry()
+        self.scheduler = compile_jobs.CompileScheduler(context.scene.re.compiler_jobs)
+        self.compiled_fingerprints = dict()
+        self.intermediate_sizes = dict()
+        self.mesh_reports = dict()
+        self.lod_reports = dict()
+        self.collision_reports = dict()
+        self.quantization = quantization.QuantizationReport(context.scene.re.quantization_mode, context.scene.re.position_precision,
+            context.scene.re.rotation_precision, context.scene.re.physics_precision, context.scene.re.action_precision)
+        self.profiler = profiler.ExportProfiler(context.scene.re.profile_export)
+        self.profiler.start()
+        self.scene_view = blender_scene.BlenderScene(context)
+        self.parser = cluster_parser.ClusterParser(self.node_inputs, self.quantization, self.profiler, context.scene.re.mesh_format)
+        cluster_view = self.scene_view.wrap_collection(cluster)
+        
+        with self.profiler.stage("plan_dependencies", cluster.name):
+            graph = self.parser.plan_dependencies(cluster_view, self.scene_view.collections)
+        try:
+            export_order = graph.topological_order()
+        except dependency_graph.DependencyCycleError as e:
+            self.profiler.stop()
+            self.report({"ERROR"}, "Failed to export, " + str(e))
+            return {'CANCELLED'}
+        logger.info("Export order %s", export_order)
+        
+        dependencies = []
+        for key in export_order:
+            if key == cluster.name:
+                continue
+            node = graph.get(key)
+            path = self.check_dependency(node, context)
+            if path is not None:
+                dependencies.append((node, path))
+        
+        if self.dry_run:
+            self.rebuild_list.append(cluster.name)
+            for name in self.rebuild_list:
+                logger.info("Would rebuild %s", name)
+            self.profiler.stop()
+            self.write_summary({"cluster": cluster.name, "rebuild": self.rebuild_list})
+            self.report({"INFO"}, "Clusters to rebuild: " + ", ".join(self.rebuild_list))
+            return {'FINISHED'}
 
-        #for cluster in bpy.context.scene.collection.children:
-        json_scene = self.parse_cluster(cluster, context, Vector([0, 0, 0]), Vector([0, 1, 0, 0]), Vector([1, 1, 1]), None)
-        json_scene["actions"] = self.parse_actions()
-        print(json_scene)
-        self.dump(json_scene, save_path)
+        compiler_path = utils.get_compiler_path(root_folder)
+        export_folder = utils.get_export_folder(root_folder, context.scene.re.output_path)
+        
+        # workers parse while Blender snapshots the next cluster, every
+        # cluster is compiled once its intermediate is written and the
+        # clusters it references compiled
+        self.start_workers(min(context.scene.re.parse_jobs or os.cpu_count() or 1, len(dependencies) + 1))
+        pending = []
+        # the cluster being snapshot or finished, named when its job fails
+        current = (cluster.name, save_path)
+        try:
+            settings = self.get_export_settings(context)
+            for node, path in dependencies:
+                current = (node.name, path)
+                pending.append(self.submit_job(self.create_job(node, path, settings)))
             
-        #self.parse_polygons()
-        #self.parse_objects()
-        #self.parse_joints(bpy.context.layer_collection.collection, self.out_json)
-        #self.parse_dependencies()
-        
-        
-        compiler_path = root_folder + "tools\\MapCompiler\\x64\\Debug\\MapCompiler.exe"
-        #export_folder = bpy.path.abspath(bpy.context.scene.re.output_path) 
-        export_folder = root_folder + "hopper\\Hopper\\Hopper\\Resources\\Clusters" 
-        completed = subprocess.run([compiler_path, 
-                        "-i", save_path, "-of", export_folder])
-        print(completed)
-        print("Export done!")
+            # the exported cluster carries the actions of the whole tree
+            action_names = None
+            if not context.scene.re.export_all_actions:
+                action_names = self.parser.collect_reachable_actions(graph)
+            current = (cluster.name, save_path)
+            pending.append(self.submit_job(self.create_job(graph.get(cluster.name), save_path, settings, self.scene_view.actions, action_names)))
+            
+            # pending follows the export order, so the children of a cluster
+            # are always submitted to the scheduler before it
+            for (node, path), job in zip(dependencies + [(graph.get(cluster.name), save_path)], pending):
+                current = (node.name, path)
+                result = self.finish_job(job)
+                self.scheduler.submit(result.name, [compiler_path, 
+                    "-i", result.path, "-of", export_folder], result.size, graph.edges[result.name])
+        except Exception as e:
+            name, path = current
+            logger.exception("Failed to export %s", name)
+            if self.executor is not None:
+                for job in pending:
+                    job.cancel()
+            # a half written intermediate must not pass for an exported one
+            if os.path.exists(path):
+                os.remove(path)
+            self.scheduler.wait()
+            self.profiler.stop()
+            self.report({"ERROR"}, "Failed to export {}, {}".format(name, e))
+            return {'CANCELLED'}
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+        
+        compile_report = self.scheduler.wait()
+        for line in compile_report.format():
+            logger.info(line)
+        self.profiler.add_compile_results(compile_report.results)
+        if self.profiler.enabled:
+            trace_path = os.path.splitext(save_path)[0] + ".trace.json"
+            self.profiler.write_trace(trace_path)
+            logger.info("Export profile written to %s", trace_path)
+            for line in self.profiler.format():
+                logger.info(line)
+        self.profiler.stop()
+        quantization_lines = self.quantization.format()
+        for line in quantization_lines:
+            logger.info("Quantized %s", line)
+        
+        if self.manifest is not None:
+            for out_name, fingerprint in self.compiled_fingerprints.items():
+                if compile_report.get_returncode(out_name) == 0:
+                    self.manifest.update(out_name, fingerprint)
+                else:
+                    self.manifest.remove(out_name)
+            self.manifest.save()
+        
+        if len(compile_report.failed) > 0:
+            self.report({"WARNING"}, "{} of {} cluster compilations failed".format(len(compile_report.failed), len(compile_report.results)))
+        elif len(quantization_lines) > 0:
+            self.report({"INFO"}, "Quantized " + "; ".join(quantization_lines))
+        summary = {
+            "cluster": cluster.name,
+            "intermediates": self.intermediate_sizes,
+            "compiled": [result.name for result in compile_report.results if result.succeeded],
+            "failed": [result.name for result in compile_report.failed],
+        }
+        if len(self.mesh_reports) > 0:
+            summary["meshes"] = self.mesh_reports
+        if len(self.lod_reports) > 0:
+            summary["lods"] = self.lod_reports
+        if len(self.collision_reports) > 0:
+            summary["collisions"] = self.collision_reports
+        if self.profiler.enabled:
+            summary["stages"] = {name: seconds for name, (_, seconds, _) in self.profiler.get_totals().items()}
+        self.write_summary(summary)
+        logger.info("Export done!")
         return {'FINISHED'}
 
 _classes = (
@@ -1017,6 +660,7 @@ def register():
         return PointerProperty(name="settings",type=prop_type)
 
     bpy.types.Scene.re = make_pointer(CommonProps)
+    utils.set_log_level('INFO')
 
 def unregister():
     for cls in reversed(_classes):
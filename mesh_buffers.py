@@ -0,0 +1,128 @@
+import os
+import struct
+
+import numpy as np
+
+# Bulk helpers for mesh export. Nothing in here touches bpy, the arrays are
+# filled with foreach_get on the Blender side and handed over as is.
+
+def transform_points(points, world):
+    world = np.asarray(world, dtype=np.float32)
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    return points @ world[:3, :3].T + world[:3, 3]
+
+def swizzle_xzy(points):
+    return np.asarray(points).reshape(-1, 3)[:, [0, 2, 1]]
+
+def build_mesh_v1(co, world, loop_vertex_index, triangles, quantize=None):
+    # Same layout prepare_mesh_data always produced:
+    # [num_of_vertices, x, z, y, ..., num_of_indices, i0, i1, ...]
+    # Only vertices referenced by a loop are written, in vertex index order,
+    # and every triangle is emitted with reversed winding. quantize rounds the
+    # world positions, in double precision so the json gets the short values.
+    used = np.unique(np.asarray(loop_vertex_index, dtype=np.int64))
+    positions = swizzle_xzy(transform_points(co, world)[used])
+    if quantize is not None:
+        positions = quantize(positions.astype(np.float64))
+    indices = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)[:, ::-1]
+
+    return pack_mesh_v1(positions, indices)
+
+def pack_mesh_v1(positions, indices):
+    out_buffer = [len(positions)]
+    out_buffer.extend(np.asarray(positions).ravel().tolist())
+    out_buffer.append(np.asarray(indices).size)
+    out_buffer.extend(np.asarray(indices).ravel().tolist())
+    return out_buffer
+
+def build_mesh_arrays(co, world, loop_vertex_index, triangles, quantize=None, dtype=np.float32):
+    # Same vertex selection as build_mesh_v1, but indices are remapped onto the
+    # written vertices so loose vertices can not shift them. Positions meant
+    # for json keep double precision with dtype=np.float64.
+    used = np.unique(np.asarray(loop_vertex_index, dtype=np.int64))
+    positions = swizzle_xzy(transform_points(co, world)[used])
+    if quantize is not None:
+        positions = quantize(positions.astype(np.float64))
+    indices = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)[:, ::-1]
+    indices = np.searchsorted(used, indices.ravel())
+    return positions.astype(dtype), indices
+
+SIDECAR_MAGIC = b"RMBF"
+SIDECAR_VERSION = 1
+SIDECAR_HEADER = struct.Struct("<4sIII")
+SIDECAR_ALIGNMENT = 16
+
+def get_index_dtype(num_of_vertices):
+    if num_of_vertices <= 0xFFFF:
+        return np.dtype("<u2")
+    return np.dtype("<u4")
+
+class MeshBufferSidecar:
+    # Packs the vertex and index buffers of one cluster into a single binary
+    # file. Layout:
+    #   header: magic "RMBF", uint32 version, uint32 num_of_meshes, uint32 file size
+    #   blocks: float32 xzy positions and uint16/uint32 indices, little-endian,
+    #           every block starts on a 16 byte boundary
+    # Offsets and counts live in the cluster json, so the file can be mapped
+    # with numpy.memmap without any parsing.
+
+    def __init__(self):
+        self.blocks = []
+        self.meshes = []
+        self.size = SIDECAR_HEADER.size
+
+    def add_block(self, data):
+        offset = (self.size + SIDECAR_ALIGNMENT - 1) // SIDECAR_ALIGNMENT * SIDECAR_ALIGNMENT
+        if offset != self.size:
+            self.blocks.append(bytes(offset - self.size))
+        self.blocks.append(data)
+        self.size = offset + len(data)
+        return offset
+
+    def add(self, positions, indices):
+        mesh = self.pack(positions, indices)
+        self.meshes.append(mesh)
+        return mesh
+
+    def pack(self, positions, indices):
+        # writes the buffers without listing them as a mesh of the cluster,
+        # e.g. for LODs referenced from their own section
+        positions = np.ascontiguousarray(positions, dtype="<f4").reshape(-1, 3)
+        index_dtype = get_index_dtype(len(positions))
+        indices = np.ascontiguousarray(indices, dtype=index_dtype).ravel()
+
+        mesh = {
+            "vertexOffset": self.add_block(positions.tobytes()),
+            "vertexCount": len(positions),
+            "indexOffset": self.add_block(indices.tobytes()),
+            "indexCount": len(indices),
+            "indexType": "uint16" if index_dtype.itemsize == 2 else "uint32",
+        }
+        return mesh
+
+    def write(self, path):
+        with open(path, 'wb') as f:
+            f.write(SIDECAR_HEADER.pack(SIDECAR_MAGIC, SIDECAR_VERSION, len(self.meshes), self.size))
+            for block in self.blocks:
+                f.write(block)
+
+        return {
+            "buffer": os.path.basename(path),
+            "version": SIDECAR_VERSION,
+            "meshes": self.meshes,
+        }
+
+def read_sidecar_header(path):
+    with open(path, 'rb') as f:
+        magic, version, num_of_meshes, size = SIDECAR_HEADER.unpack(f.read(SIDECAR_HEADER.size))
+    if magic != SIDECAR_MAGIC:
+        raise ValueError("{} is not a mesh buffer sidecar".format(path))
+    return version, num_of_meshes, size
+
+def map_sidecar_mesh(path, mesh):
+    index_dtype = "<u2" if mesh["indexType"] == "uint16" else "<u4"
+    if mesh["vertexCount"] == 0 or mesh["indexCount"] == 0:
+        return np.zeros((mesh["vertexCount"], 3), dtype="<f4"), np.zeros(mesh["indexCount"], dtype=index_dtype)
+    positions = np.memmap(path, dtype="<f4", mode='r', offset=mesh["vertexOffset"], shape=(mesh["vertexCount"], 3))
+    indices = np.memmap(path, dtype=index_dtype, mode='r', offset=mesh["indexOffset"], shape=(mesh["indexCount"],))
+    return positions, indices
@@ -0,0 +1,155 @@
+import os
+import tempfile
+
+import numpy as np
+
+try:
+    from . import export_manifest, mesh_optimizer
+except ImportError:
+    # loaded as a top level module by tests.py and the export workers
+    import export_manifest, mesh_optimizer
+
+# Lower detail versions of the exported meshes. Every LOD is a vertex
+# clustering of the full mesh on a grid half as fine as the one before,
+# vertices in a cell collapse to their average and triangles that lose a
+# corner disappear. LOD i is drawn once the mesh covers less than
+# screen_size / 2**(i - 1) of the screen height. Chains are cached on disk by
+# the fingerprint of the mesh they were built from.
+
+LODS_VERSION = 1
+
+# cells along the largest side of the mesh for the first LOD
+LOD_GRID_RESOLUTION = 64
+
+def decimate_vertex_clustering(positions, indices, cell_size):
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    if len(positions) == 0 or len(indices) == 0:
+        return positions, indices
+
+    cells = np.floor((positions - positions.min(axis=0)) / cell_size).astype(np.int64)
+    _, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    num_of_cells = inverse.max() + 1
+    counts = np.bincount(inverse, minlength=num_of_cells)[:, None]
+    centers = np.stack([np.bincount(inverse, positions[:, axis], num_of_cells) for axis in range(3)], axis=1) / counts
+
+    indices = mesh_optimizer.remove_degenerate_triangles(inverse[indices])
+    # triangles collapsing onto the same three cells are kept once, compared
+    # from their smallest corner so the winding stays part of the key
+    triangles = indices.reshape(-1, 3)
+    if len(triangles) == 0:
+        return centers[:0], indices
+    rows = np.arange(len(triangles))[:, None]
+    rotated = triangles[rows, (np.argmin(triangles, axis=1)[:, None] + np.arange(3)) % 3]
+    _, first = np.unique(rotated, axis=0, return_index=True)
+    indices = triangles[np.sort(first)].ravel()
+    return mesh_optimizer.compact_vertices(centers, indices)
+
+def build_lod_chain(positions, indices, num_of_lods):
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    lods = []
+    if len(positions) == 0:
+        return lods
+    extent = float(np.max(positions.max(axis=0) - positions.min(axis=0)))
+    if extent <= 0:
+        return lods
+
+    num_of_triangles = len(indices) // 3
+    for level in range(num_of_lods):
+        cell_size = extent / (LOD_GRID_RESOLUTION >> level)
+        lod_positions, lod_indices = decimate_vertex_clustering(positions, indices, cell_size)
+        if len(lod_indices) == 0:
+            # nothing left to draw, the chain ends here
+            break
+        if len(lod_indices) // 3 >= num_of_triangles:
+            # the grid is still finer than the mesh, try a coarser one
+            continue
+        lod_indices = mesh_optimizer.optimize_vertex_cache(lod_indices, len(lod_positions))
+        lod_positions, lod_indices = mesh_optimizer.compact_vertices(lod_positions, lod_indices)
+        lods.append((lod_positions, lod_indices))
+        num_of_triangles = len(lod_indices) // 3
+    return lods
+
+def get_screen_sizes(num_of_lods, screen_size):
+    return [screen_size / (1 << level) for level in range(num_of_lods)]
+
+class LodBuilder:
+
+    def __init__(self, num_of_lods, screen_size, cache_folder=None):
+        self.num_of_lods = num_of_lods
+        self.screen_size = screen_size
+        self.cache_folder = cache_folder
+        self.num_of_meshes = 0
+        self.num_of_lods_built = 0
+        self.cache_hits = 0
+        self.triangles = 0
+        self.lod_triangles = 0
+
+    def get_key(self, positions, indices):
+        fingerprint = export_manifest.Fingerprint()
+        fingerprint.add([LODS_VERSION, LOD_GRID_RESOLUTION, self.num_of_lods])
+        fingerprint.add(np.asarray(positions, dtype=np.float64))
+        fingerprint.add(np.asarray(indices, dtype=np.int64))
+        return fingerprint.hexdigest()
+
+    def load(self, key):
+        if self.cache_folder is None:
+            return None
+        path = os.path.join(self.cache_folder, key + ".npz")
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return [(data["positions{}".format(level)], data["indices{}".format(level)]) for level in range(int(data["num_of_lods"]))]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, key, lods):
+        if self.cache_folder is None:
+            return
+        os.makedirs(self.cache_folder, exist_ok=True)
+        arrays = {"num_of_lods": np.array(len(lods))}
+        for level, (positions, indices) in enumerate(lods):
+            arrays["positions{}".format(level)] = positions
+            arrays["indices{}".format(level)] = indices
+        # workers may build the same mesh at once, the last rename wins
+        f, temp_path = tempfile.mkstemp(suffix=".npz", dir=self.cache_folder)
+        with os.fdopen(f, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(temp_path, os.path.join(self.cache_folder, key + ".npz"))
+
+    def build(self, positions, indices):
+        # [(screen size, positions, indices)] from the finest LOD down
+        key = self.get_key(positions, indices)
+        lods = self.load(key)
+        if lods is None:
+            lods = build_lod_chain(positions, indices, self.num_of_lods)
+            self.save(key, lods)
+        else:
+            self.cache_hits += 1
+        self.num_of_meshes += 1
+        self.num_of_lods_built += len(lods)
+        self.triangles += len(indices) // 3
+        self.lod_triangles += sum(len(lod_indices) // 3 for _, lod_indices in lods)
+        return [(screen_size, lod_positions, lod_indices)
+                for screen_size, (lod_positions, lod_indices) in zip(get_screen_sizes(len(lods), self.screen_size), lods)]
+
+    def merge(self, other):
+        for name in ("num_of_meshes", "num_of_lods_built", "cache_hits", "triangles", "lod_triangles"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def get_summary(self):
+        return {
+            "meshes": self.num_of_meshes,
+            "lods": self.num_of_lods_built,
+            "triangles": [self.triangles, self.lod_triangles],
+            "cacheHits": self.cache_hits,
+        }
+
+    def format(self):
+        if self.num_of_meshes == 0:
+            return []
+        return ["{} meshes, {} LODs with {} triangles for {} full detail ones, {} chains from the cache".format(
+            self.num_of_meshes, self.num_of_lods_built, self.lod_triangles, self.triangles, self.cache_hits)]
@@ -0,0 +1,237 @@
+from collections import deque
+
+import numpy as np
+
+# Optional clean up of exported meshes: vertices closer than the weld
+# distance are merged, triangles that collapse are dropped, triangles are
+# reordered for the post-transform vertex cache (Tom Forsyth, "Linear-Speed
+# Vertex Cache Optimisation") and vertices are renumbered in first use order,
+# which also drops the unreferenced ones. Fewer vertices let more meshes use
+# 16 bit indices in the sidecar.
+
+WELD_DISTANCE = 0.0001
+
+# size of the LRU cache the triangle order is tuned for
+CACHE_SIZE = 32
+# size of the FIFO cache ACMR (cache misses per triangle) is measured with
+ACMR_CACHE_SIZE = 16
+
+CACHE_DECAY_POWER = 1.5
+LAST_TRIANGLE_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+# largest mesh the vertex cache order is computed for, about 5s of export
+MAX_CACHE_TRIANGLES = 250000
+
+# multipliers of the spatial hash of weld cells, int64 overflow wraps and
+# colliding cells only add candidates the distance test rejects
+CELL_HASH = np.array([73856093, 19349663, 83492791], dtype=np.int64)
+
+def find_close_pairs(positions, distance):
+    # (i, j) with j < i of the points at most distance apart, sorted. Cells
+    # are twice the distance wide, so the partners of a point are in the 8
+    # cells on the sides of the half of its cell it lies in.
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    scaled = positions / (2 * distance)
+    cells = np.floor(scaled).astype(np.int64)
+    sides = np.where(scaled - cells < 0.5, -1, 1)
+    keys = cells @ CELL_HASH
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    pairs = []
+    for corner in range(8):
+        target = (cells + sides * [(corner >> axis) & 1 for axis in range(3)]) @ CELL_HASH
+        # sorted queries keep the binary searches in cache
+        target_order = np.argsort(target)
+        starts = np.empty(len(target), dtype=np.int64)
+        counts = np.empty(len(target), dtype=np.int64)
+        starts[target_order] = np.searchsorted(sorted_keys, target[target_order], 'left')
+        counts[target_order] = np.searchsorted(sorted_keys, target[target_order], 'right')
+        counts -= starts
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        i = np.repeat(np.arange(len(positions)), counts)
+        j = order[np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)]
+        b_close = j < i
+        i, j = i[b_close], j[b_close]
+        b_close = np.sum((positions[i] - positions[j]) ** 2, axis=1) <= distance * distance
+        pairs.append(i[b_close] * len(positions) + j[b_close])
+    # colliding cell hashes can find a pair twice
+    pairs = np.unique(np.concatenate(pairs)) if len(pairs) > 0 else np.zeros(0, dtype=np.int64)
+    return np.stack([pairs // len(positions), pairs % len(positions)], axis=1)
+
+def weld_vertices(positions, indices, weld_distance=WELD_DISTANCE):
+    # A vertex within weld_distance of an earlier kept vertex becomes that
+    # vertex, the first of them in index order. Vertices are only compared
+    # to kept ones, so welds never chain further than weld_distance.
+    positions = np.asarray(positions).reshape(-1, 3)
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    if len(positions) == 0:
+        return positions, indices
+    if weld_distance <= 0:
+        _, first, inverse = np.unique(positions, axis=0, return_index=True, return_inverse=True)
+        return positions[first], inverse.ravel()[indices]
+
+    target = np.arange(len(positions))
+    # pairs are sorted by vertex, then by partner
+    for i, j in find_close_pairs(positions, weld_distance).tolist():
+        if target[i] == i and target[j] == j:
+            target[i] = j
+    b_kept = target == np.arange(len(positions))
+    remap = np.cumsum(b_kept) - 1
+    return positions[b_kept], remap[target][indices]
+
+def remove_degenerate_triangles(indices):
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    b_valid = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 0] != triangles[:, 2])
+    return triangles[b_valid].ravel()
+
+def compact_vertices(positions, indices):
+    # keeps the referenced vertices only, in the order the triangles use them
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    used, first = np.unique(indices, return_index=True)
+    order = used[np.argsort(first)]
+    remap = np.zeros(len(positions), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return np.asarray(positions)[order], remap[indices]
+
+def count_cache_misses(indices, cache_size=ACMR_CACHE_SIZE):
+    cache = deque()
+    cached = set()
+    misses = 0
+    for vertex in np.asarray(indices).ravel().tolist():
+        if vertex in cached:
+            continue
+        misses += 1
+        cache.append(vertex)
+        cached.add(vertex)
+        if len(cache) > cache_size:
+            cached.discard(cache.popleft())
+    return misses
+
+def optimize_vertex_cache(indices, num_of_vertices, cache_size=CACHE_SIZE, max_triangles=MAX_CACHE_TRIANGLES):
+    # The greedy pass scores triangles one at a time in Python, about 20us a
+    # triangle. Meshes above max_triangles keep their triangle order.
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    num_of_triangles = len(indices) // 3
+    if num_of_triangles <= 1 or num_of_triangles > max_triangles:
+        return indices.copy()
+
+    # triangles of every vertex, flattened
+    counts = np.bincount(indices, minlength=num_of_vertices)
+    starts = np.concatenate(([0], np.cumsum(counts))).tolist()
+    vertex_triangles = (np.argsort(indices, kind='stable') // 3).tolist()
+    remaining = counts.tolist()
+
+    cache_scores = [LAST_TRIANGLE_SCORE] * 3 + [(1.0 - (position - 3) / (cache_size - 3)) ** CACHE_DECAY_POWER
+                                                for position in range(3, cache_size)]
+    valence_scores = [0.0] + [VALENCE_BOOST_SCALE * count ** -VALENCE_BOOST_POWER for count in range(1, int(counts.max()) + 1)]
+
+    flat = indices.tolist()
+    vertex_scores = [valence_scores[count] for count in remaining]
+    triangle_scores = [vertex_scores[flat[id]] + vertex_scores[flat[id + 1]] + vertex_scores[flat[id + 2]]
+                       for id in range(0, len(flat), 3)]
+    b_emitted = [False] * num_of_triangles
+
+    cache = []
+    out = []
+    best = max(range(num_of_triangles), key=triangle_scores.__getitem__)
+    next_unemitted = 0
+    for _ in range(num_of_triangles):
+        if best < 0:
+            # nothing in the cache has triangles left, continue in input order
+            while b_emitted[next_unemitted]:
+                next_unemitted += 1
+            best = next_unemitted
+
+        b_emitted[best] = True
+        triangle = flat[best * 3:best * 3 + 3]
+        out.extend(triangle)
+        for vertex in triangle:
+            remaining[vertex] -= 1
+
+        touched = triangle + [vertex for vertex in cache if vertex not in triangle]
+        cache = touched[:cache_size]
+
+        candidates = []
+        for position, vertex in enumerate(touched):
+            if remaining[vertex] == 0:
+                continue
+            score = valence_scores[remaining[vertex]]
+            if position < cache_size:
+                score += cache_scores[position]
+            delta = score - vertex_scores[vertex]
+            vertex_scores[vertex] = score
+            for triangle_id in vertex_triangles[starts[vertex]:starts[vertex + 1]]:
+                if not b_emitted[triangle_id]:
+                    triangle_scores[triangle_id] += delta
+                    candidates.append(triangle_id)
+
+        best = max(candidates, key=triangle_scores.__getitem__) if candidates else -1
+
+    return np.array(out, dtype=np.int64)
+
+class MeshOptimizer:
+
+    def __init__(self, weld_distance=WELD_DISTANCE, cache_size=CACHE_SIZE):
+        self.weld_distance = weld_distance
+        self.cache_size = cache_size
+        self.num_of_meshes = 0
+        self.num_of_16bit_meshes = 0
+        self.vertices_before = 0
+        self.vertices_after = 0
+        self.triangles_before = 0
+        self.triangles_after = 0
+        self.misses_before = 0
+        self.misses_after = 0
+
+    def optimize(self, positions, indices):
+        positions = np.asarray(positions).reshape(-1, 3)
+        indices = np.asarray(indices, dtype=np.int64).ravel()
+        self.num_of_meshes += 1
+        self.vertices_before += len(positions)
+        self.triangles_before += len(indices) // 3
+        self.misses_before += count_cache_misses(indices)
+
+        positions, indices = weld_vertices(positions, indices, self.weld_distance)
+        indices = remove_degenerate_triangles(indices)
+        indices = optimize_vertex_cache(indices, len(positions), self.cache_size)
+        positions, indices = compact_vertices(positions, indices)
+
+        self.vertices_after += len(positions)
+        self.triangles_after += len(indices) // 3
+        self.misses_after += count_cache_misses(indices)
+        if len(positions) <= 0xFFFF:
+            self.num_of_16bit_meshes += 1
+        return positions, indices
+
+    def merge(self, other):
+        for name in ("num_of_meshes", "num_of_16bit_meshes", "vertices_before", "vertices_after",
+                     "triangles_before", "triangles_after", "misses_before", "misses_after"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    @property
+    def acmr_before(self):
+        return self.misses_before / max(1, self.triangles_before)
+
+    @property
+    def acmr_after(self):
+        return self.misses_after / max(1, self.triangles_after)
+
+    def get_summary(self):
+        return {
+            "meshes": self.num_of_meshes,
+            "meshes16bit": self.num_of_16bit_meshes,
+            "vertices": [self.vertices_before, self.vertices_after],
+            "triangles": [self.triangles_before, self.triangles_after],
+            "acmr": [self.acmr_before, self.acmr_after],
+        }
+
+    def format(self):
+        if self.num_of_meshes == 0:
+            return []
+        return ["{} meshes, {} with 16 bit indices, vertices {} -> {}, triangles {} -> {}, ACMR {:.3f} -> {:.3f}".format(
+            self.num_of_meshes, self.num_of_16bit_meshes, self.vertices_before, self.vertices_after,
+            self.triangles_before, self.triangles_after, self.acmr_before, self.acmr_after)]
@@ -0,0 +1,152 @@
+import logging
+from collections import namedtuple
+
+# Input schemas of the utils.blend node groups the exporter reads. Every
+# field is looked up by socket name first and falls back to the identifier
+# the node group shipped with, so files made before a socket rename keep
+# exporting. Identifiers are resolved once per node group, after that
+# reading a modifier is a handful of dictionary lookups. An input missing
+# from both ways exports its schema default with a warning.
+
+logger = logging.getLogger(__name__)
+
+FILTER_BITS = 30
+
+def field(name, socket_name, identifier, default=None):
+    return (name, socket_name, identifier, default)
+
+COLLISION_FIELDS = [
+    field("density", "Density", "Input_2", 0.0),
+    field("restitution", "Restitution", "Input_3", 0.0),
+    field("friction", "Friction", "Input_4", 0.0),
+    field("is_sensor", "Is sensor", "Input_5", 0),
+] + [field("filter_{}".format(bit), "Filter {}".format(bit), "Input_{}".format(bit + 5), 0) for bit in range(1, FILTER_BITS + 1)]
+
+JOINT_COMMON_FIELDS = [
+    field("target1", "Target 1", "Input_2"),
+    field("target2", "Target 2", "Input_3"),
+    field("collide_connected", "Collide connected", "Input_8", False),
+    field("friquency_hz", "Frequency HZ", "Input_9", 0.0),
+    field("damping_ratio", "Damping ratio", "Input_10", 0.0),
+]
+
+JOINT_OFFSET_FIELDS = [
+    field("target1_offset_x", "Target 1 offset X", "Input_4", 0.0),
+    field("target1_offset_y", "Target 1 offset Y", "Input_6", 0.0),
+    field("target2_offset_x", "Target 2 offset X", "Input_5", 0.0),
+    field("target2_offset_y", "Target 2 offset Y", "Input_7", 0.0),
+]
+
+SCHEMAS = {
+    "CollisionCircle": COLLISION_FIELDS,
+    "CollisionPolygon": COLLISION_FIELDS,
+    "Beam": [
+        field("max_length", "Max length", "Input_2", 0.0),
+        field("width", "Width", "Input_3", 0.0),
+        field("enabled", "Enabled", "Input_4", True),
+    ],
+    "JointWeld": JOINT_COMMON_FIELDS,
+    "JointDistance": JOINT_COMMON_FIELDS + JOINT_OFFSET_FIELDS,
+    "JointWheel": JOINT_COMMON_FIELDS + JOINT_OFFSET_FIELDS + [
+        field("local_axis_x", "Local axis X", "Input_12", 0.0),
+        field("local_axis_y", "Local axis Y", "Input_13", 0.0),
+        field("max_motor_torque", "Max motor torque", "Input_14", 0.0),
+        field("motor_speed", "Motor speed", "Input_15", 0.0),
+    ],
+    "Color": [
+        field("color", "Color", None, (0.55, 0.55, 0.6)),
+    ],
+    # Metrics only tags polygons for now, none of its inputs are exported
+    "Metrics": [],
+}
+
+CollisionRecord = namedtuple("CollisionRecord", ["density", "restitution", "friction", "is_sensor", "filter_data"])
+BeamRecord = namedtuple("BeamRecord", ["max_length", "width", "enabled"])
+JointWeldRecord = namedtuple("JointWeldRecord", [name for name, _, _, _ in SCHEMAS["JointWeld"]])
+JointDistanceRecord = namedtuple("JointDistanceRecord", [name for name, _, _, _ in SCHEMAS["JointDistance"]])
+JointWheelRecord = namedtuple("JointWheelRecord", [name for name, _, _, _ in SCHEMAS["JointWheel"]])
+ColorRecord = namedtuple("ColorRecord", ["color"])
+MetricsRecord = namedtuple("MetricsRecord", [])
+
+def make_collision_record(values):
+    filter_data = int(values[3])
+    for bit in range(1, FILTER_BITS + 1):
+        filter_data |= int(values[3 + bit]) << bit
+    return CollisionRecord(values[0], values[1], values[2], values[3], filter_data)
+
+def make_color_record(values):
+    color = values[0]
+    return ColorRecord([color[0], color[1], color[2]])
+
+RECORD_FACTORIES = {
+    "CollisionCircle": make_collision_record,
+    "CollisionPolygon": make_collision_record,
+    "Beam": lambda values: BeamRecord(*values),
+    "JointWeld": lambda values: JointWeldRecord(*values),
+    "JointDistance": lambda values: JointDistanceRecord(*values),
+    "JointWheel": lambda values: JointWheelRecord(*values),
+    "Color": make_color_record,
+    "Metrics": lambda values: MetricsRecord(),
+}
+
+COLLISION_NODE_GROUPS = ("CollisionCircle", "CollisionPolygon")
+
+def get_group_inputs(node_group):
+    interface = getattr(node_group, "interface", None)
+    if interface is not None:
+        # Blender 4.0+ keeps sockets in the group interface tree
+        return [item for item in interface.items_tree
+                if getattr(item, "item_type", None) == 'SOCKET' and item.in_out == 'INPUT']
+    return list(node_group.inputs)
+
+def is_geometry_input(input):
+    socket_type = getattr(input, "socket_type", None) or getattr(input, "type", None)
+    return socket_type in ('GEOMETRY', 'NodeSocketGeometry')
+
+def get_value_identifiers(node_group):
+    return [input.identifier for input in get_group_inputs(node_group) if not is_geometry_input(input)]
+
+class NodeInputRegistry:
+
+    def __init__(self):
+        self.resolved = dict()
+
+    def resolve(self, node_group):
+        key = getattr(node_group, "name_full", node_group.name)
+        identifiers = self.resolved.get(key)
+        if identifiers is not None:
+            return identifiers
+
+        schema = SCHEMAS[node_group.name]
+        inputs = get_group_inputs(node_group)
+        by_name = dict()
+        for input in inputs:
+            by_name.setdefault(input.name, input.identifier)
+        known_identifiers = set(input.identifier for input in inputs)
+
+        identifiers = []
+        for _, socket_name, identifier, _ in schema:
+            resolved = by_name.get(socket_name) if socket_name is not None else None
+            if resolved is None and identifier in known_identifiers:
+                resolved = identifier
+            identifiers.append(resolved)
+
+        self.resolved[key] = identifiers
+        return identifiers
+
+    def extract(self, modifier):
+        # Typed record for a NODES modifier, None for node groups without a schema
+        node_group = modifier.node_group
+        if node_group is None or node_group.name not in SCHEMAS:
+            return None
+
+        schema = SCHEMAS[node_group.name]
+        values = []
+        for identifier, (_, socket_name, schema_identifier, default) in zip(self.resolve(node_group), schema):
+            if identifier is None:
+                logger.warning("Modifier %s: %s has no input %s, exported as %s", modifier.name, node_group.name,
+                    socket_name or schema_identifier, default)
+                values.append(default)
+                continue
+            values.append(modifier[identifier])
+        return RECORD_FACTORIES[node_group.name](values)
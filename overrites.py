@@ -1,23 +1,26 @@
 import bpy
 import bmesh
+import logging
 from bpy_extras.object_utils import AddObjectHelper
 
-from . import utils
+from . import utils, node_inputs
+
+logger = logging.getLogger(__name__)
 
 def get_possible_overrite_list(object):
     if not object.is_instancer:
-        print("Object {} is not an instancer".format(object))
+        logger.debug("Object %s is not an instancer", object)
         return
     
     linked_collection = object.instance_collection
     library = linked_collection.library
     if library is None:
-        print("Object {} has no library".format(object))
+        logger.debug("Object %s has no library", object)
         return
     
     cluster_root = utils.get_cluster_collection(object.instance_collection)
     if cluster_root is None:
-        print("Object {} is not a cluster".format(object))
+        logger.debug("Object %s is not a cluster", object)
         return
 
     modifiers_src_object_names = []
@@ -25,14 +28,14 @@ def get_possible_overrite_list(object):
     
     collisions_collection = utils.find_collection(cluster_root, "Collision")
     if collisions_collection is not None:
-        print ("cc obj", collisions_collection.objects)
+        logger.debug("cc obj %s", collisions_collection.objects)
         for src in collisions_collection.objects:
             
-            print("obj {} modifiers {}".format(src, src.modifiers))
+            logger.debug("obj %s modifiers %s", src, src.modifiers)
             for mod_src in src.modifiers:
                 if mod_src.type != 'NODES':
                     continue
-                if mod_src.node_group.name == "CollisionCircle" or mod_src.node_group.name == "CollisionPolygon":                
+                if mod_src.node_group.name in node_inputs.COLLISION_NODE_GROUPS:
                     modifiers_src_object_names.append(src.name)
                     modifiers_src_modifers_names.append(mod_src.name)
            
@@ -78,7 +81,7 @@ class RISING_OT_CreateOverride(bpy.types.Operator, AddObjectHelper):
         new_override = object_utils.object_data_add(context, mesh, operator=self)
         
         overrites_collection = utils.find_collection(root, "Overrites")
-        print("overrites_collection", overrites_collection)
+        logger.debug("overrites_collection %s", overrites_collection)
         if overrites_collection is None:
             overrites_collection = bpy.data.collections.new("Overrites")
             root.children.link(overrites_collection)
@@ -103,7 +106,7 @@ class RISING_OT_CreateOverride(bpy.types.Operator, AddObjectHelper):
         mod_target = overrides_object.get(mod_src.name, None)
         if mod_target is None:
             mod_target = overrides_object.modifiers.new(mod_src.name, mod_src.type)
-        print("ch", mod_src, mod_target)
+        logger.debug("ch %s %s", mod_src, mod_target)
             
         properties = [p.identifier for p in mod_src.bl_rna.properties
                     if not p.is_readonly]
@@ -111,14 +114,14 @@ class RISING_OT_CreateOverride(bpy.types.Operator, AddObjectHelper):
         for prop in properties:
             setattr(mod_target, prop, getattr(mod_src, prop))
             
-        for param in mod_src.node_group.inputs:
-            input_name = param.identifier
-            if input_name == "Input_0" or input_name == "Input_1":
+        for input_name in node_inputs.get_value_identifiers(mod_src.node_group):
+            value = mod_src.get(input_name)
+            if value is None:
                 continue
-            mod_target[input_name] = mod_src[input_name]
+            mod_target[input_name] = value
         mod_target.name = self.source_element_name
             
-        print("creating overrite of {} from element {} for object {}".format(self.modifier_name, self.source_element_name, self.target_object_name))
+        logger.info("creating overrite of %s from element %s for object %s", self.modifier_name, self.source_element_name, self.target_object_name)
         #self.report({"INFO"}, "Scene export complete")
         return {'FINISHED'}
 
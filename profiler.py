@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Opt-in timing of the export stages. Every stage becomes a complete event
+# of the Chrome trace-event format, so a run can be opened in chrome://tracing
+# or Perfetto. Stages nest: the cluster is parsed while dump streams it, so
+# the parse_* stages show up inside the dump stage of their cluster.
+
+class ProfileEvent:
+    def __init__(self, name, cluster, start, duration, thread_id, peak_memory=None, args=None):
+        self.name = name
+        self.cluster = cluster
+        self.start = start
+        self.duration = duration
+        self.thread_id = thread_id
+        self.peak_memory = peak_memory
+        self.args = args or dict()
+
+class ExportProfiler:
+
+    def __init__(self, enabled=True, track_memory=True):
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self.origin = time.perf_counter()
+        self.events = []
+        self.thread_names = dict()
+        self.stack = []
+        self.lock = threading.Lock()
+        self.owns_tracemalloc = False
+
+    def start(self):
+        if self.enabled and self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.owns_tracemalloc = True
+        self.thread_names.setdefault(threading.get_ident(), "export")
+
+    def stop(self):
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+            self.owns_tracemalloc = False
+
+    def is_tracing_memory(self):
+        return self.track_memory and tracemalloc.is_tracing()
+
+    @contextmanager
+    def stage(self, name, cluster=None):
+        if not self.enabled:
+            yield
+            return
+
+        b_memory = self.is_tracing_memory()
+        frame = [0]
+        if b_memory:
+            # the peak is reset for every stage, fold it into the running
+            # stages first so they keep their own
+            current, peak = tracemalloc.get_traced_memory()
+            for parent in self.stack:
+                parent[0] = max(parent[0], peak)
+            tracemalloc.reset_peak()
+            frame[0] = current
+        self.stack.append(frame)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.stack.pop()
+            peak_memory = None
+            if b_memory:
+                frame[0] = max(frame[0], tracemalloc.get_traced_memory()[1])
+                for parent in self.stack:
+                    parent[0] = max(parent[0], frame[0])
+                peak_memory = frame[0]
+            self.add_event(name, cluster, start, duration, threading.get_ident(), peak_memory)
+
+    def add_event(self, name, cluster, start, duration, thread_id=None, peak_memory=None, args=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append(ProfileEvent(name, cluster, start, duration, thread_id, peak_memory, args))
+
+    def add_events(self, events, thread_name):
+        # stages timed in a worker process, perf_counter is shared by the
+        # processes of a machine so they line up with the local ones
+        for event in events:
+            self.thread_names.setdefault(event.thread_id, thread_name)
+            self.add_event(event.name, event.cluster, event.start, event.duration, event.thread_id, event.peak_memory, event.args)
+
+    def add_compile_results(self, results):
+        # compiler processes run on the scheduler threads, one track per worker
+        for result in results:
+            if result.start is None:
+                continue
+            self.thread_names.setdefault(result.thread_id, "compiler {}".format(len(self.thread_names)))
+            self.add_event("compile", result.name, result.start, result.duration, result.thread_id,
+                           args={"returncode": result.returncode})
+
+    def get_trace(self):
+        pid = os.getpid()
+        trace_events = []
+        for thread_id, thread_name in self.thread_names.items():
+            trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": thread_name}})
+
+        for event in sorted(self.events, key=lambda event: event.start):
+            args = dict(event.args)
+            if event.cluster is not None:
+                args["cluster"] = event.cluster
+            if event.peak_memory is not None:
+                args["peakMemory"] = event.peak_memory
+            trace_events.append({
+                "name": event.name,
+                "cat": "export",
+                "ph": "X",
+                "ts": (event.start - self.origin) * 1e6,
+                "dur": event.duration * 1e6,
+                "pid": pid,
+                "tid": event.thread_id,
+                "args": args,
+            })
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_trace(), f)
+
+    def get_totals(self):
+        # name -> [count, seconds, peak memory]
+        totals = dict()
+        for event in self.events:
+            total = totals.setdefault(event.name, [0, 0.0, None])
+            total[0] += 1
+            total[1] += event.duration
+            if event.peak_memory is not None:
+                total[2] = max(total[2] or 0, event.peak_memory)
+        return totals
+
+    def format(self):
+        lines = []
+        for name, (count, seconds, peak_memory) in sorted(self.get_totals().items(), key=lambda item: -item[1][1]):
+            line = "  {} x{} {:.3f}s".format(name, count, seconds)
+            if peak_memory is not None:
+                line += " peak {:.1f} MiB".format(peak_memory / (1024 * 1024))
+            lines.append(line)
+        return lines
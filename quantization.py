@@ -0,0 +1,103 @@
+import numpy as np
+
+# Precision control for exported floats. A Quantizer belongs to one value
+# category (positions, rotations, physics, action samples), rounds whole
+# arrays at once and remembers the largest error it introduced.
+
+MODE_NONE = 'NONE'
+MODE_DECIMAL = 'DECIMAL'
+MODE_FIXED = 'FIXED'
+
+class Quantizer:
+
+    def __init__(self, name, mode=MODE_NONE, precision=0):
+        # precision is the number of decimal digits in decimal mode and the
+        # number of fractional bits in fixed point mode
+        self.name = name
+        self.mode = mode
+        self.precision = precision
+        self.max_error = 0.0
+        self.num_of_values = 0
+
+    @property
+    def enabled(self):
+        return self.mode != MODE_NONE
+
+    def quantize(self, values):
+        if not self.enabled:
+            return values
+        source = np.asarray(values, dtype=np.float64)
+        if self.mode == MODE_FIXED:
+            scale = float(1 << self.precision)
+            result = np.round(source * scale) / scale
+        else:
+            result = np.round(source, self.precision)
+
+        if source.size > 0:
+            finite = np.isfinite(source)
+            if np.any(finite):
+                self.max_error = max(self.max_error, float(np.max(np.abs(result[finite] - source[finite]))))
+            self.num_of_values += source.size
+        return result
+
+    def quantize_bounds(self, mins, maxs):
+        # boxes are rounded outwards so they still contain what they bound
+        if not self.enabled:
+            return mins, maxs
+        mins = np.asarray(mins, dtype=np.float64)
+        maxs = np.asarray(maxs, dtype=np.float64)
+        scale = float(1 << self.precision) if self.mode == MODE_FIXED else 10.0 ** self.precision
+        # values already on the grid stay there despite the float error of
+        # the scaling
+        q_mins = np.floor(np.round(mins * scale, 6)) / scale
+        q_maxs = np.ceil(np.round(maxs * scale, 6)) / scale
+        if mins.size > 0:
+            self.max_error = max(self.max_error, float(np.max(np.abs(mins - q_mins))), float(np.max(np.abs(q_maxs - maxs))))
+            self.num_of_values += mins.size + maxs.size
+        return q_mins, q_maxs
+
+    def quantize_records(self, records, fields):
+        # Rounds the given fields of a list of json records in one pass per
+        # field, scalars and (possibly ragged) lists alike.
+        if not self.enabled or len(records) == 0:
+            return records
+        for field in fields:
+            if field not in records[0]:
+                continue
+            columns = [np.asarray(record[field], dtype=np.float64) for record in records]
+            flat = self.quantize(np.concatenate([column.ravel() for column in columns]))
+            offset = 0
+            for record, column in zip(records, columns):
+                record[field] = flat[offset:offset + column.size].reshape(column.shape).tolist()
+                offset += column.size
+        return records
+
+    def merge(self, other):
+        # errors and counts of the same category quantized in another process
+        self.max_error = max(self.max_error, other.max_error)
+        self.num_of_values += other.num_of_values
+
+class QuantizationReport:
+
+    def __init__(self, mode, position_precision, rotation_precision, physics_precision, action_precision):
+        self.positions = Quantizer("positions", mode, position_precision)
+        self.rotations = Quantizer("rotations", mode, rotation_precision)
+        self.physics = Quantizer("physics", mode, physics_precision)
+        self.actions = Quantizer("actions", mode, action_precision)
+
+    @property
+    def quantizers(self):
+        return [self.positions, self.rotations, self.physics, self.actions]
+
+    def merge(self, other):
+        for quantizer, other_quantizer in zip(self.quantizers, other.quantizers):
+            quantizer.merge(other_quantizer)
+
+    def format(self):
+        lines = []
+        for quantizer in self.quantizers:
+            if not quantizer.enabled:
+                continue
+            lines.append("{} ({} {}): {} values, max error {:.3g}".format(
+                quantizer.name, quantizer.mode.lower(), quantizer.precision, quantizer.num_of_values, quantizer.max_error))
+        return lines
@@ -0,0 +1,267 @@
+import numpy as np
+
+try:
+    from . import action_sampling, bounding_volumes
+except ImportError:
+    # loaded as a top level module by tests.py and the export workers
+    import action_sampling, bounding_volumes
+
+# Plain data version of everything the cluster parsers read from a scene.
+# blender_scene.py wraps bpy data with the same attributes, this module holds
+# it in memory, so cluster_parser runs without Blender, in tests and in
+# worker processes. Everything here pickles.
+#
+# Attributes the parsers rely on:
+#   Collection  name, name_full, library (.filepath or None), children, objects, all_objects, id_data,
+#               bounds (Blender space (min, max) of its meshes or None)
+#   Object      name, name_full, type, location, rotation_euler, rotation_axis_angle, scale,
+#               dimensions, matrix_world (4x4), modifiers, constraints, children,
+#               is_instancer, instance_collection, data, animation_actions, get_evaluated()
+#   Mesh        co (n, 3), loop_vertex_index, triangles, animation_actions
+#   Curve       splines, action, animation_actions
+#   Spline      co, handle_left, handle_right (n, 3), use_cyclic_u
+#   Modifier    name, type, node_group, [identifier], keys()
+#   NodeGroup   name, name_full, inputs (name, identifier, type)
+#   Constraint  type, target
+#   Action      name, name_full, fcurves
+#   FCurve      data_path, array_index, num_of_keyframes, num_of_modifiers, range(),
+#               evaluate(frame), get_keyframes()
+
+def make_matrix(location=(0, 0, 0), rotation_euler=(0, 0, 0), scale=(1, 1, 1)):
+    # XYZ euler, the rotation order Blender defaults to
+    x, y, z = rotation_euler
+    rx = np.array([[1, 0, 0], [0, np.cos(x), -np.sin(x)], [0, np.sin(x), np.cos(x)]])
+    ry = np.array([[np.cos(y), 0, np.sin(y)], [0, 1, 0], [-np.sin(y), 0, np.cos(y)]])
+    rz = np.array([[np.cos(z), -np.sin(z), 0], [np.sin(z), np.cos(z), 0], [0, 0, 1]])
+    matrix = np.identity(4)
+    matrix[:3, :3] = rz @ ry @ rx @ np.diag(scale)
+    matrix[:3, 3] = location
+    return matrix
+
+class Library:
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+class Collection:
+    def __init__(self, name, children=None, objects=None, library=None, name_full=None, bounds=None):
+        self.name = name
+        self.library = library
+        self.children = children if children is not None else []
+        self.objects = objects if objects is not None else []
+        self.given_name_full = name_full
+        # instanced collections are copied without objects, with their bounds
+        self.given_bounds = bounds
+
+    @property
+    def name_full(self):
+        if self.given_name_full is not None:
+            return self.given_name_full
+        if self.library is None:
+            return self.name
+        return "{} [{}]".format(self.name, self.library.filepath.replace("\\", "/").split("/")[-1])
+
+    @property
+    def id_data(self):
+        return self
+
+    @property
+    def bounds(self):
+        if self.given_bounds is None:
+            self.given_bounds = bounding_volumes.get_collection_bounds(self)
+        return self.given_bounds
+
+    @property
+    def all_objects(self):
+        objects = dict()
+        pending = [self]
+        while pending:
+            collection = pending.pop()
+            for object in collection.objects:
+                objects.setdefault(id(object), object)
+            pending.extend(collection.children)
+        return list(objects.values())
+
+class Object:
+    # Transforms are kept as given, matrix_world and dimensions are derived on
+    # first access, so generating large scenes stays cheap.
+
+    def __init__(self, name, data=None, location=(0, 0, 0), rotation_euler=(0, 0, 0), scale=(1, 1, 1),
+                 rotation_axis_angle=(0, 0, 1, 0), dimensions=None, matrix_world=None, modifiers=None,
+                 constraints=None, children=None, instance_collection=None, animation_actions=None, type=None):
+        self.name = name
+        self.data = data
+        self.location = location
+        self.rotation_euler = rotation_euler
+        self.rotation_axis_angle = rotation_axis_angle
+        self.scale = scale
+        self.given_matrix_world = matrix_world
+        self.given_dimensions = dimensions
+        self.modifiers = modifiers if modifiers is not None else []
+        self.constraints = constraints if constraints is not None else []
+        self.children = children if children is not None else []
+        self.instance_collection = instance_collection
+        self.animation_actions = animation_actions if animation_actions is not None else []
+        if type is None:
+            type = 'MESH' if isinstance(data, Mesh) else 'CURVE' if isinstance(data, Curve) else 'EMPTY'
+        self.type = type
+
+    @property
+    def name_full(self):
+        return self.name
+
+    @property
+    def matrix_world(self):
+        if self.given_matrix_world is None:
+            self.given_matrix_world = make_matrix(self.location, self.rotation_euler, self.scale)
+        return np.asarray(self.given_matrix_world)
+
+    @property
+    def dimensions(self):
+        if self.given_dimensions is None:
+            self.given_dimensions = np.zeros(3)
+            if isinstance(self.data, Mesh) and len(self.data.co) > 0:
+                co = self.data.co
+                self.given_dimensions = (co.max(axis=0) - co.min(axis=0)) * np.abs(np.asarray(self.scale, dtype=np.float64))
+        return np.asarray(self.given_dimensions, dtype=np.float64)
+
+    @property
+    def is_instancer(self):
+        return self.instance_collection is not None
+
+    def get_evaluated(self):
+        # modifiers are not applied in memory, the object is its own evaluation
+        return self
+
+class Mesh:
+    def __init__(self, co, loop_vertex_index=None, triangles=None, animation_actions=None):
+        self.co = np.asarray(co, dtype=np.float32).reshape(-1, 3)
+        if loop_vertex_index is None:
+            loop_vertex_index = np.unique(np.asarray(triangles, dtype=np.int32)) if triangles is not None else np.arange(len(self.co))
+        self.loop_vertex_index = np.asarray(loop_vertex_index, dtype=np.int32)
+        self.triangles = np.asarray(triangles if triangles is not None else [], dtype=np.int32).ravel()
+        self.animation_actions = animation_actions if animation_actions is not None else []
+
+class Spline:
+    def __init__(self, co, handle_left=None, handle_right=None, use_cyclic_u=False):
+        self.co = np.asarray(co, dtype=np.float32).reshape(-1, 3)
+        self.handle_left = self.co if handle_left is None else np.asarray(handle_left, dtype=np.float32).reshape(-1, 3)
+        self.handle_right = self.co if handle_right is None else np.asarray(handle_right, dtype=np.float32).reshape(-1, 3)
+        self.use_cyclic_u = use_cyclic_u
+
+class Curve:
+    def __init__(self, splines, action=None):
+        self.splines = splines
+        self.action = action
+
+    @property
+    def animation_actions(self):
+        return [self.action] if self.action is not None else []
+
+class NodeSocket:
+    def __init__(self, name, identifier, type='VALUE', default_value=None):
+        self.name = name
+        self.identifier = identifier
+        self.type = type
+        self.default_value = default_value
+
+class NodeGroup:
+    def __init__(self, name, inputs, name_full=None):
+        self.name = name
+        self.inputs = inputs
+        self.name_full = name_full or name
+
+def make_node_group(name, schema):
+    # node group with the schema's sockets, named and numbered like utils.blend
+    inputs = [NodeSocket("Geometry", "Input_0", 'GEOMETRY')]
+    for id, (_, socket_name, identifier, default) in enumerate(schema):
+        inputs.append(NodeSocket(socket_name, identifier or "Input_{}".format(100 + id), default_value=default))
+    return NodeGroup(name, inputs)
+
+def make_node_modifier(name, node_group, values=None):
+    # every input starts at its default like on a fresh modifier, values are
+    # given by socket name
+    modifier = Modifier(name, node_group)
+    identifiers = dict()
+    for input in node_group.inputs:
+        if input.type == 'GEOMETRY':
+            continue
+        modifier.values[input.identifier] = input.default_value
+        identifiers[input.name] = input.identifier
+    for socket_name, value in (values or dict()).items():
+        modifier.values[identifiers[socket_name]] = value
+    return modifier
+
+class Modifier:
+    def __init__(self, name, node_group=None, values=None, type='NODES'):
+        self.name = name
+        self.type = type
+        self.node_group = node_group
+        self.values = values if values is not None else dict()
+
+    def __getitem__(self, identifier):
+        return self.values[identifier]
+
+    def keys(self):
+        return self.values.keys()
+
+class Constraint:
+    def __init__(self, type, target=None):
+        self.type = type
+        self.target = target
+
+class FCurve:
+    def __init__(self, data_path, array_index, co, handle_left=None, handle_right=None, interpolation=None, num_of_modifiers=0,
+                 baked=None):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.co = np.asarray(co, dtype=np.float32).ravel()
+        self.handle_left = self.co if handle_left is None else np.asarray(handle_left, dtype=np.float32).ravel()
+        self.handle_right = self.co if handle_right is None else np.asarray(handle_right, dtype=np.float32).ravel()
+        if interpolation is None:
+            interpolation = np.full(len(self.co) // 2, action_sampling.IPO_LINEAR)
+        self.interpolation = np.asarray(interpolation, dtype=np.int32)
+        self.num_of_modifiers = num_of_modifiers
+        # frame -> value Blender evaluated, for curves sample_keyframes can't
+        # reproduce (modifiers, elastic and other easings)
+        self.baked = baked
+
+    @property
+    def num_of_keyframes(self):
+        return len(self.interpolation)
+
+    def get_keyframes(self):
+        return self.co, self.handle_left, self.handle_right, self.interpolation
+
+    def range(self):
+        return float(self.co[0]), float(self.co[-2])
+
+    def evaluate(self, frame):
+        if self.baked is not None:
+            return self.baked[float(frame)]
+        return float(action_sampling.sample_keyframes(self.co, self.handle_left, self.handle_right, self.interpolation, [frame])[0])
+
+class Action:
+    def __init__(self, name, fcurves=None, name_full=None):
+        self.name = name
+        self.fcurves = fcurves if fcurves is not None else []
+        self.name_full = name_full or name
+
+QUAD = ((-1, 0, -1), (1, 0, -1), (-1, 0, 1), (1, 0, 1))
+
+def generate_cluster(name, num_of_objects, seed=0, cluster_type="Static"):
+    # num_of_objects polygons on a square grid, all sharing one quad mesh and
+    # one Color modifier, for tests and benchmarks of large clusters
+    rng = np.random.default_rng(seed)
+    mesh = Mesh(QUAD, triangles=((0, 1, 3), (0, 3, 2)))
+    color = make_node_modifier("Color", NodeGroup("Color", [NodeSocket("Color", "Input_2")]), {"Color": (0.2, 0.4, 0.6, 1.0)})
+    side = max(1, int(np.ceil(np.sqrt(num_of_objects))))
+    offsets = rng.uniform(-0.25, 0.25, (num_of_objects, 2)).tolist()
+    polygons = [Object("Polygon.{}".format(id), mesh, (id % side * 2 + dx, 0.0, id // side * 2 + dz), modifiers=[color])
+                for id, (dx, dz) in enumerate(offsets)]
+    cluster = Collection(cluster_type, [Collection("Polygons", objects=polygons)])
+    return Collection(name, [cluster])
+
+class Scene:
+    def __init__(self, collections=None, actions=None):
+        self.collections = collections if collections is not None else []
+        self.actions = actions if actions is not None else []
@@ -0,0 +1,62 @@
+import numpy as np
+
+# Optional ordering of exported shapes and refs along a space filling curve
+# of their 2d position, so neighbours on the map are neighbours in memory
+# after the engine loads a cluster. Records keep their object name when they
+# are reordered, lookups go by name instead of position.
+
+ORDER_NONE = 'NONE'
+ORDER_MORTON = 'MORTON'
+ORDER_HILBERT = 'HILBERT'
+
+# grid cells along each axis are 1 << ORDER_BITS
+ORDER_BITS = 16
+
+def get_grid_coords(points, bits=ORDER_BITS):
+    # the same scale on both axes keeps the curve square
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    origin = points.min(axis=0)
+    extent = float(np.max(points.max(axis=0) - origin))
+    if extent <= 0:
+        return np.zeros((len(points), 2), dtype=np.int64)
+    return np.floor((points - origin) * (((1 << bits) - 1) / extent)).astype(np.int64)
+
+def spread_bits(values):
+    values = values & 0xFFFF
+    values = (values | (values << 8)) & 0x00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F
+    values = (values | (values << 2)) & 0x33333333
+    return (values | (values << 1)) & 0x55555555
+
+def morton_keys(coords):
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+    return spread_bits(coords[:, 0]) | (spread_bits(coords[:, 1]) << 1)
+
+def hilbert_keys(coords, bits=ORDER_BITS):
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+    x = coords[:, 0].copy()
+    y = coords[:, 1].copy()
+    last = (1 << bits) - 1
+    keys = np.zeros(len(coords), dtype=np.int64)
+    s = 1 << (bits - 1)
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so the curve continues from its exit
+        b_flip = ~ry & rx
+        x[b_flip] = last - x[b_flip]
+        y[b_flip] = last - y[b_flip]
+        b_swap = ~ry
+        x[b_swap], y[b_swap] = y[b_swap], x[b_swap]
+        s >>= 1
+    return keys
+
+def get_order(points, curve):
+    # stable, records on the same cell keep their export order
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if curve == ORDER_NONE or len(points) <= 1:
+        return np.arange(len(points))
+    coords = get_grid_coords(points)
+    keys = hilbert_keys(coords) if curve == ORDER_HILBERT else morton_keys(coords)
+    return np.argsort(keys, kind='stable')
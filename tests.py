@@ -1,5 +1,39 @@
 import unittest
 import json
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+import contextlib
+from types import SimpleNamespace
+
+import numpy as np
+
+import mesh_buffers
+import mesh_optimizer
+import mesh_lods
+import bounding_volumes
+import spatial_order
+import collision_optimizer
+import export_manifest
+import compile_jobs
+import dependency_graph
+import node_inputs
+import action_sampling
+import action_reachability
+import track_sampling
+import action_compression
+import json_stream
+import quantization
+import profiler
+import log_setup
+import batch_export
+import benchmark
+import scene_model
+import cluster_parser
+import export_workers
 
 class Test_MapCompiling(unittest.TestCase):
 
@@ -10,5 +44,1199 @@ class Test_MapCompiling(unittest.TestCase):
     def test_table_declaration_headers(self):
         pass
 
+class Test_MeshBuffers(unittest.TestCase):
+
+    def make_mesh(self):
+        # two quads sharing an edge plus one loose vertex, split in triangles
+        co = [
+            (0.0, 0.0, 0.0),
+            (1.0, 0.0, 0.0),
+            (1.0, 0.0, 1.0),
+            (0.0, 0.0, 1.0),
+            (5.0, 5.0, 5.0),
+            (2.0, 0.0, 0.0),
+            (2.0, 0.0, 1.0),
+        ]
+        loops = [0, 1, 2, 3, 1, 5, 6, 2]
+        loop_triangles = [(0, 1, 2), (0, 2, 3), (4, 5, 6), (4, 6, 7)]
+        world = [
+            [0.0, 0.0, 2.0, 1.5],
+            [0.0, 1.0, 0.0, -3.0],
+            [-1.0, 0.0, 0.0, 0.25],
+            [0.0, 0.0, 0.0, 1.0],
+        ]
+        return co, loops, loop_triangles, world
+
+    def legacy_mesh_data(self, co, loops, loop_triangles, world):
+        # mirrors the per loop implementation ExportScene used before the bulk path
+        def transform(v):
+            return [sum(world[r][c] * v[c] for c in range(3)) + world[r][3] for r in range(3)]
+
+        out_buffer = [0]
+        processed_vertices_id = set()
+        for vid in sorted(loops):
+            if vid in processed_vertices_id:
+                continue
+            processed_vertices_id.add(vid)
+            v_global = transform(co[vid])
+            out_buffer.extend([v_global[0], v_global[2], v_global[1]])
+        out_buffer[0] = len(processed_vertices_id)
+
+        num_of_indices_id = len(out_buffer)
+        out_buffer.append(0)
+        for polygon in loop_triangles:
+            for loop_id in reversed(polygon):
+                out_buffer.append(loops[loop_id])
+        out_buffer[num_of_indices_id] = len(out_buffer) - num_of_indices_id - 1
+        return out_buffer
+
+    def test_mesh_v1_parity(self):
+        co, loops, loop_triangles, world = self.make_mesh()
+        expected = self.legacy_mesh_data(co, loops, loop_triangles, world)
+
+        triangles = [loops[loop_id] for polygon in loop_triangles for loop_id in polygon]
+        actual = mesh_buffers.build_mesh_v1(
+            np.array(co, dtype=np.float32).ravel(), np.array(world, dtype=np.float32),
+            np.array(loops, dtype=np.int32), np.array(triangles, dtype=np.int32))
+
+        self.assertEqual(len(expected), len(actual))
+        num_of_vertices = expected[0]
+        self.assertEqual(actual[0], num_of_vertices)
+        np.testing.assert_allclose(actual[1:1 + num_of_vertices * 3], expected[1:1 + num_of_vertices * 3], rtol=1e-6, atol=1e-6)
+        self.assertEqual(actual[1 + num_of_vertices * 3:], expected[1 + num_of_vertices * 3:])
+        self.assertTrue(all(type(value) is int for value in actual[1 + num_of_vertices * 3:]))
+
+    def test_mesh_sidecar_memmap(self):
+        co, loops, loop_triangles, world = self.make_mesh()
+        triangles = [loops[loop_id] for polygon in loop_triangles for loop_id in polygon]
+        positions, indices = mesh_buffers.build_mesh_arrays(
+            np.array(co, dtype=np.float32), np.array(world, dtype=np.float32),
+            np.array(loops, dtype=np.int32), np.array(triangles, dtype=np.int32))
+        # the loose vertex 4 is not written and indices are remapped around it
+        self.assertEqual(len(positions), 6)
+        self.assertEqual(int(indices.max()), 5)
+
+        big_positions = np.arange(70000 * 3, dtype=np.float32).reshape(-1, 3)
+        big_indices = np.array([0, 1, 69999], dtype=np.int64)
+
+        sidecar = mesh_buffers.MeshBufferSidecar()
+        sidecar.add(positions, indices)
+        sidecar.add(big_positions, big_indices)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "cluster.meshbuf")
+            descriptor = json.loads(json.dumps(sidecar.write(path)))
+            self.assertEqual(descriptor["buffer"], "cluster.meshbuf")
+            self.assertEqual(mesh_buffers.read_sidecar_header(path), (1, 2, os.path.getsize(path)))
+
+            meshes = descriptor["meshes"]
+            self.assertEqual([mesh["indexType"] for mesh in meshes], ["uint16", "uint32"])
+            for mesh in meshes:
+                self.assertEqual(mesh["vertexOffset"] % 16, 0)
+                self.assertEqual(mesh["indexOffset"] % 16, 0)
+
+            mapped_positions, mapped_indices = mesh_buffers.map_sidecar_mesh(path, meshes[0])
+            np.testing.assert_array_equal(mapped_positions, positions)
+            np.testing.assert_array_equal(mapped_indices, indices)
+            mapped_positions, mapped_indices = mesh_buffers.map_sidecar_mesh(path, meshes[1])
+            np.testing.assert_array_equal(mapped_positions, big_positions)
+            np.testing.assert_array_equal(mapped_indices, big_indices)
+            del mapped_positions, mapped_indices
+
+class Test_MeshOptimizer(unittest.TestCase):
+
+    def make_grid(self, size, seed=0):
+        xs, zs = np.meshgrid(np.arange(size + 1), np.arange(size + 1))
+        positions = np.stack([xs.ravel(), np.zeros(xs.size), zs.ravel()], axis=1).astype(np.float32)
+        corners = (np.arange(size)[:, None] * (size + 1) + np.arange(size)[None, :]).ravel()
+        triangles = np.concatenate([
+            np.stack([corners, corners + 1, corners + size + 2], axis=1),
+            np.stack([corners, corners + size + 2, corners + size + 1], axis=1)])
+        triangles = triangles[np.random.default_rng(seed).permutation(len(triangles))]
+        return positions, triangles.ravel()
+
+    def get_triangles(self, positions, indices):
+        # triangles as position triples starting at their smallest corner,
+        # so the winding is part of the comparison
+        triangles = set()
+        for triangle in np.asarray(positions)[np.asarray(indices).reshape(-1, 3)].tolist():
+            start = triangle.index(min(triangle))
+            triangles.add(tuple(map(tuple, triangle[start:] + triangle[:start])))
+        return triangles
+
+    def test_weld_and_compact(self):
+        # two triangles sharing an edge with split vertices, a loose vertex
+        # and a triangle that collapses once welded
+        positions = np.array([(0, 0, 0), (1, 0, 0), (0, 0, 1), (1, 0, 0.00001), (0, 0, 1), (1, 0, 1), (5, 5, 5)], dtype=np.float32)
+        indices = np.array([0, 1, 2, 3, 5, 4, 1, 3, 5])
+        optimizer = mesh_optimizer.MeshOptimizer(0.001)
+        out_positions, out_indices = optimizer.optimize(positions, indices)
+        self.assertEqual(len(out_positions), 4)
+        self.assertEqual(len(out_indices), 6)
+        self.assertEqual(out_indices.max(), 3)
+        self.assertEqual(optimizer.get_summary()["vertices"], [7, 4])
+        self.assertEqual(optimizer.get_summary()["triangles"], [3, 2])
+
+    def test_weld_uses_distance(self):
+        # the first pair straddles a multiple of the weld distance, the second
+        # shares a cell but is further apart than the weld distance
+        positions = np.array([(0.00149, 0, 0), (0.00151, 0, 0), (0.00455, 0.00455, 0.00455), (0.00545, 0.00545, 0.00545)])
+        out_positions, out_indices = mesh_optimizer.weld_vertices(positions, [0, 1, 2, 3], 0.001)
+        self.assertEqual(out_indices.tolist(), [0, 0, 1, 2])
+        np.testing.assert_array_equal(out_positions, positions[[0, 2, 3]])
+
+        # a vertex only welds to kept vertices, a chain does not collapse
+        chain = np.array([(0.0, 0, 0), (0.0008, 0, 0), (0.0016, 0, 0)])
+        self.assertEqual(mesh_optimizer.weld_vertices(chain, [0, 1, 2], 0.001)[1].tolist(), [0, 0, 1])
+
+        points = np.random.default_rng(0).random((400, 3)) * 0.05
+        distances = np.linalg.norm(points[:, None] - points[None, :], axis=2)
+        expected = [(i, j) for i in range(len(points)) for j in range(i) if distances[i, j] <= 0.004]
+        self.assertEqual(mesh_optimizer.find_close_pairs(points, 0.004).tolist(), [list(pair) for pair in expected])
+
+    def test_cache_order_keeps_triangles(self):
+        positions, indices = self.make_grid(24)
+        optimizer = mesh_optimizer.MeshOptimizer()
+        out_positions, out_indices = optimizer.optimize(positions, indices)
+        self.assertEqual(self.get_triangles(out_positions, out_indices), self.get_triangles(positions, indices))
+        self.assertLess(optimizer.acmr_after, 0.8)
+        self.assertGreater(optimizer.acmr_before, 2.0)
+        self.assertEqual(optimizer.num_of_16bit_meshes, 1)
+        # meshes above the limit keep their triangle order
+        self.assertEqual(mesh_optimizer.optimize_vertex_cache(indices, len(positions), max_triangles=100).tolist(), indices.tolist())
+        # vertices are numbered in first use order
+        _, first = np.unique(out_indices, return_index=True)
+        self.assertTrue(np.all(np.diff(first) > 0))
+
+        report = mesh_optimizer.MeshOptimizer()
+        report.merge(optimizer)
+        report.merge(optimizer)
+        self.assertEqual(report.triangles_after, 2 * optimizer.triangles_after)
+        self.assertAlmostEqual(report.acmr_after, optimizer.acmr_after)
+
+class Test_MeshLods(unittest.TestCase):
+
+    def make_grid(self, size):
+        positions, indices = Test_MeshOptimizer.make_grid(None, size)
+        positions[:, 1] = np.sin(positions[:, 0] * 0.3) * np.cos(positions[:, 2] * 0.2)
+        return positions, indices
+
+    def test_lod_chain(self):
+        positions, indices = self.make_grid(96)
+        lods = mesh_lods.build_lod_chain(positions, indices, 3)
+        self.assertEqual(len(lods), 3)
+        num_of_triangles = [len(indices) // 3] + [len(lod_indices) // 3 for _, lod_indices in lods]
+        self.assertTrue(all(a > b for a, b in zip(num_of_triangles, num_of_triangles[1:])))
+        for lod_positions, lod_indices in lods:
+            self.assertEqual(lod_indices.max(), len(lod_positions) - 1)
+            self.assertTrue(np.all(lod_positions.min(axis=0) >= positions.min(axis=0) - 1e-6))
+            self.assertTrue(np.all(lod_positions.max(axis=0) <= positions.max(axis=0) + 1e-6))
+        self.assertEqual(mesh_lods.get_screen_sizes(3, 0.25), [0.25, 0.125, 0.0625])
+
+    def test_cache(self):
+        positions, indices = self.make_grid(96)
+        with tempfile.TemporaryDirectory() as folder:
+            builder = mesh_lods.LodBuilder(2, 0.5, folder)
+            built = builder.build(positions, indices)
+            self.assertEqual(builder.cache_hits, 0)
+            self.assertEqual(len(os.listdir(folder)), 1)
+
+            cached_builder = mesh_lods.LodBuilder(2, 0.5, folder)
+            cached = cached_builder.build(positions, indices)
+            self.assertEqual(cached_builder.cache_hits, 1)
+            self.assertEqual([size for size, _, _ in cached], [0.5, 0.25])
+            for (_, a_positions, a_indices), (_, b_positions, b_indices) in zip(built, cached):
+                self.assertTrue(np.array_equal(a_positions, b_positions))
+                self.assertTrue(np.array_equal(a_indices, b_indices))
+
+            builder.merge(cached_builder)
+            self.assertEqual(builder.get_summary()["meshes"], 2)
+
+class Test_BoundingVolumes(unittest.TestCase):
+
+    def test_bvh_layout(self):
+        rng = np.random.default_rng(0)
+        mins = rng.uniform(-100, 100, (1000, 3))
+        maxs = mins + rng.uniform(0, 2, (1000, 3))
+        node_mins, node_maxs, offsets, counts, order = bounding_volumes.build_bvh(mins, maxs)
+        self.assertEqual(sorted(order.tolist()), list(range(1000)))
+        self.assertTrue(all(0 < count <= bounding_volumes.BVH_LEAF_SIZE for count in counts if count > 0))
+
+        def visit(node):
+            # items below a node, checking every box contains its children
+            if counts[node] > 0:
+                items = order[offsets[node]:offsets[node] + counts[node]]
+            else:
+                self.assertGreater(offsets[node], node + 1)
+                items = np.concatenate([visit(node + 1), visit(offsets[node])])
+            self.assertTrue(np.all(mins[items] >= node_mins[node]))
+            self.assertTrue(np.all(maxs[items] <= node_maxs[node]))
+            return items
+        self.assertEqual(len(visit(0)), 1000)
+
+    def test_ref_bounds(self):
+        bounds = (np.array([-1.0, 0.0, -1.0]), np.array([1.0, 0.0, 1.0]))
+        # a quarter turn around Blender's y axis and a scale of 2
+        b_min, b_max = bounding_volumes.transform_bounds(bounds, (10.0, 0.0, 0.0), (np.pi / 2, 0.0, 1.0, 0.0), (2.0, 1.0, 1.0))
+        np.testing.assert_allclose(b_min, [9.0, -2.0, 0.0], atol=1e-9)
+        np.testing.assert_allclose(b_max, [11.0, 2.0, 0.0], atol=1e-9)
+
+    def test_outward_quantization(self):
+        quantizer = quantization.Quantizer("positions", quantization.MODE_DECIMAL, 1)
+        q_mins, q_maxs = quantizer.quantize_bounds([0.26, 1.1, -0.04], [0.34, 1.7, 0.04])
+        self.assertEqual(q_mins.tolist(), [0.2, 1.1, -0.1])
+        self.assertEqual(q_maxs.tolist(), [0.4, 1.7, 0.1])
+
+class Test_SpatialOrder(unittest.TestCase):
+
+    def test_curves(self):
+        xs, ys = np.meshgrid(np.arange(4), np.arange(4))
+        coords = np.stack([xs.ravel(), ys.ravel()], axis=1)
+        self.assertEqual(spatial_order.morton_keys([(1, 0), (0, 1), (1, 1), (2, 0), (3, 3)]).tolist(), [1, 2, 3, 4, 15])
+
+        keys = spatial_order.hilbert_keys(coords, 2)
+        self.assertEqual(sorted(keys.tolist()), list(range(16)))
+        # every step along the Hilbert curve moves to a neighbouring cell
+        path = coords[np.argsort(keys)]
+        self.assertTrue(np.all(np.abs(np.diff(path, axis=0)).sum(axis=1) == 1))
+
+        self.assertEqual(spatial_order.get_order([(5.0, 5.0), (0.0, 0.0), (5.0, 5.0)], spatial_order.ORDER_MORTON).tolist(), [1, 0, 2])
+
+class Test_CollisionOptimizer(unittest.TestCase):
+
+    def polygon(self, x, y, width=1.0, height=1.0, friction=0.5):
+        return {"density": 1.0, "restitution": 0.0, "friction": friction, "filterData": [1, 65535, 0],
+                "points": [x, y, x + width, y, x + width, y + height, x, y + height]}
+
+    def circle(self, x, y, radius):
+        return {"radius": radius, "density": 1.0, "restitution": 0.0, "friction": 0.5, "filterData": [1, 65535, 0], "location": [x, y]}
+
+    def test_merge(self):
+        optimizer = collision_optimizer.CollisionOptimizer()
+        # a row of two squares merges, the square on top would make an L
+        polygons = [self.polygon(0, 0), self.polygon(1, 0), self.polygon(0, 1), self.polygon(5, 0, friction=0.9), self.polygon(6, 0)]
+        circles, polygons = optimizer.optimize([], polygons)
+        self.assertEqual(len(polygons), 4)
+        areas = sorted(collision_optimizer.get_signed_area(np.reshape(polygon["points"], (-1, 2))) for polygon in polygons)
+        self.assertEqual(areas, [1.0, 1.0, 1.0, 2.0])
+        self.assertEqual(optimizer.num_of_merged, 1)
+
+        # clockwise shapes stay clockwise
+        clockwise = self.polygon(0, 0)
+        clockwise["points"] = np.reshape(clockwise["points"], (-1, 2))[::-1].ravel().tolist()
+        _, polygons = optimizer.optimize([], [clockwise, self.polygon(0, 1)])
+        self.assertEqual(len(polygons), 1)
+        self.assertLess(collision_optimizer.get_signed_area(np.reshape(polygons[0]["points"], (-1, 2))), 0)
+
+    def test_contained(self):
+        optimizer = collision_optimizer.CollisionOptimizer()
+        polygons = [self.polygon(0, 0, 4, 4), self.polygon(1, 1), self.polygon(3.5, 3.5)]
+        circles = [self.circle(2, 2, 1), self.circle(0, 2, 1), self.circle(0, 2, 0.5)]
+        circles, polygons = optimizer.optimize(circles, polygons)
+        self.assertEqual([polygon["points"][:2] for polygon in polygons], [[0.0, 0.0], [3.5, 3.5]])
+        self.assertEqual([circle["location"] for circle in circles], [[0, 2]])
+        self.assertEqual(circles[0]["radius"], 1)
+        # the inner square merges into the big one, the hull adds nothing
+        self.assertEqual((optimizer.num_of_merged, optimizer.num_of_contained, optimizer.num_of_removed), (1, 2, 3))
+        self.assertEqual(optimizer.get_summary()["shapes"], 6)
+
+    def test_merge_rescans_only_new_hulls(self):
+        optimizer = collision_optimizer.CollisionOptimizer()
+        attempts = []
+        try_merge = optimizer.try_merge
+        optimizer.try_merge = lambda a, b: attempts.append(1) or try_merge(a, b)
+        # a shuffled strip of squares ends up as one rectangle
+        order = np.random.default_rng(0).permutation(256)
+        _, polygons = optimizer.optimize([], [self.polygon(float(x), 0) for x in order])
+        self.assertEqual(len(polygons), 1)
+        self.assertEqual(sorted(np.reshape(polygons[0]["points"], (-1, 2)).tolist()), [[0, 0], [0, 1], [256, 0], [256, 1]])
+        self.assertEqual(optimizer.num_of_merged, 255)
+        self.assertLess(len(attempts), 2 * 256)
+
+class Test_ExportManifest(unittest.TestCase):
+
+    def fingerprint(self, *values):
+        fingerprint = export_manifest.Fingerprint()
+        for value in values:
+            fingerprint.add(value)
+        return fingerprint.hexdigest()
+
+    def test_fingerprint_is_type_and_order_sensitive(self):
+        co = np.array([0.0, 1.0, 2.0], dtype=np.float32)
+        self.assertEqual(self.fingerprint("Cube", co, {"b": 1, "a": 0.5}), self.fingerprint("Cube", co.copy(), {"a": 0.5, "b": 1}))
+        self.assertNotEqual(self.fingerprint([1, 2]), self.fingerprint("12"))
+        self.assertNotEqual(self.fingerprint(1), self.fingerprint(1.0))
+        self.assertNotEqual(self.fingerprint(True), self.fingerprint(1))
+        self.assertNotEqual(self.fingerprint("a", "b"), self.fingerprint("b", "a"))
+        self.assertNotEqual(self.fingerprint(co), self.fingerprint(co.astype(np.float64)))
+
+    def test_manifest_round_trip(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "Intermediate.manifest.json")
+            intermediate_path = os.path.join(folder, "Tree].json")
+
+            manifest = export_manifest.ExportManifest(path)
+            manifest.update("Tree]", "abc")
+            manifest.save()
+
+            manifest = export_manifest.ExportManifest(path)
+            self.assertFalse(manifest.is_up_to_date("Tree]", "abc", intermediate_path))
+            with open(intermediate_path, 'w') as f:
+                f.write("{}")
+            self.assertTrue(manifest.is_up_to_date("Tree]", "abc", intermediate_path))
+            self.assertFalse(manifest.is_up_to_date("Tree]", "abd", intermediate_path))
+
+            manifest.remove("Tree]")
+            self.assertIsNone(manifest.get_fingerprint("Tree]"))
+
+    def test_exporter_version_invalidates_entries(self):
+        with tempfile.TemporaryDirectory() as folder:
+            intermediate_path = os.path.join(folder, "Tree].json")
+            with open(intermediate_path, 'w') as f:
+                f.write("{}")
+            manifest = export_manifest.ExportManifest(os.path.join(folder, "Intermediate.manifest.json"))
+            fingerprint = export_manifest.make_cluster_fingerprint().add("Tree]").hexdigest()
+            manifest.update("Tree]", fingerprint)
+            self.assertTrue(manifest.is_up_to_date("Tree]", export_manifest.make_cluster_fingerprint().add("Tree]").hexdigest(), intermediate_path))
+
+            version = export_manifest.EXPORTER_VERSION
+            export_manifest.EXPORTER_VERSION = version + 1
+            try:
+                fingerprint = export_manifest.make_cluster_fingerprint().add("Tree]").hexdigest()
+            finally:
+                export_manifest.EXPORTER_VERSION = version
+            self.assertFalse(manifest.is_up_to_date("Tree]", fingerprint, intermediate_path))
+
+class Test_CompileJobs(unittest.TestCase):
+
+    def compiler_args(self, input_path, output_folder):
+        compiler_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_map_compiler.py")
+        return [sys.executable, compiler_path, "-i", input_path, "-of", output_folder]
+
+    def write_intermediate(self, folder, name, content):
+        path = os.path.join(folder, name + ".json")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_report_collects_every_job(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_folder = os.path.join(folder, "Clusters")
+            scheduler = compile_jobs.CompileScheduler(2)
+            for id in range(4):
+                path = self.write_intermediate(folder, "Cluster{}".format(id), json.dumps({"name": "Cluster{}".format(id)}))
+                scheduler.submit("Cluster{}".format(id), self.compiler_args(path, output_folder), os.path.getsize(path))
+            path = self.write_intermediate(folder, "Broken", "{")
+            scheduler.submit("Broken", self.compiler_args(path, output_folder), os.path.getsize(path))
+            scheduler.submit("Missing", [os.path.join(folder, "no_such_compiler")], 0)
+
+            report = scheduler.wait()
+            self.assertEqual(len(report.results), 6)
+            self.assertEqual(sorted(result.name for result in report.failed), ["Broken", "Missing"])
+            self.assertEqual(report.get_returncode("Broken"), 1)
+            self.assertIn("Failed to read intermediate", [result for result in report.results if result.name == "Broken"][0].stderr)
+            self.assertIsNone(report.get_returncode("Missing"))
+            for id in range(4):
+                self.assertEqual(report.get_returncode("Cluster{}".format(id)), 0)
+                self.assertTrue(os.path.exists(os.path.join(output_folder, "Cluster{}.cluster".format(id))))
+            self.assertIn("Compiled 6 clusters, 2 failed", report.format())
+
+            # the scheduler keeps accepting work after a wait
+            path = self.write_intermediate(folder, "Late", "{}")
+            scheduler.submit("Late", self.compiler_args(path, output_folder))
+            self.assertEqual(len(scheduler.wait().results), 7)
+
+    def test_largest_job_runs_first(self):
+        os.environ["FAKE_MAP_COMPILER_DELAY"] = "0.3"
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                scheduler = compile_jobs.CompileScheduler(1)
+                path = self.write_intermediate(folder, "First", "{}")
+                scheduler.submit("First", self.compiler_args(path, folder), 1)
+                # the only worker is busy with First while the rest queue up
+                time.sleep(0.1)
+                for name, size in (("Small", 10), ("Large", 1000), ("Medium", 100)):
+                    path = self.write_intermediate(folder, name, "{}")
+                    scheduler.submit(name, self.compiler_args(path, folder), size)
+                report = scheduler.wait()
+        finally:
+            del os.environ["FAKE_MAP_COMPILER_DELAY"]
+        self.assertEqual([result.name for result in report.results], ["First", "Large", "Medium", "Small"])
+
+    def test_cluster_compiles_after_its_children(self):
+        os.environ["FAKE_MAP_COMPILER_DELAY"] = "0.2"
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                scheduler = compile_jobs.CompileScheduler(3)
+                for name, size, after in (("Lamp", 1, []), ("House", 10, ["Lamp"]), ("Tree", 5, []),
+                                          ("Level", 1000, ["House", "Tree", "UpToDate"])):
+                    path = self.write_intermediate(folder, name, "{}")
+                    scheduler.submit(name, self.compiler_args(path, folder), size, after)
+                report = scheduler.wait()
+        finally:
+            del os.environ["FAKE_MAP_COMPILER_DELAY"]
+        # free workers and the larger size do not let a parent run early,
+        # clusters that were never submitted hold nothing back
+        self.assertEqual(len(report.failed), 0)
+        results = {result.name: result for result in report.results}
+        self.assertEqual(len(results), 4)
+        for parent, children in (("House", ["Lamp"]), ("Level", ["House", "Tree"])):
+            for child in children:
+                self.assertGreaterEqual(results[parent].start, results[child].start + results[child].duration)
+
+class Test_DependencyGraph(unittest.TestCase):
+
+    def test_shared_dependency_exported_once(self):
+        graph = dependency_graph.DependencyGraph()
+        graph.add_node("Level")
+        self.assertTrue(graph.add_node("Lamp]"))
+        for parent in ("House", "Tower", "Bridge"):
+            graph.add_node(parent)
+            graph.add_edge("Level", parent)
+            graph.add_edge(parent, "Lamp]")
+        graph.add_edge("Tower", "House")
+        self.assertFalse(graph.add_node("Lamp]"))
+
+        order = graph.topological_order()
+        self.assertEqual(sorted(order), sorted(["Level", "House", "Tower", "Bridge", "Lamp]"]))
+        for parent, children in graph.edges.items():
+            for child in children:
+                self.assertLess(order.index(child), order.index(parent))
+        self.assertEqual(order[-1], "Level")
+
+    def test_cycle_is_reported(self):
+        graph = dependency_graph.DependencyGraph()
+        for key in ("Level", "A", "B", "C"):
+            graph.add_node(key)
+        graph.add_edge("Level", "A")
+        graph.add_edge("A", "B")
+        graph.add_edge("B", "C")
+        graph.add_edge("C", "A")
+
+        with self.assertRaises(dependency_graph.DependencyCycleError) as context:
+            graph.topological_order()
+        self.assertEqual(context.exception.cycle, ["A", "B", "C", "A"])
+
+class Test_NodeInputs(unittest.TestCase):
+
+    class Socket:
+        def __init__(self, name, identifier, type='VALUE'):
+            self.name = name
+            self.identifier = identifier
+            self.type = type
+
+    class NodeGroup:
+        def __init__(self, name, inputs):
+            self.name = name
+            self.inputs = inputs
+
+    class Modifier(dict):
+        def __init__(self, node_group, values, name="Modifier"):
+            super().__init__(values)
+            self.node_group = node_group
+            self.name = name
+
+    def test_collision_filter_bits_are_packed(self):
+        sockets = [self.Socket("Geometry", "Input_0", 'GEOMETRY')]
+        sockets += [self.Socket("Socket {}".format(id), "Input_{}".format(id)) for id in range(2, 36)]
+        node_group = self.NodeGroup("CollisionCircle", sockets)
+        values = {"Input_{}".format(id): 0 for id in range(2, 36)}
+        values.update({"Input_2": 1.5, "Input_3": 0.25, "Input_4": 0.75, "Input_5": 1, "Input_6": 1, "Input_35": 1})
+
+        registry = node_inputs.NodeInputRegistry()
+        record = registry.extract(self.Modifier(node_group, values))
+        self.assertEqual(record, node_inputs.CollisionRecord(1.5, 0.25, 0.75, 1, 1 | (1 << 1) | (1 << 30)))
+        self.assertNotIn("Input_0", node_inputs.get_value_identifiers(node_group))
+
+    def test_inputs_resolve_by_name_once(self):
+        # sockets re-added in the node group get new identifiers, names still match
+        node_group = self.NodeGroup("Beam", [
+            self.Socket("Width", "Input_7"),
+            self.Socket("Max length", "Input_2"),
+            self.Socket("Enabled", "Input_9"),
+        ])
+        registry = node_inputs.NodeInputRegistry()
+        record = registry.extract(self.Modifier(node_group, {"Input_2": 4.0, "Input_7": 0.5, "Input_9": False}))
+        self.assertEqual(record, node_inputs.BeamRecord(4.0, 0.5, False))
+
+        node_group.inputs = []
+        self.assertEqual(registry.extract(self.Modifier(node_group, {"Input_2": 2.0, "Input_7": 0.1, "Input_9": True})),
+                         node_inputs.BeamRecord(2.0, 0.1, True))
+
+    def test_color_and_unknown_groups(self):
+        registry = node_inputs.NodeInputRegistry()
+        node_group = self.NodeGroup("Color", [self.Socket("Color", "Input_3")])
+        self.assertEqual(registry.extract(self.Modifier(node_group, {"Input_3": (0.1, 0.2, 0.3, 1.0)})).color, [0.1, 0.2, 0.3])
+        registry = node_inputs.NodeInputRegistry()
+        with self.assertLogs(node_inputs.logger, 'WARNING'):
+            self.assertEqual(registry.extract(self.Modifier(self.NodeGroup("Color", []), {})).color, [0.55, 0.55, 0.6])
+        self.assertIsNone(registry.extract(self.Modifier(self.NodeGroup("Subdivide", []), {})))
+
+    def test_missing_inputs_warn(self):
+        # Friction is gone and Density was re-added under another name, filter
+        # bits are found by name or by their shipped identifier
+        sockets = [self.Socket("Geometry", "Input_0", 'GEOMETRY'), self.Socket("Mass density", "Input_41"),
+                   self.Socket("Restitution", "Input_3"), self.Socket("Is sensor", "Input_5"),
+                   self.Socket("Filter 2", "Input_40"), self.Socket("Socket 35", "Input_35")]
+        node_group = self.NodeGroup("CollisionPolygon", sockets)
+        values = {"Input_41": 1.5, "Input_3": 0.25, "Input_5": 0, "Input_40": 1, "Input_35": 1}
+
+        registry = node_inputs.NodeInputRegistry()
+        with self.assertLogs(node_inputs.logger, 'WARNING') as logs:
+            record = registry.extract(self.Modifier(node_group, values, "Ground collision"))
+        self.assertEqual(record, node_inputs.CollisionRecord(0.0, 0.25, 0.0, 0, (1 << 2) | (1 << 30)))
+        messages = [record.getMessage() for record in logs.records]
+        self.assertIn("Modifier Ground collision: CollisionPolygon has no input Density, exported as 0.0", messages)
+        self.assertIn("Modifier Ground collision: CollisionPolygon has no input Friction, exported as 0.0", messages)
+        self.assertIn("Modifier Ground collision: CollisionPolygon has no input Filter 1, exported as 0", messages)
+
+class Test_ActionSampling(unittest.TestCase):
+
+    def reference_evaluate(self, keyframes, frame):
+        # one frame at a time, solving x(t) with numpy.roots instead of bisection
+        if frame <= keyframes[0][0][0]:
+            return keyframes[0][0][1]
+        if frame >= keyframes[-1][0][0]:
+            return keyframes[-1][0][1]
+        for id in range(len(keyframes) - 1):
+            if keyframes[id][0][0] <= frame < keyframes[id + 1][0][0]:
+                break
+        (p0, _, h1, ipo), (p3, h2, _, _) = keyframes[id], keyframes[id + 1]
+        if ipo == action_sampling.IPO_CONSTANT:
+            return p0[1]
+        if ipo == action_sampling.IPO_LINEAR:
+            return p0[1] + (frame - p0[0]) / (p3[0] - p0[0]) * (p3[1] - p0[1])
+
+        p1, p2 = [np.array(h1, dtype=float)], [np.array(h2, dtype=float)]
+        p1, p2 = action_sampling.correct_bezier_segments(np.array([p0], dtype=float), np.array(p1), np.array(p2), np.array([p3], dtype=float))
+        x = [p0[0], p1[0][0], p2[0][0], p3[0]]
+        y = [p0[1], p1[0][1], p2[0][1], p3[1]]
+        coefficients = [
+            -x[0] + 3 * x[1] - 3 * x[2] + x[3],
+            3 * x[0] - 6 * x[1] + 3 * x[2],
+            -3 * x[0] + 3 * x[1],
+            x[0] - frame,
+        ]
+        roots = [root.real for root in np.roots(coefficients) if abs(root.imag) < 1e-9 and -1e-9 <= root.real <= 1 + 1e-9]
+        t = min(max(roots[0], 0.0), 1.0)
+        return action_sampling.bezier(y[0], y[1], y[2], y[3], t)
+
+    def make_keyframes(self, seed):
+        rng = np.random.default_rng(seed)
+        keyframes = []
+        frame = 1.0
+        for id in range(8):
+            value = rng.uniform(-3, 3)
+            # some handles reach past the neighbour keys to exercise the clamping
+            left = (frame - rng.uniform(0.5, 9.0), value + rng.uniform(-2, 2))
+            right = (frame + rng.uniform(0.5, 9.0), value + rng.uniform(-2, 2))
+            ipo = action_sampling.IPO_BEZIER if id % 3 else (action_sampling.IPO_LINEAR if id == 3 else action_sampling.IPO_CONSTANT)
+            keyframes.append(((frame, value), left, right, ipo))
+            frame += float(rng.integers(3, 12))
+        return keyframes
+
+    def test_matches_reference_evaluation(self):
+        for seed in range(5):
+            keyframes = self.make_keyframes(seed)
+            co = [key[0] for key in keyframes]
+            handle_left = [key[1] for key in keyframes]
+            handle_right = [key[2] for key in keyframes]
+            interpolation = [key[3] for key in keyframes]
+            for stride in (1, 2):
+                frames = action_sampling.get_frames(co[0][0], co[-1][0], stride)
+                self.assertEqual(frames[0], co[0][0])
+                self.assertLessEqual(frames[-1], co[-1][0])
+                values = action_sampling.sample_keyframes(co, handle_left, handle_right, interpolation, frames)
+                expected = [self.reference_evaluate(keyframes, frame) for frame in frames]
+                np.testing.assert_allclose(values, expected, atol=action_sampling.SAMPLE_TOLERANCE)
+
+    def test_constant_detection(self):
+        co = np.array([[1, 2.0], [10, 2.0005]])
+        flat = np.array([[0, 2.0], [11, 2.0]])
+        self.assertTrue(action_sampling.is_constant(co, flat, flat))
+        self.assertFalse(action_sampling.is_constant(co, flat, flat + [0, 0.01]))
+        self.assertFalse(action_sampling.is_supported([2, 3]))
+        np.testing.assert_array_equal(action_sampling.sample_keyframes([[5, 1.5]], [[4, 1.5]], [[6, 1.5]], [2], [5, 6, 7]), [1.5, 1.5, 1.5])
+
+class Test_ActionReachability(unittest.TestCase):
+
+    def test_animation_data_actions(self):
+        active, first, second = (scene_model.Action(name, []) for name in ("Active", "First", "Second"))
+        tracks = [SimpleNamespace(strips=[SimpleNamespace(action=first), SimpleNamespace(action=None)]),
+                  SimpleNamespace(strips=[SimpleNamespace(action=second)])]
+        self.assertEqual(action_reachability.get_animation_data_actions(None), [])
+        self.assertEqual(action_reachability.get_animation_data_actions(SimpleNamespace(action=None, nla_tracks=[])), [])
+        self.assertEqual(action_reachability.get_animation_data_actions(SimpleNamespace(action=active, nla_tracks=tracks)),
+            [active, first, second])
+
+    def test_reachable_actions(self):
+        scene, level = make_cluster_scene()
+        # shape keys of a mesh inside a dependency
+        shapes = scene_model.Action("Shapes", [scene_model.FCurve("value", 0, (1, 0.0, 10, 1.0))])
+        crate = scene.collections[1]
+        crate.all_objects[0].data.animation_actions.append(shapes)
+        scene.actions.append(shapes)
+
+        graph = cluster_parser.ClusterParser().plan_dependencies(level, scene.collections)
+        # Move animates the lift and the track curve, Unused is left out
+        action_names = action_reachability.collect_reachable_actions(graph)
+        self.assertEqual(action_names, {"Move", "Shapes"})
+        self.assertEqual([action.name for action in action_reachability.select_actions(scene.actions, action_names)], ["Move", "Shapes"])
+        self.assertEqual(action_reachability.select_actions(scene.actions, None), scene.actions)
+
+        # without the level only the dependency's actions remain
+        del graph.nodes["Level"]
+        self.assertEqual(action_reachability.collect_reachable_actions(graph), {"Shapes"})
+
+class Test_TrackSampling(unittest.TestCase):
+
+    def test_straight_track(self):
+        # handles a third of the way along keep the speed constant
+        points = [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0), (6, 0)]
+        length, table = track_sampling.get_arc_length_table(points, 7)
+        self.assertAlmostEqual(length, 6.0)
+        np.testing.assert_allclose(table, np.linspace(0.0, 2.0, 7), atol=1e-9)
+
+    def test_uneven_speed(self):
+        # both handles on the start point, the curve starts slowly
+        points = [(0, 0), (0, 0), (0, 0), (1, 0)]
+        length, table = track_sampling.get_arc_length_table(points, 5)
+        self.assertAlmostEqual(length, 1.0, places=6)
+        self.assertEqual((table[0], table[-1]), (0.0, 1.0))
+        # half the distance is covered at t where t^3 = 0.5
+        self.assertAlmostEqual(table[2], 0.5 ** (1.0 / 3.0), places=2)
+        self.assertEqual(track_sampling.get_arc_length_table([(0, 0)], 3)[0], 0.0)
+
+class Test_ActionCompression(unittest.TestCase):
+
+    def test_linear_motion_keeps_end_points(self):
+        values = np.linspace(-2.0, 5.0, 600)
+        for interpolation in (action_compression.INTERPOLATION_LINEAR, action_compression.INTERPOLATION_HERMITE):
+            channel = action_compression.encode_channel(values, 1e-4, interpolation)
+            self.assertEqual(channel["keys"], [0, 599])
+            np.testing.assert_allclose(action_compression.decode_channel(channel), values, atol=1e-4)
+
+    def test_error_bound_holds(self):
+        frames = np.arange(300)
+        values = np.sin(frames * 0.05) * 3.0 + np.where(frames > 150, 1.0, 0.0)
+        for interpolation in (action_compression.INTERPOLATION_LINEAR, action_compression.INTERPOLATION_HERMITE):
+            for error_bound in (0.1, 0.01, 0.001):
+                channel = action_compression.encode_channel(values, error_bound, interpolation)
+                decoded = action_compression.decode_channel(channel)
+                self.assertLessEqual(np.max(np.abs(decoded - values)), error_bound + 1e-12)
+                self.assertLess(len(channel["keys"]), len(values))
+
+    def test_identical_channels_are_shared(self):
+        walk = np.sin(np.arange(120) * 0.1).tolist()
+        json_actions = [
+            {"name": "Walk", "timeStride": 1 / 60, "types": ["location0", "location2"], "data": [walk, [0.0, 1.0, 2.0]]},
+            {"name": "WalkCopy", "timeStride": 1 / 60, "types": ["location0"], "data": [list(walk)]},
+        ]
+        json_compressed, num_of_samples, num_of_keys = action_compression.compress_actions(json_actions, 0.001)
+        self.assertEqual(len(json_compressed["channels"]), 2)
+        self.assertEqual(json_compressed["actions"][0]["channels"][0], json_compressed["actions"][1]["channels"][0])
+        self.assertEqual(num_of_samples, 243)
+        self.assertLess(num_of_keys, num_of_samples)
+
+        decoded = action_compression.decompress_actions(json.loads(json.dumps(json_compressed)))
+        self.assertEqual([action["types"] for action in decoded], [action["types"] for action in json_actions])
+        np.testing.assert_allclose(decoded[1]["data"][0], walk, atol=0.001)
+
+class Test_JsonStream(unittest.TestCase):
+
+    def make_sections(self):
+        return [
+            ("name", "Tree é"),
+            ("objectRefs", [{"name": "Lamp", "location": [1.0, 2.5, -3.0], "visible": True}]),
+            ("meshes-v1", [[3, 0.30000001192092896, 1e-07, -2.0, 3, 0, 1, 2]]),
+            ("joints", [{"type": "Joints-weld", "objects": []}]),
+            ("actions", {}),
+        ]
+
+    def write(self, sections, indent):
+        f = io.StringIO()
+        json_stream.write_sections(f, iter(sections), indent)
+        return f.getvalue()
+
+    def test_indented_output_matches_json_dump(self):
+        sections = self.make_sections()
+        self.assertEqual(self.write(sections, 4), json.dumps(dict(sections), ensure_ascii=False, indent=4))
+        self.assertEqual(self.write([], 4), json.dumps({}, indent=4))
+
+    def test_compact_output(self):
+        sections = self.make_sections()
+        text = self.write(sections, None)
+        self.assertNotIn("\n", text)
+        self.assertEqual(json.loads(text), dict(sections))
+        self.assertIn("[3,0.30000001192092896,1e-07,-2.0,3,0,1,2]", text)
+
+        values = np.array([0.5, float("nan"), 2.0])
+        self.assertEqual(json_stream.encode_compact(values), json.dumps(values.tolist(), separators=(',', ':')))
+        self.assertEqual(json_stream.encode_compact([True, 1, 2.0]), "[true,1,2.0]")
+
+class Test_Quantization(unittest.TestCase):
+
+    def test_decimal_and_fixed_point(self):
+        values = np.array([0.30000001192092896, -1.23456, 2.0])
+
+        decimal = quantization.Quantizer("positions", quantization.MODE_DECIMAL, 3)
+        self.assertEqual(decimal.quantize(values).tolist(), [0.3, -1.235, 2.0])
+        self.assertAlmostEqual(decimal.max_error, 0.00044)
+
+        fixed = quantization.Quantizer("positions", quantization.MODE_FIXED, 4)
+        result = fixed.quantize(values)
+        self.assertTrue(np.all(result * 16 == np.round(result * 16)))
+        self.assertLessEqual(fixed.max_error, 1 / 32)
+        self.assertEqual(fixed.num_of_values, 3)
+
+        none = quantization.Quantizer("positions")
+        self.assertIs(none.quantize(values), values)
+
+    def test_records(self):
+        records = [
+            {"radius": 0.123456, "points": [1.00001, 2.00002]},
+            {"radius": 2.5, "points": [3.33333, 4.44444, 5.55555, 6.66666]},
+        ]
+        quantizer = quantization.Quantizer("positions", quantization.MODE_DECIMAL, 2)
+        quantizer.quantize_records(records, ("radius", "points", "missing"))
+        self.assertEqual(records, [
+            {"radius": 0.12, "points": [1.0, 2.0]},
+            {"radius": 2.5, "points": [3.33, 4.44, 5.56, 6.67]},
+        ])
+        self.assertIs(type(records[0]["radius"]), float)
+
+class Test_Profiler(unittest.TestCase):
+
+    def test_nested_stages_and_trace(self):
+        export_profiler = profiler.ExportProfiler()
+        export_profiler.start()
+        try:
+            with export_profiler.stage("dump", "Tree"):
+                with export_profiler.stage("parse_mesh", "Tree"):
+                    buffer = bytearray(4 * 1024 * 1024)
+                del buffer
+                with export_profiler.stage("parse_tracks", "Tree"):
+                    pass
+        finally:
+            export_profiler.stop()
+        export_profiler.add_compile_results([compile_jobs.CompileResult("Tree", [], 0, "", "", 0.5, time.perf_counter(), 1)])
+
+        events = {event.name: event for event in export_profiler.events}
+        self.assertEqual(set(events), {"dump", "parse_mesh", "parse_tracks", "compile"})
+        self.assertGreaterEqual(events["parse_mesh"].peak_memory, 4 * 1024 * 1024)
+        # the outer stage keeps the peak of its children
+        self.assertGreaterEqual(events["dump"].peak_memory, events["parse_mesh"].peak_memory)
+        self.assertLess(events["parse_tracks"].peak_memory, 4 * 1024 * 1024)
+
+        trace = json.loads(json.dumps(export_profiler.get_trace()))
+        complete = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        self.assertEqual([event["name"] for event in complete][0], "dump")
+        self.assertEqual(complete[0]["args"]["cluster"], "Tree")
+        self.assertIn("thread_name", [event["name"] for event in trace["traceEvents"] if event["ph"] == "M"])
+        self.assertEqual(len(export_profiler.format()), 4)
+
+    def test_disabled(self):
+        export_profiler = profiler.ExportProfiler(False)
+        export_profiler.start()
+        with export_profiler.stage("dump"):
+            pass
+        export_profiler.stop()
+        self.assertEqual(export_profiler.events, [])
+
+class Test_BatchExport(unittest.TestCase):
+
+    def test_arguments_and_files(self):
+        args = batch_export.parse_args(batch_export.get_script_args(
+            ["blender", "--background", "--python", "batch_export.py", "--", "--cluster", "Tree", "--jobs", "2", "maps/**/*.blend"]))
+        self.assertEqual(args.clusters, ["Tree"])
+        self.assertEqual(args.jobs, 2)
+
+        with tempfile.TemporaryDirectory() as folder:
+            os.makedirs(os.path.join(folder, "maps", "ch0"))
+            for name in ("maps/a.blend", "maps/ch0/b.blend", "maps/ch0/b.blend1"):
+                open(os.path.join(folder, name), 'w').close()
+            files = batch_export.expand_files([os.path.join(folder, "maps", "**", "*.blend*"), os.path.join(folder, "maps", "a.blend")])
+            self.assertEqual([os.path.relpath(path, folder) for path in files], [os.path.join("maps", "a.blend"), os.path.join("maps", "ch0", "b.blend")])
+
+        command = batch_export.get_worker_command("blender", "a.blend", args, "summary.json")
+        self.assertEqual(command[command.index("--") + 1:], ["--worker", "--summary", "summary.json", "--cluster", "Tree"])
+
+    def test_summary(self):
+        file_summaries = [
+            {"file": "a.blend", "seconds": 2.0, "errors": [], "clusters": [
+                {"cluster": "Tree", "intermediates": {"Leaf]": 1024, "Tree": 2048}, "compiled": ["Leaf]", "Tree"], "failed": []}]},
+            {"file": "b.blend", "seconds": 1.0, "errors": [], "clusters": [
+                {"cluster": "Rock", "intermediates": {"Rock": 512}, "compiled": [], "failed": ["Rock"]}]},
+            {"file": "c.blend", "seconds": 0.5, "errors": ["Blender exited with 1"], "clusters": []},
+        ]
+        self.assertEqual([batch_export.is_file_failed(file_summary) for file_summary in file_summaries], [False, True, True])
+        lines = batch_export.format_summary(file_summaries, 3.5, 2)
+        self.assertIn("3 files", lines[0])
+        self.assertIn("2 clusters, 3 intermediates", lines[0])
+        self.assertIn("2 files failed", lines[0])
+        self.assertIn("Rock did not compile", lines[2])
+
+class Test_Benchmark(unittest.TestCase):
+
+    def test_regressions(self):
+        stages = benchmark.merge_fastest([
+            {"dump": 1.5, "parse_mesh": 0.5, "parse_joints": 0.004},
+            {"dump": 1.2, "parse_mesh": 0.7, "parse_joints": 0.009},
+        ])
+        self.assertEqual(stages, {"dump": 1.2, "parse_mesh": 0.5, "parse_joints": 0.004})
+
+        baseline = {"dump": 1.0, "parse_mesh": 0.5, "parse_joints": 0.001, "parse_actions": 0.3}
+        # parse_joints is below the noise floor, parse_actions did not run
+        self.assertEqual(benchmark.compare_results(baseline, stages, 0.1), [("dump", 1.0, 1.2)])
+        self.assertEqual(benchmark.compare_results(baseline, stages, 0.25), [])
+        self.assertIn("+20%", benchmark.format_results(stages, baseline)[0])
+
+def make_cluster_scene():
+    sm = scene_model
+    collision = sm.make_node_group("CollisionCircle", node_inputs.SCHEMAS["CollisionCircle"])
+    beam = sm.make_node_group("Beam", node_inputs.SCHEMAS["Beam"])
+    weld = sm.make_node_group("JointWeld", node_inputs.SCHEMAS["JointWeld"])
+    quad = sm.Mesh(sm.QUAD, triangles=((0, 1, 3), (0, 3, 2)))
+
+    crate_cluster = sm.Collection("Crate", [sm.Collection("Dynamic", [
+        sm.Collection("Collision", objects=[sm.Object("Body", quad, dimensions=(1.0, 1.0, 1.0),
+            modifiers=[sm.make_node_modifier("CollisionCircle", collision, {"Density": 2.0})])]),
+    ])], library=sm.Library("//crate.blend"))
+    overrides = sm.Object("overrides", modifiers=[sm.make_node_modifier("Body", collision, {"Density": 5.0})])
+    refs = [
+        sm.Object("Crate", location=(1.0, 0.0, 2.0), rotation_axis_angle=(0.5, 0.0, 1.0, 0.0), instance_collection=crate_cluster),
+        sm.Object("Heavy crate", scale=(2.0, 2.0, 2.0), instance_collection=crate_cluster, children=[overrides]),
+    ]
+
+    move = sm.Action("Move", [sm.FCurve("location", 0, (1, 0.0, 10, 5.0))])
+    unused = sm.Action("Unused", [sm.FCurve("location", 0, (1, 0.0, 10, 5.0))])
+    lift = sm.Object("Lift", quad, location=(0.0, 0.0, 4.0), animation_actions=[move])
+    track = sm.Object("Track", sm.Curve([sm.Spline(((0, 0, 0), (4, 0, 0), (4, 0, 4)), use_cyclic_u=True)], move))
+    level = sm.Collection("Level", [sm.Collection("Static", [
+        sm.Collection("Objects", objects=refs),
+        sm.Collection("Collision", objects=[sm.Object("Ground", quad, location=(0.0, 0.0, -1.0),
+            modifiers=[sm.make_node_modifier("CollisionPolygon", sm.make_node_group("CollisionPolygon", node_inputs.SCHEMAS["CollisionPolygon"]),
+                {"Friction": 0.5})])]),
+        sm.Collection("Beams", objects=[sm.Object("Beam", location=(1.0, 0.0, 1.0), rotation_euler=(0.0, 0.5, 0.0),
+            modifiers=[sm.make_node_modifier("Beam", beam, {"Max length": 4.0, "Width": 0.5, "Enabled": False})])]),
+        sm.Collection("Links", objects=[sm.Object("Weld",
+            modifiers=[sm.make_node_modifier("JointWeld", weld, {"Target 1": lift, "Target 2": refs[0]})])]),
+        sm.Collection("Mesh", objects=[lift]),
+        sm.Collection("Polygons.001", objects=[lift]),
+        sm.Collection("Tracks", objects=[track]),
+    ])])
+    return sm.Scene([level, crate_cluster], [move, unused]), level
+
+class Test_LogSetup(unittest.TestCase):
+
+    class Records(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    class Modifiers(list):
+        # counts how often a log message formatted the modifier list
+        num_of_formats = 0
+
+        def __repr__(self):
+            Test_LogSetup.Modifiers.num_of_formats += 1
+            return super().__repr__()
+
+    def test_one_handler_per_package(self):
+        package_logger = log_setup.set_log_level("log_setup_test", 'DEBUG')
+        try:
+            log_setup.set_log_level("log_setup_test", 'WARNING')
+            self.assertEqual(len(package_logger.handlers), 1)
+            self.assertFalse(package_logger.propagate)
+            self.assertEqual(package_logger.level, logging.WARNING)
+            self.assertFalse(logging.getLogger("log_setup_test.cluster_parser").isEnabledFor(logging.INFO))
+        finally:
+            package_logger.handlers.clear()
+
+    def test_debug_output_is_lazy(self):
+        scene, level = make_cluster_scene()
+        ground = level.children[0].children[1].objects[0]
+        self.assertEqual(ground.name, "Ground")
+        ground.modifiers = Test_LogSetup.Modifiers(ground.modifiers)
+        Test_LogSetup.Modifiers.num_of_formats = 0
+
+        records = Test_LogSetup.Records()
+        parser_logger = logging.getLogger(cluster_parser.__name__)
+        parser_logger.addHandler(records)
+        try:
+            stdout = io.StringIO()
+            parser_logger.setLevel(logging.INFO)
+            with contextlib.redirect_stdout(stdout):
+                Test_ClusterParser().parse(cluster_parser.ClusterParser(), level)
+            # the parsers print nothing and format nothing below the level
+            self.assertEqual(stdout.getvalue(), "")
+            self.assertEqual(Test_LogSetup.Modifiers.num_of_formats, 0)
+            self.assertNotIn(logging.DEBUG, [record.levelno for record in records.records])
+
+            parser_logger.setLevel(logging.DEBUG)
+            Test_ClusterParser().parse(cluster_parser.ClusterParser(), level)
+            self.assertIn("Ground modifiers [", [record.getMessage()[:len("Ground modifiers [")] for record in records.records])
+            self.assertGreater(Test_LogSetup.Modifiers.num_of_formats, 0)
+        finally:
+            parser_logger.removeHandler(records)
+            parser_logger.setLevel(logging.NOTSET)
+
+class Test_ClusterParser(unittest.TestCase):
+
+    def parse(self, parser, root, node=None):
+        node = node or cluster_parser.DependencyNode(root.name, root, None, *map(np.array, (
+            cluster_parser.ROOT_LOCATION, cluster_parser.ROOT_ROTATION, cluster_parser.ROOT_SCALE)))
+        f = io.StringIO()
+        json_stream.write_sections(f, parser.parse_cluster(node.root, node.location, node.rotation, node.scale, node.override))
+        return json.loads(f.getvalue())
+
+    def test_sections(self):
+        scene, level = make_cluster_scene()
+        parser = cluster_parser.ClusterParser()
+        cluster = self.parse(parser, level)
+
+        self.assertEqual((cluster["name"], cluster["type"]), ("Level", "Static"))
+        self.assertEqual([ref["dependency"] for ref in cluster["objectRefs"]][0], "Crate [crate]")
+        self.assertEqual(cluster["objectRefs"][0]["rotation"], [0.0, 1.0, 0.0, 0.5])
+        self.assertEqual(cluster["collision-polygons"][0]["points"], [-1.0, -2.0, 1.0, -2.0, 1.0, 0.0, -1.0, 0.0])
+        self.assertEqual(cluster["collision-polygons"][0]["friction"], 0.5)
+        self.assertEqual(cluster["beams-disabled"], [{"rotation": 0.5, "maxLength": 4.0, "width": 0.5, "location": [1.0, 1.0]}])
+        self.assertEqual(cluster["joints"][0]["objects"][0]["target1"], "Lift")
+        self.assertEqual(cluster["meshes-v1"][0][0], 4)
+        self.assertEqual(cluster["boundings"], [{"center": [0.0, 4.0, 0.0], "hdims": [1.0, 1.0, 0.0]}])
+        self.assertEqual(cluster["polygons"][0]["v0"], [-1.0, 3.0])
+        # cyclic tracks wrap around to the first point
+        self.assertEqual(cluster["tracks"][0]["pointsX"], [0.0, 0.0, 4.0, 4.0, 4.0, 4.0, 4.0, 4.0, 0.0, 0.0])
+        self.assertEqual(cluster["tracks"][0]["actionName"], "Move")
+
+    def test_bvh(self):
+        scene, level = make_cluster_scene()
+        cluster = self.parse(cluster_parser.ClusterParser(build_bvh=True), level)
+        bvh = cluster["bvh"]
+        items = sorted(zip(bvh["itemTypes"], bvh["itemIndices"]))
+        self.assertEqual(items, [(bounding_volumes.BVH_MESH, 0), (bounding_volumes.BVH_POLYGON, 0),
+            (bounding_volumes.BVH_REF, 0), (bounding_volumes.BVH_REF, 1)])
+        self.assertEqual((bvh["offsets"], bvh["counts"]), ([0], [4]))
+        # the heavy crate doubles the crate quad, the turned crate reaches
+        # furthest along x and the lift sits above both
+        np.testing.assert_allclose(bvh["bounds"], [-2.0, -2.0, 0.0, 1.0 + np.cos(0.5) + np.sin(0.5), 5.0, 0.0])
+        self.assertNotIn("bvh", self.parse(cluster_parser.ClusterParser(), level))
+
+    def test_spatial_order(self):
+        level = scene_model.generate_cluster("Level", 256)
+        polygons = self.parse(cluster_parser.ClusterParser(), level)["polygons"]
+        cluster = self.parse(cluster_parser.ClusterParser(build_bvh=True, order=spatial_order.ORDER_HILBERT), level)
+        sorted_polygons = cluster["polygons"]
+        self.assertNotEqual([polygon["v0"] for polygon in sorted_polygons], [polygon["v0"] for polygon in polygons])
+        self.assertEqual(sorted(polygon["v0"] for polygon in sorted_polygons), sorted(polygon["v0"] for polygon in polygons))
+        self.assertEqual(len({polygon["name"] for polygon in sorted_polygons}), 256)
+
+        # bvh items follow the new order
+        bvh = cluster["bvh"]
+        for node, (offset, count) in enumerate(zip(bvh["offsets"], bvh["counts"])):
+            bounds = bvh["bounds"][node * 6:node * 6 + 6]
+            for index in bvh["itemIndices"][offset:offset + count]:
+                x, y = sorted_polygons[index]["v0"]
+                self.assertTrue(bounds[0] <= x <= bounds[3] and bounds[1] <= y <= bounds[4])
+
+    def test_polygon_batches(self):
+        sm = scene_model
+        level = sm.generate_cluster("Level", 100)
+        red = sm.make_node_modifier("Color", sm.NodeGroup("Color", [sm.NodeSocket("Color", "Input_2")]), {"Color": (1.0, 0.0, 0.0, 1.0)})
+        angles = np.arange(5) * 2 * np.pi / 5
+        pentagon = sm.Mesh(np.stack([np.cos(angles), np.zeros(5), np.sin(angles)], axis=1), triangles=((0, 1, 2), (0, 2, 3), (0, 3, 4)))
+        flipped = sm.Mesh(sm.QUAD, triangles=((0, 3, 1), (0, 2, 3)))
+        level.children[0].children[0].objects.extend([sm.Object("Pentagon", pentagon, modifiers=[red]),
+            sm.Object("Flipped", flipped, location=(4.0, 0.0, 0.0), modifiers=[red])])
+
+        cluster = self.parse(cluster_parser.ClusterParser(polygon_batches=True, build_bvh=True), level)
+        self.assertEqual(cluster["polygons"], [])
+        batches = cluster["polygon-batches"]
+        self.assertEqual([batch["color"] for batch in batches], [[0.2, 0.4, 0.6], [1.0, 0.0, 0.0]])
+        self.assertEqual([len(batch["positions"]) // 2 for batch in batches], [400, 9])
+        self.assertEqual([len(batch["indices"]) // 3 for batch in batches], [200, 5])
+        for batch in batches:
+            points = np.reshape(batch["positions"], (-1, 2))[np.reshape(batch["indices"], (-1, 3))]
+            edges = points[:, 1:] - points[:, :1]
+            self.assertTrue(np.all(edges[:, 0, 0] * edges[:, 1, 1] - edges[:, 0, 1] * edges[:, 1, 0] > 0))
+        self.assertEqual(sorted(cluster["bvh"]["itemIndices"]), [0, 1])
+
+    def test_track_tables(self):
+        sm = scene_model
+        scene, level = make_cluster_scene()
+        track = level.children[0].children[-1].objects[0]
+        track.data.splines.append(sm.Spline(((0, 0, 0), (0, 0, 3)), ((0, 0, 0), (0, 0, 1)), ((0, 0, 0), (0, 0, 1))))
+        parser = cluster_parser.ClusterParser(track_resolution=16)
+        json_track = self.parse(parser, level)["tracks"][0]
+
+        # the cyclic spline closes with the diagonal back to its start, the
+        # open one is a line
+        self.assertTrue(json_track["cyclic"])
+        self.assertAlmostEqual(json_track["length"], 8.0 + 4.0 * np.sqrt(2.0), places=6)
+        self.assertEqual(len(json_track["arcLengthTable"]), 16)
+        self.assertEqual(json_track["arcLengthTable"][-1], 3.0)
+        self.assertEqual(len(json_track["splines"]), 1)
+        spline = json_track["splines"][0]
+        self.assertFalse(spline["cyclic"])
+        self.assertEqual(spline["pointsY"], [0.0, 0.0, 1.0, 3.0])
+        self.assertAlmostEqual(spline["length"], 3.0, places=6)
+        self.assertNotIn("length", self.parse(cluster_parser.ClusterParser(), level)["tracks"][0])
+
+    def test_moved_instance_rebuilds_dependency(self):
+        def fingerprint_dependency(level):
+            graph = cluster_parser.ClusterParser().plan_dependencies(level, scene.collections)
+            node = graph.get("Crate [crate]")
+            fingerprint = export_manifest.make_cluster_fingerprint()
+            fingerprint.add(node.get_placement())
+            return fingerprint.hexdigest()
+
+        scene, level = make_cluster_scene()
+        with tempfile.TemporaryDirectory() as folder:
+            intermediate_path = os.path.join(folder, "Crate [crate].json")
+            with open(intermediate_path, 'w') as f:
+                f.write("{}")
+            manifest = export_manifest.ExportManifest(os.path.join(folder, "Intermediate.manifest.json"))
+            manifest.update("Crate [crate]", fingerprint_dependency(level))
+            self.assertTrue(manifest.is_up_to_date("Crate [crate]", fingerprint_dependency(level), intermediate_path))
+
+            # the last instance of a dependency is the one that places it
+            crate = level.children[0].children[0].objects[-1]
+            self.assertEqual(crate.name, "Heavy crate")
+            crate.location = (3.0, 0.0, 2.0)
+            self.assertFalse(manifest.is_up_to_date("Crate [crate]", fingerprint_dependency(level), intermediate_path))
+
+    def make_override(self, name, density=5.0, beam_width=0.5, reverse=False):
+        override = cluster_parser.DependencyOverride(name, "Crate [crate]")
+        entries = [("collision", "Body", (density, 0.0, 0.5)), ("beam", "Beam", (4.0, beam_width))]
+        for kind, modifier_name, data in reversed(entries) if reverse else entries:
+            if kind == "collision":
+                override.add_collision_overrite(modifier_name, data)
+            else:
+                override.add_beams_overrite(modifier_name, data)
+        return override
+
+    def test_override_key(self):
+        key = self.make_override("Heavy crate").get_key()
+        # the digest of the canonical json, the same in every process
+        self.assertEqual(key, "e703a5014e07b868")
+        self.assertEqual(self.make_override("Other crate", reverse=True).get_key(), key)
+        self.assertEqual(self.make_override("Other crate"), self.make_override("Heavy crate"))
+        self.assertNotEqual(self.make_override("Heavy crate", density=6.0).get_key(), key)
+        self.assertNotEqual(self.make_override("Heavy crate", beam_width=0.25).get_key(), key)
+
+    def test_same_overrides_share_a_dependency(self):
+        scene, level = make_cluster_scene()
+        refs = level.children[0].children[0]
+        heavy_crate = refs.objects[-1]
+        collision = heavy_crate.children[0].modifiers[0].node_group
+        refs.objects.append(scene_model.Object("Heavy crate.001", instance_collection=heavy_crate.instance_collection,
+            children=[scene_model.Object("overrides.001", modifiers=[scene_model.make_node_modifier("Body", collision, {"Density": 5.0})])]))
+
+        graph = cluster_parser.ClusterParser().plan_dependencies(level, scene.collections)
+        # the plain dependency keeps its name, both overridden instances
+        # point at one variant
+        self.assertEqual(len(graph.nodes), 3)
+        self.assertIn("Crate [crate]", graph.edges["Level"])
+        variants = [key for key in graph.edges["Level"] if key != "Crate [crate]"]
+        self.assertEqual(len(variants), 1)
+        self.assertEqual(variants[0], "Crate [crate]" + graph.get(variants[0]).override.get_key())
+        self.assertIsNone(graph.get("Crate [crate]").override)
+        self.assertEqual([ref["dependency"] for ref in self.parse(cluster_parser.ClusterParser(), level)["objectRefs"]],
+            ["Crate [crate]", variants[0], variants[0]])
+
+    def test_dependencies_and_actions(self):
+        scene, level = make_cluster_scene()
+        parser = cluster_parser.ClusterParser()
+        graph = parser.plan_dependencies(level, scene.collections)
+        order = graph.topological_order()
+        self.assertEqual(len(order), 3)
+        self.assertEqual(order[-1], "Level")
+
+        densities = []
+        for key in order[:-1]:
+            node = graph.get(key)
+            densities.append(self.parse(parser, node.root, node)["collision-circles"][0]["density"])
+        self.assertEqual(sorted(densities), [2.0, 5.0])
+
+        action_names = parser.collect_reachable_actions(graph)
+        self.assertEqual(action_names, {"Move"})
+        actions = parser.parse_actions(scene.actions, action_names)
+        self.assertEqual([action["name"] for action in actions], ["Move"])
+        self.assertEqual(actions[0]["types"], ["location0"])
+        self.assertEqual(actions[0]["data"][0][:2], [0.0, 5.0 / 9])
+
+    def test_large_generated_cluster(self):
+        start = time.perf_counter()
+        level = scene_model.generate_cluster("Level", 100000)
+        self.assertLess(time.perf_counter() - start, 5.0)
+        self.assertEqual(len(level.all_objects), 100000)
+
+        polygons = self.parse(cluster_parser.ClusterParser(), scene_model.generate_cluster("Level", 1000))["polygons"]
+        self.assertEqual(len(polygons), 1000)
+        self.assertEqual(polygons[0]["color"], [0.2, 0.4, 0.6])
+
+class Test_ExportWorkers(unittest.TestCase):
+
+    def make_jobs(self, folder, settings):
+        scene, level = make_cluster_scene()
+        parser = cluster_parser.ClusterParser()
+        graph = parser.plan_dependencies(level, scene.collections)
+        jobs = []
+        for key in graph.topological_order():
+            node = graph.get(key)
+            actions = scene.actions if key == level.name else None
+            jobs.append(export_workers.ExportJob(key, node.root, node.location, node.rotation, node.scale,
+                export_workers.copy_override(node.override), os.path.join(folder, "{}.json".format(len(jobs))), settings, actions))
+        return jobs
+
+    def read(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_workers_match_in_process_export(self):
+        settings = export_workers.ExportSettings('V2', None, (quantization.MODE_DECIMAL, 3, 3, 3, 3), True, (1e-3, action_compression.INTERPOLATION_LINEAR), 1e-4,
+            (2, 0.25, None))
+        with tempfile.TemporaryDirectory() as folder:
+            jobs = self.make_jobs(folder, settings)
+            results = [export_workers.export_cluster(job) for job in jobs]
+            expected = [self.read(job.path) for job in jobs]
+            self.assertIn("actions-compressed", json.loads(expected[-1]))
+            self.assertIn("dump", [event.name for event in results[-1].events])
+            self.assertGreater(results[-1].quantization.positions.num_of_values, 0)
+            self.assertEqual(results[-1].mesh_report.num_of_meshes, 1)
+            self.assertEqual(len(json.loads(expected[-1])["meshes-lods"]), results[-1].lod_report.num_of_meshes)
+
+            with export_workers.create_executor(2, sys.executable) as executor:
+                worker_results = list(executor.map(export_workers.export_cluster, jobs))
+            self.assertEqual([self.read(job.path) for job in jobs], expected)
+            self.assertEqual([result.size for result in worker_results], [result.size for result in results])
+
+            # workers start at the default warning level
+            self.assertEqual([record for result in worker_results for record in result.log_records if record.levelno < logging.WARNING], [])
+
+            report = quantization.QuantizationReport(quantization.MODE_DECIMAL, 3, 3, 3, 3)
+            for result in worker_results:
+                report.merge(result.quantization)
+            self.assertEqual(report.positions.num_of_values, sum(result.quantization.positions.num_of_values for result in results))
+
+    def test_snapshots_use_the_worker_scene_model(self):
+        # jobs are unpickled against the top level modules
+        self.assertIs(export_workers.get_worker_module(), export_workers)
+        self.assertIs(export_workers.get_worker_scene_model(), scene_model)
+
+    def test_worker_log_records_are_returned(self):
+        with tempfile.TemporaryDirectory() as folder:
+            job = self.make_jobs(folder, export_workers.ExportSettings())[-1]
+            # Blender's handlers already saw what was logged in process
+            self.assertEqual(export_workers.export_cluster(job).log_records, [])
+
+            with export_workers.create_executor(1, sys.executable, logging.DEBUG) as executor:
+                result = executor.submit(export_workers.export_cluster, job).result()
+        self.assertIn(("cluster_parser", logging.INFO, "Trying to parse cluster Level"),
+            [(record.name, record.levelno, record.getMessage()) for record in result.log_records])
+        self.assertIn(logging.DEBUG, [record.levelno for record in result.log_records])
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,38 @@
+import numpy as np
+
+try:
+    from . import action_sampling
+except ImportError:
+    # loaded as a top level module by tests.py and the export workers
+    import action_sampling
+
+# Arc length tables of exported tracks. A track is the control point layout
+# parse_tracks writes, point, right handle, left handle, point, ..., so cubic
+# segments share their end points. Every segment is sampled at once and the
+# table maps evenly spaced distances along the track to the curve parameter,
+# segment index plus the local t, so the engine moves objects at a constant
+# speed without integrating the curve itself.
+
+SAMPLES_PER_SEGMENT = 32
+
+def get_segments(points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    num_of_segments = max(len(points) - 1, 0) // 3
+    return points[np.arange(num_of_segments)[:, None] * 3 + np.arange(4)]
+
+def get_arc_length_table(points, resolution, samples_per_segment=SAMPLES_PER_SEGMENT):
+    # total length and the parameters at resolution distances from the
+    # start to the end of the track, both included
+    segments = get_segments(points)
+    if len(segments) == 0:
+        return 0.0, np.zeros(resolution)
+
+    t = np.linspace(0.0, 1.0, samples_per_segment + 1)
+    curve = action_sampling.bezier(segments[:, None, 0], segments[:, None, 1], segments[:, None, 2], segments[:, None, 3], t[None, :, None])
+    chords = np.linalg.norm(np.diff(curve, axis=1), axis=2).ravel()
+    lengths = np.concatenate(([0.0], np.cumsum(chords)))
+    params = np.concatenate(([0.0], (np.arange(len(segments))[:, None] + t[None, 1:]).ravel()))
+    total = float(lengths[-1])
+    if total <= 0:
+        return 0.0, np.zeros(resolution)
+    return total, np.interp(np.linspace(0.0, total, resolution), lengths, params)
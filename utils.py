@@ -1,55 +1,27 @@
 import bpy
+import logging
+import os
 
-def gather_name(str):
-    parts = str.split('.')
-    if len(parts) <= 0:
-        return str
-    return parts[0]
-
-def find_collection(root, search_name):
-    for collection in root.children:
-        name = collection.name
-        if gather_name(name) == search_name:
-            return collection
-    
-    return None
-
-def find_object(root, search_name):
-    for object in root.children:
-        name = object.name
-        if gather_name(name) == search_name:
-            return object
-    
-    return None
+from . import log_setup
+from .cluster_layout import gather_name, find_collection, find_object, get_is_cluster_collection, get_cluster_collection, \
+    get_cluster_collection_rec, trim_name, trim_name_full
 
-def get_is_cluster_collection(raw_name):
-    name = gather_name(raw_name)
-    return name == "Dynamic" or name == "Static" or name == "Kinematic"
+logger = logging.getLogger(__name__)
 
-def get_cluster_collection(root):
-    collection = root.children[0]
-    if get_is_cluster_collection(collection.name):
-        return collection
-    return None
-
-def get_cluster_collection_rec(root):
-    for collection in root.children:
-        if get_is_cluster_collection(collection.name):
-            return collection
-        return get_cluster_collection_rec(collection)
-    return None
+def set_log_level(level):
+    log_setup.set_log_level(__package__, level)
 
 def get_parent_cluster_root(curr_collection):
     if get_is_cluster_collection(curr_collection.name):
         return curr_collection
     
     for parent_collection in bpy.data.collections:
-        print("parent name", parent_collection.name)
+        logger.debug("parent name %s", parent_collection.name)
         id = parent_collection.children.find(curr_collection.name)
         if id < 0:
             continue
         
-        print("Found parent", parent_collection.name)
+        logger.debug("Found parent %s", parent_collection.name)
         return get_parent_cluster_root(parent_collection) 
     
     return None
@@ -118,19 +90,34 @@ def get_cluster_from_collection_rec(collection):
 def get_cluster_from_active_object(context):
     if context.object is None:
         return None
-    print("get_cluster_from_active_object object", context.object)
+    logger.debug("get_cluster_from_active_object object %s", context.object)
     return get_cluster_from_collection(context.object.users_collection[0])
     
-def trim_name(name):
-    return name.split('.')[0] + ']'
+RESOURCES_FOLDER = ("hopper", "Hopper", "Hopper", "Resources")
+
+# overrides the MapCompiler location, e.g. on build machines
+COMPILER_PATH_VARIABLE = "RISING_MAP_COMPILER"
+
+def get_resources_path(root_folder, *parts):
+    return os.path.join(root_folder, *RESOURCES_FOLDER, *parts)
+
+def get_compiler_path(root_folder):
+    compiler_path = os.environ.get(COMPILER_PATH_VARIABLE)
+    if compiler_path:
+        return compiler_path
+    if os.name == 'nt':
+        return os.path.join(root_folder, "tools", "MapCompiler", "x64", "Debug", "MapCompiler.exe")
+    return os.path.join(root_folder, "tools", "MapCompiler", "build", "MapCompiler")
+
+def get_export_folder(root_folder, output_path):
+    if output_path:
+        return bpy.path.abspath(output_path)
+    return get_resources_path(root_folder, "Clusters")
 
-def trim_name_full(name):
-    return name.split('.')[0]
-    
 def get_data_path():
-    root_path = bpy.context.scene.re.engine_path
-    return bpy.path.abspath(root_path + "hopper\\Hopper\\Hopper\\Resources\\Sources\\Data\\")
+    root_path = bpy.path.abspath(bpy.context.scene.re.engine_path)
+    return get_resources_path(root_path, "Sources", "Data", "")
     
 def link_utils_nodegroup(nodegroup):
-    data_path = get_data_path() + "utils.blend\\NodeTree\\"
+    data_path = os.path.join(get_data_path(), "utils.blend", "NodeTree", "")
     bpy.ops.wm.link(filename=nodegroup, directory=data_path)
\ No newline at end of file